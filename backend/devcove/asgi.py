@@ -2,7 +2,7 @@
 
 import os
 import django
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
 
@@ -20,6 +20,8 @@ django.setup()
 # Bây giờ mới lấy ứng dụng HTTP
 http_application = get_asgi_application()
 
+from posts.consumers import NotificationWorker
+
 application = ProtocolTypeRouter({
     "http": http_application,
     "websocket": AuthMiddlewareStack( # AuthMiddlewareStack bọc ngoài cùng
@@ -27,4 +29,8 @@ application = ProtocolTypeRouter({
             posts.routing.websocket_urlpatterns # Danh sách các URL WebSocket của bạn
         )
     ),
+    # Kênh nền cho worker: python manage.py runworker notifications
+    "channel": ChannelNameRouter({
+        "notifications": NotificationWorker.as_asgi(),
+    }),
 })
\ No newline at end of file
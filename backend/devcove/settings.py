@@ -36,6 +36,29 @@ CHANNEL_LAYERS = {
         },
     },
 }
+# Fan-out thông báo chạy trong worker (runworker notifications); False = xử lý ngay sau commit.
+# Chỉ bật khi worker đang chạy, nếu không thông báo sẽ bị mất (xem README, Redis & WebSocket)
+NOTIFICATIONS_ASYNC = False
+# Write-behind cho vote: gom vote vào Redis, `manage.py flush_votes --loop` ghi xuống DB theo lô
+VOTES_WRITE_BEHIND = False
+VOTES_FLUSH_INTERVAL = 2  # giây
+# Lịch job bảo trì (`manage.py run_scheduler`, posts/jobs.py): {'tên job': '<cron>' hoặc None để tắt}
+SCHEDULER_JOBS = {}
+# Ngân sách query theo view (posts/query_budget.py): header X-DB-Query-Count/X-DB-Time-Ms/X-Query-Budget,
+# và test runner làm fail test khi một view vượt ngân sách
+QUERY_BUDGET_HEADERS = DEBUG
+TEST_RUNNER = 'posts.test_runner.QueryBudgetTestRunner'
+# Histogram latency theo route (posts/instrumentation.py, /api/metrics/): tỉ lệ request được đo chi tiết
+INSTRUMENTATION_SAMPLE_RATE = 0.1
+# /api/metrics/ chỉ trả lời staff hoặc request có header `Authorization: Bearer <token>` (Prometheus: authorization.credentials)
+INSTRUMENTATION_TOKEN = os.getenv('INSTRUMENTATION_TOKEN')
+# Cache dùng chung Redis với channel layer (DB 1): presence, typing, bộ đếm...
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    },
+}
 # Add these to your Django settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -52,6 +75,8 @@ REST_FRAMEWORK = {
 # Make sure these are properly configured
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'posts.instrumentation.InstrumentationMiddleware',
+    'posts.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # if using CORS
     'django.middleware.common.CommonMiddleware',
@@ -76,6 +101,7 @@ CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
     'authorization',
+    'content-encoding',
     'content-type',
     'dnt',
     'origin',
@@ -8,11 +8,13 @@ import io
 from typing import Union
 from django.conf import settings
 import requests 
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
-from django.db import connection
-from django.db.models import Case, Count, F, IntegerField, Q, Sum, When
+from django.db import IntegrityError, connection
+from django.db.models import Case, Count, F, IntegerField, Prefetch, Q, Sum, When
 from django.db.models.functions import Coalesce
 from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404
@@ -24,7 +26,6 @@ from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
 from rest_framework.decorators import action
 from django.http import HttpResponse
-from django.db.models.functions import TruncDay, TruncWeek
 import demjson3
 import matplotlib.pyplot as plt
 from google import genai
@@ -34,9 +35,9 @@ from ai_formatter import AICommentFormatter
 from prompts import build_prompt, TASK_PROMPTS
 from django.db.models import Max, Q
 from rest_framework import permissions, status, viewsets
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, parser_classes, permission_classes
 from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
@@ -46,7 +47,7 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Comment, Community, Follow, Notification, Post, Profile, Tag, Vote, BotSession, Conversation, ChatMessage, LoggedBug, Language, WeeklyChallenge, ChallengeSubmission, Bookmark
+from .models import Comment, Community, Follow, Notification, Post, Profile, Tag, Vote, BotSession, Conversation, ChatMessage, ConversationReadState, LoggedBug, Language, WeeklyChallenge, ChallengeSubmission, Bookmark
 from .serializers import (
     CommunityBasicSerializer,
     CommunitySerializer,
@@ -62,11 +63,14 @@ from .serializers import (
     UserBasicSerializer,
     UserSerializer,
     VoteSerializer,
-    ConversationSerializer, ChatMessageSerializer,
-    LoggedBugSerializer, BugStatsSerializer, HeatmapDataSerializer,
+    ConversationSerializer, ChatMessageSerializer, ChatMessageCompactSerializer,
+    LoggedBugSerializer, BugReportSerializer, BugStatsSerializer, HeatmapDataSerializer,
     WeeklyChallengeSerializer, ChallengeSubmissionSerializer,
-    BookmarkSerializer
+    BookmarkSerializer, LeaderboardEntrySerializer
 )
+from . import bug_tracker, chat_state, feeds, fingerprints, instrumentation, leaderboard, notifications, recommendations, related, scheduler, trending, vote_buffer, votes
+from .parsers import GzipJSONParser
+from .query_budget import QueryBudget, query_budget
 
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.pagesizes import letter
@@ -99,6 +103,13 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class ConversationCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-updated_at', '-id')
+
+
 class PostViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing posts
@@ -113,17 +124,15 @@ class PostViewSet(viewsets.ModelViewSet):
     
     ordering_fields = ['created_at', 'calculated_score', 'title']
     ordering = ['-created_at'] 
+    # Số query không tăng theo page_size: PostSerializer đọc dữ liệu phụ cho cả trang một lần
+    query_budgets = {'list': QueryBudget(12), 'retrieve': QueryBudget(12)}
 
     def get_queryset(self):
-        queryset = Post.objects.select_related('author', 'community') \
-                               .prefetch_related('tags', 'votes') \
-                               .annotate(                       
-                                   calculated_score=Coalesce(Sum(Case(
-                                       When(votes__is_upvote=True, then=1),
-                                       When(votes__is_upvote=False, then=-1),
-                                       default=0,
-                                       output_field=IntegerField()
-                                   )), 0)
+        # Điểm đọc từ bộ đếm lưu sẵn trên Post (xem posts/votes.py), không JOIN/SUM votes
+        queryset = Post.objects.select_related('author__profile', 'community', 'language') \
+                               .prefetch_related('tags') \
+                               .annotate(
+                                   calculated_score=F('upvote_count') - F('downvote_count')
                                ).all() 
 
         tags_param = self.request.query_params.get('tags', None)
@@ -139,6 +148,11 @@ class PostViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(comments__is_bot=True).distinct()
             elif bot_reviewed.lower() in ['false', '0', 'no']:
                 queryset = queryset.exclude(comments__is_bot=True)
+
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(
+                Prefetch('comments', queryset=Comment.objects.select_related('author__profile'))
+            )
         
         return queryset
 
@@ -150,7 +164,9 @@ class PostViewSet(viewsets.ModelViewSet):
         return PostSerializer
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        feeds.post_published(post)
+        related.post_changed(post.id)
 
     def create(self, request, *args, **kwargs):
         """
@@ -175,69 +191,77 @@ class PostViewSet(viewsets.ModelViewSet):
         # Only allow author to update their own posts
         if serializer.instance.author != self.request.user:
             raise permissions.PermissionDenied("You can only edit your own posts.")
-        serializer.save()
+        before = self._similarity_inputs(serializer.instance)
+        old_text = (serializer.instance.title, serializer.instance.content)
+        post = serializer.save()
+        # Chỉ khi tag/ngôn ngữ/community đổi mới cần cập nhật danh sách bài liên quan
+        if self._similarity_inputs(post) != before:
+            related.post_changed(post.id)
+        # Nội dung đổi: bỏ vector cũ để lần `build_recommendations` tiếp theo index lại
+        if (post.title, post.content) != old_text:
+            recommendations.post_edited(post.id)
+
+    @staticmethod
+    def _similarity_inputs(post):
+        tag_ids = frozenset(Post.tags.through.objects.filter(post_id=post.id).values_list('tag_id', flat=True))
+        return tag_ids, post.language_id, post.community_id
 
     def perform_destroy(self, instance):
         # Only allow author to delete their own posts
         if instance.author != self.request.user:
             raise permissions.PermissionDenied("You can only delete your own posts.")
+        related.post_removed(instance.id)
         instance.delete()
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @query_budget(10)  # gồm cả notification khi deliver chạy inline
     def vote(self, request, pk=None):
-        """Vote on a post with improved error handling"""
-        try:
-            post = self.get_object()
-            vote_type = request.data.get('vote_type')
-
-            # Log the request for debugging
-            logger.info(f"Vote request from user {request.user.id} for post {pk}: {vote_type}")
-
-            if vote_type not in ['up', 'down']:
-                return Response(
-                    {'error': 'Invalid vote type. Must be "up" or "down"'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        """
+        Vote/bỏ vote một bài viết. votes.cast ghi vote và cập nhật bộ đếm của
+        post trong cùng một transaction, nên không cần COUNT lại điểm.
+        """
+        vote_type = request.data.get('vote_type')
+        if vote_type not in ['up', 'down']:
+            return Response(
+                {'error': 'Invalid vote type. Must be "up" or "down"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            is_upvote = vote_type == 'up'
-            existing_vote = Vote.objects.filter(user=request.user, post=post).first()
-
-            action = ''
-            if existing_vote:
-                if existing_vote.is_upvote == is_upvote:
-                    existing_vote.delete()
-                    action = 'removed'
-                else:
-                    existing_vote.is_upvote = is_upvote
-                    existing_vote.save()
-                    action = 'updated'
+        post = get_object_or_404(Post.objects.only('id', 'author_id', 'title'), pk=pk)
+        is_upvote = vote_type == 'up'
+        try:
+            if vote_buffer.enabled():
+                result = vote_buffer.cast(request.user.id, post.id, is_upvote)
             else:
-                Vote.objects.create(user=request.user, post=post, is_upvote=is_upvote)
-                action = 'created'
-
-            # Recalculate score
-            upvotes = post.votes.filter(is_upvote=True).count()
-            downvotes = post.votes.filter(is_upvote=False).count()
-            new_score = upvotes - downvotes
-
-            logger.info(f"Vote {action} successfully. New score: {new_score}")
-
-            return Response({
-                'score': new_score,
-                'action': action,
-                'vote_type': vote_type,
-                'upvotes': upvotes,
-                'downvotes': downvotes,
-                'message': f'Vote {action} successfully'
-            })
-
-        except Exception as e:
-            logger.error(f"Error in vote endpoint: {str(e)}")
+                result = votes.cast(request.user.id, post.id, is_upvote)
+        except IntegrityError as e:
+            logger.error(f"Vote on post {post.id} by user {request.user.id} failed: {e}")
             return Response(
-                {'error': f'An error occurred: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Vote could not be recorded, please retry.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        action = result['action']
+        logger.debug(f"Vote {action} on post {post.id} by user {request.user.id}; score {result['score']}")
+
+        # Upvote mới (hoặc đổi từ down sang up): báo cho tác giả, gộp theo bài viết
+        if is_upvote and action in ('created', 'updated') and post.author_id != request.user.id:
+            notifications.notify(
+                recipient=post.author_id,
+                sender=request.user,
+                notification_type='vote',
+                subject=post.title[:30],
+                post=post,
             )
 
+        return Response({
+            'score': result['score'],
+            'action': action,
+            'vote_type': vote_type,
+            'upvotes': result['upvotes'],
+            'downvotes': result['downvotes'],
+            'message': f'Vote {action} successfully'
+        })
+
     @action(detail=True, methods=['get'])
     def user_vote(self, request, pk=None):
         """Get user's vote for this post"""
@@ -245,6 +269,10 @@ class PostViewSet(viewsets.ModelViewSet):
             return Response({'user_vote': None})
 
         post = self.get_object()
+        if vote_buffer.enabled():
+            # Vote còn trong buffer chưa flush vẫn phải hiện ngay cho chính user đó
+            return Response({'user_vote': vote_buffer.current_vote(post.id, request.user.id) or None})
+
         vote_object = post.get_user_vote(request.user)
         user_vote_status = None
         if vote_object:
@@ -279,20 +307,72 @@ class PostViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def following(self, request):
+        """
+        Bài viết từ những người mình follow, mới nhất trước.
+        Phân trang bằng cursor: ?cursor=<next từ trang trước>&page_size=<=100
+        """
+        cursor = request.query_params.get('cursor')
+        decoded = None
+        if cursor:
+            decoded = feeds.decode_cursor(cursor)
+            if decoded is None:
+                return Response({'error': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page_size = min(int(request.query_params.get('page_size', feeds.TIMELINE_PAGE_SIZE)), 100)
+        except ValueError:
+            page_size = feeds.TIMELINE_PAGE_SIZE
+
+        rows, next_cursor = feeds.timeline(request.user, cursor=decoded, limit=max(page_size, 1))
+        post_ids = [post_id for post_id, _ in rows]
+        posts_by_id = self.get_queryset().filter(id__in=post_ids).in_bulk()
+        posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+
+        serializer = PostSerializer(posts, many=True, context={'request': request})
+        return Response({'next': next_cursor, 'results': serializer.data})
+
     @action(detail=True, methods=['get'])
     def related_posts(self, request, pk=None):
-        """Get related posts based on tags"""
-        post = self.get_object()
-        related_posts = []
-
-        if post.tags.exists():
-            related_posts = Post.objects.filter(
-                tags__in=post.tags.all()
-            ).exclude(pk=post.pk).distinct()[:5]
+        """
+        Get related posts, read from the precomputed neighbor index (posts/related.py).
+        ?limit=<n> (tối đa related.TOP_K)
+        """
+        post = get_object_or_404(Post.objects.only('id'), pk=pk)
+        limit = self._neighbor_limit(request, related.DEFAULT_LIMIT, related.TOP_K)
 
+        related_posts = related.related_posts(post.id, limit=limit)
         serializer = PostSerializer(related_posts, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Bài viết có nội dung/code tương tự (TF-IDF cosine, xem posts/recommendations.py).
+        ?limit=<n> (tối đa recommendations.TOP_K)
+        """
+        post = get_object_or_404(Post.objects.only('id'), pk=pk)
+        limit = self._neighbor_limit(request, recommendations.DEFAULT_LIMIT, recommendations.TOP_K)
+        posts = recommendations.similar_posts(post.id, limit=limit)
+        serializer = PostSerializer(posts, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def recommended(self, request):
+        """
+        "You might like": gợi ý dựa trên các bài user đã bookmark hoặc upvote.
+        """
+        limit = self._neighbor_limit(request, 10, 50)
+        posts = recommendations.recommended_for(request.user, limit=limit)
+        serializer = PostSerializer(posts, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    def _neighbor_limit(self, request, default, maximum):
+        try:
+            return min(max(int(request.query_params.get('limit', default)), 1), maximum)
+        except ValueError:
+            return default
+
     @action(detail=True, methods=['get'])
     def comments(self, request, pk=None):
         """
@@ -354,8 +434,8 @@ class PostViewSet(viewsets.ModelViewSet):
             if language in runnable_languages:
                 ai_response_text = re.sub(r'```(\s*)\n', f'```{language}\n', ai_response_text, count=1)
 
-            formatter = AICommentFormatter()
-            formatted_html = formatter.format_full_response(ai_response_text, post)
+            with instrumentation.span('format'):
+                formatted_html = AICommentFormatter().format_full_response(ai_response_text, post)
 
             bot_comment = self._create_bot_comment(post, request.user, formatted_html)
             self._create_notification(post, request.user)
@@ -436,14 +516,14 @@ class PostViewSet(viewsets.ModelViewSet):
 
     def _create_notification(self, post, user):
         """Create notification for post author, handling potential errors."""
-        if post.author != user:
+        if post.author_id != user.id:
             try:
-                Notification.objects.create(
-                    recipient=post.author,
-                    type='bot_analysis',
+                notifications.notify(
+                    recipient=post.author_id,
+                    sender=user,
+                    notification_type='bot_analysis',
                     message=f"Your post '{post.title[:30]}...' has been analyzed by the AI.",
-                    related_object_id=post.id,
-                    actor=user
+                    post=post,
                 )
             except Exception as e:
                 logger.warning(f"Non-critical error: Failed to create notification for post {post.id}. Error: {e}")
@@ -594,10 +674,19 @@ class PostViewSet(viewsets.ModelViewSet):
     def generate_overview(self, request):
         """
         Nhận một danh sách ID bài đăng và tạo ra một bản tóm tắt tổng quan bằng AI.
+        Hoặc gửi `seed_post_id`: bài đó cùng các bài có nội dung tương tự sẽ được chọn tự động.
         """
         post_ids = request.data.get('post_ids', [])
+        seed_post_id = request.data.get('seed_post_id')
+        if seed_post_id is not None:
+            try:
+                seed_post_id = int(seed_post_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'seed_post_id must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not post_ids and seed_post_id:
+            post_ids = [seed_post_id] + recommendations.similar_post_ids(seed_post_id)
         if not post_ids:
-            return Response({'error': 'post_ids list is required.'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'error': 'post_ids list or seed_post_id is required.'}, status=status.HTTP_400_BAD_REQUEST)
         if len(post_ids) > 30:
             return Response({'error': 'Cannot analyze more than 30 posts at once.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -624,8 +713,8 @@ class PostViewSet(viewsets.ModelViewSet):
         if isinstance(ai_response_text, Response):
             return ai_response_text
             
-        formatter = AICommentFormatter()
-        formatted_overview = formatter.format_full_response(ai_response_text, post=None) 
+        with instrumentation.span('format'):
+            formatted_overview = AICommentFormatter().format_full_response(ai_response_text, post=None)
 
         return Response({'overview': formatted_overview}, status=status.HTTP_200_OK)
     
@@ -686,7 +775,16 @@ class CommentViewSet(viewsets.ModelViewSet):
     ordering = ['-created']
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        post = comment.post
+        if post.author_id != self.request.user.id and not comment.is_bot:
+            notifications.notify(
+                recipient=post.author_id,
+                sender=self.request.user,
+                notification_type='comment',
+                subject=post.title[:30],
+                post=post,
+            )
 
     def perform_update(self, serializer):
         if serializer.instance.author != self.request.user:
@@ -706,8 +804,10 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all().order_by('name')
     serializer_class = TagSerializer
     pagination_class = StandardResultsSetPagination
-    filter_backends = [SearchFilter]
+    filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['name']
+    # Sắp xếp theo bộ đếm có index: ?ordering=-posts_count / -last_activity_at
+    ordering_fields = ['name', 'posts_count', 'members_count', 'last_activity_at']
     lookup_field = 'slug'
 
     @action(detail=True, methods=['get'])
@@ -716,12 +816,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
         tag = self.get_object()
         posts = Post.objects.filter(tags=tag).annotate(
             num_comments=Count('comments'),
-            calculated_score=Coalesce(Sum(Case(
-                When(votes__is_upvote=True, then=1),
-                When(votes__is_upvote=False, then=-1),
-                default=0,
-                output_field=IntegerField()
-            )), 0)
+            calculated_score=F('upvote_count') - F('downvote_count')
         ).order_by('-created_at')
 
         paginator = StandardResultsSetPagination()
@@ -729,6 +824,24 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = PostSerializer(page, many=True, context={'request': request})
         return paginator.get_paginated_response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Tag đang nổi trong 7 ngày qua (điểm hoạt động giảm dần theo thời gian). ?limit=<n>"""
+        return _trending_response(request, trending.TAG, TagSerializer)
+
+
+def _trending_response(request, subject, serializer_class):
+    try:
+        limit = min(max(int(request.query_params.get('limit', trending.DEFAULT_LIMIT)), 1), trending.TOP_N)
+    except ValueError:
+        limit = trending.DEFAULT_LIMIT
+    results = []
+    for obj, score in trending.trending(subject, limit=limit):
+        data = serializer_class(obj, context={'request': request}).data
+        data['trend_score'] = round(score, 3)
+        results.append(data)
+    return Response(results)
+
 
 class CommunityViewSet(viewsets.ModelViewSet):
     """
@@ -741,6 +854,7 @@ class CommunityViewSet(viewsets.ModelViewSet):
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['name', 'description']
     ordering = ['-created_at']
+    ordering_fields = ['created_at', 'name', 'posts_count', 'members_count', 'last_activity_at']
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -755,18 +869,18 @@ class CommunityViewSet(viewsets.ModelViewSet):
             raise permissions.PermissionDenied("You can only delete your own communities.")
         instance.delete()
 
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Community đang nổi trong 7 ngày qua. ?limit=<n>"""
+        return _trending_response(request, trending.COMMUNITY, CommunitySerializer)
+
     @action(detail=True, methods=['get'])
     def posts(self, request, slug=None):
         """Get all posts in this community"""
         community = self.get_object()
         posts = Post.objects.filter(community=community).annotate(
             num_comments=Count('comments'),
-            calculated_score=Coalesce(Sum(Case(
-                When(votes__is_upvote=True, then=1),
-                When(votes__is_upvote=False, then=-1),
-                default=0,
-                output_field=IntegerField()
-            )), 0)
+            calculated_score=F('upvote_count') - F('downvote_count')
         ).order_by('-created_at')
 
         paginator = StandardResultsSetPagination()
@@ -815,73 +929,6 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=False, methods=['POST'], permission_classes=[IsAuthenticated])
-    def update_helper_status(self, request):
-        """
-        Tính toán lại trạng thái 'is_weekly_helper' cho tất cả người dùng.
-        Một người dùng là "Weekly Helper" nếu họ bình luận trên ít nhất 5 bài viết
-        của người khác trong 7 ngày qua.
-        """      
-        one_week_ago = timezone.now() - timedelta(days=7)
-
-        Profile.objects.update(is_weekly_helper=False)
-
-        total_comments = Comment.objects.filter(created__gte=one_week_ago).count()
-        print(f"DEBUG: Total comments in last 7 days: {total_comments}")
-
-        helper_candidates = Comment.objects.filter(
-            created__gte=one_week_ago,
-            is_bot=False  
-        ).exclude(
-            post__author=F('author')  
-        ).values(
-            'author' 
-        ).annotate(
-            commented_posts_count=Count('post', distinct=True)  
-        ).filter(
-            commented_posts_count__gte=5  # Điều kiện là >= 5 bài viết
-        )
-
-        candidates_list = list(helper_candidates)
-        print(f"DEBUG: Helper candidates: {candidates_list}")
-
-        helper_user_ids = [item['author'] for item in candidates_list]
-        print(f"DEBUG: Helper user IDs: {helper_user_ids}")
-
-        from django.contrib.auth.models import User
-        for user_id in helper_user_ids:
-            try:
-                user = User.objects.get(id=user_id)
-                profile, created = Profile.objects.get_or_create(user=user)
-                if created:
-                    print(f"DEBUG: Created profile for user {user.username}")
-            except User.DoesNotExist:
-                print(f"DEBUG: User with ID {user_id} does not exist")
-                continue
-
-        updated_count = 0
-        if helper_user_ids:
-            updated_count = Profile.objects.filter(user_id__in=helper_user_ids).update(is_weekly_helper=True)
-            print(f"DEBUG: Updated {updated_count} profiles")
-            
-            helper_profiles = Profile.objects.filter(user_id__in=helper_user_ids, is_weekly_helper=True)
-            verified_count = helper_profiles.count()
-            print(f"DEBUG: Verified {verified_count} profiles are now helpers")
-            
-            helper_usernames = [p.user.username for p in helper_profiles]
-            print(f"DEBUG: Helper usernames: {helper_usernames}")
-
-        return Response({
-            "message": f"Đã cập nhật thành công trạng thái helper. {updated_count} người dùng được đánh dấu là helper.",
-            "status": "success",
-            "debug_info": {
-                "total_comments_last_7_days": total_comments,
-                "candidates_found": len(candidates_list),
-                "profiles_updated": updated_count,
-                "helper_user_ids": helper_user_ids
-            }
-        })
-
     @action(detail=True, methods=['get'])
     def posts(self, request, username=None):
         """
@@ -943,18 +990,21 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            follow_obj, created = Follow.objects.get_or_create(
-                follower=request.user,
-                following=user_to_follow
-            )
+            # feeds.follow/unfollow giữ bộ đếm trên Profile và timeline đồng bộ
+            created = feeds.follow(request.user, user_to_follow)
 
             if not created:
-                follow_obj.delete()
+                feeds.unfollow(request.user, user_to_follow)
                 following = False
             else:
                 following = True
+                notifications.notify(
+                    recipient=user_to_follow,
+                    sender=request.user,
+                    notification_type='follow',
+                )
 
-            follower_count = Follow.objects.filter(following=user_to_follow).count()
+            follower_count = feeds.follower_count(user_to_follow.id)
 
             return Response({
                 'following': following,
@@ -975,14 +1025,17 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             )
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticatedOrReadOnly])
+    @query_budget(16)
     def profile(self, request, username=None):
         """
         Get user profile with posts - REVISED to use serializers for consistency.
         """
         try:
-            user = get_object_or_404(User, username=username)
+            user = get_object_or_404(User.objects.select_related('profile'), username=username)
             profile, created = Profile.objects.get_or_create(user=user)
-            posts = Post.objects.filter(author=user).order_by('-created_at')
+            posts = Post.objects.filter(author=user).select_related(
+                'author__profile', 'community', 'language'
+            ).prefetch_related('tags').order_by('-created_at')
             is_following = False
             if request.user.is_authenticated:
                 is_following = Follow.objects.filter(
@@ -1024,11 +1077,22 @@ class ConversationViewSet(viewsets.ViewSet):
     """
     permission_classes = [IsAuthenticated]
 
+    @query_budget(10)  # gồm cả notification khi deliver chạy inline
     def list(self, request):
-        """Get all conversations for the current user."""
-        conversations = request.user.conversations.all().prefetch_related('participants', 'messages').order_by('-updated_at')
-        serializer = ConversationSerializer(conversations, many=True, context={'request': request})
-        return Response(serializer.data)
+        """
+        Get the current user's conversations, most recently active first.
+        Cursor-paginated; a page costs three queries whatever the history size.
+        """
+        conversations = request.user.conversations.select_related(
+            'last_message_sender__profile'
+        ).prefetch_related(
+            Prefetch('participants', queryset=User.objects.select_related('profile')),
+            Prefetch('read_states', queryset=ConversationReadState.objects.filter(user=request.user), to_attr='my_read_states'),
+        )
+        paginator = ConversationCursorPagination()
+        page = paginator.paginate_queryset(conversations, request, view=self)
+        serializer = ConversationSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def get_or_create(self, request):
@@ -1046,19 +1110,7 @@ class ConversationViewSet(viewsets.ViewSet):
             if other_user == user:
                 return Response({'error': 'Cannot create conversation with yourself.'}, status=status.HTTP_400_BAD_REQUEST)
 
-            conversation = Conversation.objects.annotate(
-                num_participants=Count('participants')
-            ).filter(
-                participants=user
-            ).filter(
-                participants=other_user
-            ).filter(
-                num_participants=2
-            ).first()
-
-            if not conversation:
-                conversation = Conversation.objects.create()
-                conversation.participants.add(user, other_user)
+            conversation, _ = chat_state.get_or_create_direct(user, other_user)
 
             serializer = ConversationSerializer(conversation, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -1070,41 +1122,55 @@ class ConversationViewSet(viewsets.ViewSet):
 
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
-        """Retrieve all messages for a specific conversation."""
-        try:
-            conversation = get_object_or_404(Conversation, pk=pk)
-            # Ensure the user is a participant
-            if request.user not in conversation.participants.all():
+        """
+        Retrieve one window of a conversation's history, oldest first.
+        Query params: `limit` (default 50, max 200) and either `before=<message_id>`
+        (older messages) or `after=<message_id>` (newer messages).
+        Senders are sent once in `users`, keyed by id.
+        """
+        if not chat_state.is_participant(pk, request.user.id):
+            if chat_state.conversation_exists(pk):
                 return Response({'error': 'You are not a participant in this conversation.'}, status=status.HTTP_403_FORBIDDEN)
-            
-            messages = conversation.messages.all().order_by('created_at')
-            serializer = ChatMessageSerializer(messages, many=True, context={'request': request})
-            return Response(serializer.data)
-            
-        except Conversation.DoesNotExist:
             return Response({'error': 'Conversation not found.'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        if before and after:
+            return Response({'error': 'Use either before or after, not both.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', chat_state.HISTORY_PAGE_SIZE)), chat_state.HISTORY_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        window = chat_state.message_window(pk, before=before, after=after, limit=limit)
+        if window is None:
+            return Response({'error': 'Message not found in this conversation.'}, status=status.HTTP_404_NOT_FOUND)
+        messages, has_more_before, has_more_after = window
+
+        sender_ids = {message.sender_id for message in messages}
+        users = User.objects.filter(id__in=sender_ids).select_related('profile')
+        return Response({
+            'messages': ChatMessageCompactSerializer(messages, many=True).data,
+            'users': {str(user.id): UserBasicSerializer(user).data for user in users},
+            'has_more_before': has_more_before,
+            'has_more_after': has_more_after,
+        })
 
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
         """Send a message to a conversation via HTTP (fallback for WebSocket)."""
         try:
             conversation = get_object_or_404(Conversation, pk=pk)
-            if request.user not in conversation.participants.all():
+            if not chat_state.is_participant(conversation.id, request.user.id):
                 return Response({'error': 'You are not a participant in this conversation.'}, status=status.HTTP_403_FORBIDDEN)
             
             text = request.data.get('text', '').strip()
             if not text:
                 return Response({'error': 'Message text is required.'}, status=status.HTTP_400_BAD_REQUEST)
             
-            message = ChatMessage.objects.create(
-                conversation=conversation,
-                sender=request.user,
-                text=text
-            )
-            
-            conversation.save()
+            message = chat_state.post_message(conversation.id, request.user, text)
             
             serializer = ChatMessageSerializer(message, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -1114,6 +1180,41 @@ class ConversationViewSet(viewsets.ViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """
+        Mark the conversation as read up to `message_id` (latest message if omitted)
+        and broadcast the read receipt to connected participants.
+        """
+        conversation = get_object_or_404(Conversation, pk=pk)
+        if not conversation.participants.filter(id=request.user.id).exists():
+            return Response({'error': 'You are not a participant in this conversation.'}, status=status.HTTP_403_FORBIDDEN)
+
+        state = chat_state.mark_read(conversation.id, request.user, request.data.get('message_id'))
+        if state is None:
+            return Response({'error': 'Message not found in this conversation.'}, status=status.HTTP_404_NOT_FOUND)
+
+        receipt = chat_state.read_receipt(state)
+        async_to_sync(get_channel_layer().group_send)(
+            f'chat_{conversation.id}',
+            {'type': 'chat_event', 'event': {'type': 'read_receipt', **receipt}}
+        )
+        return Response({**receipt, 'unread_count': state.unread_count})
+
+    @action(detail=True, methods=['get'])
+    def state(self, request, pk=None):
+        """Presence, typing users and read receipts of a conversation (REST fallback for the WebSocket)."""
+        conversation = get_object_or_404(Conversation, pk=pk)
+        participant_ids = list(conversation.participants.values_list('id', flat=True))
+        if request.user.id not in participant_ids:
+            return Response({'error': 'You are not a participant in this conversation.'}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response({
+            'presence': {str(user_id): value for user_id, value in chat_state.presence(participant_ids).items()},
+            'typing': chat_state.typing_users(conversation.id, participant_ids),
+            'read_receipts': chat_state.read_receipts(conversation.id),
+        })
+
     def destroy(self, request, pk=None):
         """
         Xóa toàn bộ một cuộc hội thoại.
@@ -1202,25 +1303,29 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
+    query_budgets = {'list': QueryBudget(6)}
 
     def get_queryset(self):
         """
         Return notifications for the current authenticated user.
+        sender (+ profile) và submission được serializer đọc cho từng dòng: JOIN luôn để tránh N+1.
         """
-        return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(recipient=self.request.user).select_related(
+            'sender__profile', 'submission'
+        ).order_by('-created_at')
 
     @action(detail=False, methods=['get'], url_path='count', url_name='count_and_recent')
+    @query_budget(6)
     def count_and_recent(self, request):
         """
         Returns the unread notification count and a list of recent notifications.
         This single endpoint is more efficient for the frontend dropdown.
         """
-        user_notifications = self.get_queryset()
-        
-        unread_count = user_notifications.filter(is_read=False).count()
+        # Count comes from the cached counter (also pushed over ws/notifications/)
+        unread_count = notifications.unread_count(request.user.id)
         
         # Get the 10 most recent notifications for the dropdown
-        recent_notifications = user_notifications[:10]
+        recent_notifications = self.get_queryset()[:10]
         
         serializer = self.get_serializer(recent_notifications, many=True)
         
@@ -1235,15 +1340,16 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         notification = self.get_object()
         if notification.recipient != request.user:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        notification.is_read = True
-        notification.read_at = timezone.now()
-        notification.save()
+        updated = Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True, read_at=timezone.now())
+        if updated:
+            notifications.marked_read(request.user.id)
         return Response({'message': 'Notification marked as read'})
 
     @action(detail=False, methods=['post'], url_path='mark-all-read') 
     def mark_all_as_read(self, request):
         """Mark all notifications as read"""
         updated_count = self.get_queryset().filter(is_read=False).update(is_read=True, read_at=timezone.now())
+        notifications.reset_unread(request.user.id)
         return Response({
             'success': True,
             'message': f'Marked {updated_count} notifications as read'
@@ -1253,6 +1359,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     def clear_all(self, request):
         """Clear all notifications"""
         count, _ = self.get_queryset().delete()
+        notifications.reset_unread(request.user.id)
         return Response({'message': f'Cleared {count} notifications'})
 
 
@@ -1391,6 +1498,7 @@ def current_user(request):
 
 
 # Search API
+@query_budget(8)
 @api_view(['GET'])
 @permission_classes([])
 def search_api(request):
@@ -1469,6 +1577,10 @@ def search_users_enhanced(query):
 def format_post_results(posts, request):
     """Format post results for API response"""
     results = []
+    post_ids = [post.id for post in posts]
+    comment_counts = dict(
+        Comment.objects.filter(post_id__in=post_ids).values('post_id').annotate(n=Count('id')).order_by().values_list('post_id', 'n')
+    )
 
     for post in posts:
         content_snippet = post.content[:100] + '...' if len(post.content) > 100 else post.content
@@ -1480,8 +1592,8 @@ def format_post_results(posts, request):
             'author': post.author.username,
             'community': post.community.name if post.community else None,
             'created_at': post.created_at.isoformat(),
-            'vote_score': getattr(post, 'calculated_score', 0),
-            'comment_count': post.comments.count() if hasattr(post, 'comments') else 0
+            'vote_score': post.score,
+            'comment_count': comment_counts.get(post.id, 0)
         })
 
     return results
@@ -1490,6 +1602,9 @@ def format_post_results(posts, request):
 def format_user_results(users, request):
     """Format user results for API response"""
     results = []
+    post_counts = dict(
+        Post.objects.filter(author_id__in=[user.id for user in users]).values('author_id').annotate(n=Count('id')).order_by().values_list('author_id', 'n')
+    )
 
     for user in users:
         results.append({
@@ -1498,7 +1613,7 @@ def format_user_results(users, request):
             'karma': getattr(user.profile, 'karma', 0) if hasattr(user, 'profile') else 0,
             'joined': user.date_joined.isoformat(),
             'avatar': user.profile.avatar.url if hasattr(user, 'profile') and user.profile.avatar else None,
-            'post_count': user.posts.count() if hasattr(user, 'posts') else 0
+            'post_count': post_counts.get(user.id, 0)
         })
 
     return results
@@ -1508,9 +1623,8 @@ def format_user_results(users, request):
 @permission_classes([])
 def popular_tags(request):
     """Get popular tags"""
-    tags = Tag.objects.annotate(
-        post_count=Count('posts')
-    ).filter(post_count__gt=0).order_by('-post_count')[:10]
+    # Đọc bộ đếm posts_count (có index) thay vì COUNT qua bảng tag-post mỗi lần gọi
+    tags = Tag.objects.filter(posts_count__gt=0).order_by('-posts_count', 'name')[:10]
 
     serializer = TagSerializer(tags, many=True)
     return Response(serializer.data)
@@ -1639,10 +1753,11 @@ def get_ai_response(content_input: 'Union[str, list]') -> str:
             return None
 
     try:
-        response = client.models.generate_content(
-            model="gemini-flash-latest",
-            contents=content_input
-        )
+        with instrumentation.span('ai'):
+            response = client.models.generate_content(
+                model="gemini-flash-latest",
+                contents=content_input
+            )
 
         ai_text = response.text
         if not ai_text or not ai_text.strip():
@@ -1728,117 +1843,125 @@ def log_bug_view(request):
     """
     Receives bug data from the frontend and logs it to the database.
     """
-    language_name = request.data.get('language')
-    language_obj = None
-    if language_name:
-        language_obj, _ = Language.objects.get_or_create(
-            name__iexact=language_name,
-            defaults={'name': language_name.capitalize(), 'slug': slugify(language_name)}
-        )
-
-    error_message = request.data.get('error_message', '')
-    match = re.match(r'^(\w+Error):', error_message)
-    error_category = match.group(1) if match else "UnknownError"
+    language_id = bug_tracker.resolve_language(request.data.get('language'))
 
     data_to_log = {
-        'error_message': error_message,
-        'error_category': error_category,
+        'error_message': request.data.get('error_message', ''),
         'original_code': request.data.get('original_code'),
-        'fix_step_count': request.data.get('fix_step_count'),
+        'fix_step_count': request.data.get('fix_step_count') or 1,
         'fixed_code': request.data.get('fixed_code'), 
     }
 
     serializer = LoggedBugSerializer(data=data_to_log)
     if serializer.is_valid():
-        serializer.save(user=request.user, language=language_obj)
+        # Category and fingerprint are derived server-side from the message
+        bug_tracker.log_bug(user=request.user, language_id=language_id, **serializer.validated_data)
         return Response({"status": "success", "message": "Bug logged successfully."}, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+MAX_BUG_BATCH_SIZE = 500
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([GzipJSONParser])
+def log_bugs_batch_view(request):
+    """
+    Logs many bug reports in one request. The body is a JSON array of
+    reports (optionally gzip-encoded); each item is validated on its own and
+    the response carries one result per item, in input order.
+    """
+    reports = request.data
+    if not isinstance(reports, list) or not reports:
+        return Response({'error': 'Expected a non-empty JSON array of bug reports.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(reports) > MAX_BUG_BATCH_SIZE:
+        return Response({'error': f'At most {MAX_BUG_BATCH_SIZE} bug reports per batch.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = [None] * len(reports)
+    valid, positions = [], []
+    for index, item in enumerate(reports):
+        serializer = BugReportSerializer(data=item)
+        if serializer.is_valid():
+            valid.append(serializer.validated_data)
+            positions.append(index)
+        else:
+            results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+
+    for index, bug in zip(positions, bug_tracker.log_bugs(request.user, valid)):
+        results[index] = {'index': index, 'status': 'created', 'id': str(bug.id), 'fingerprint': bug.signature.fingerprint}
+
+    return Response({
+        'created': len(valid),
+        'failed': len(reports) - len(valid),
+        'results': results,
+    }, status=status.HTTP_201_CREATED if valid else status.HTTP_400_BAD_REQUEST)
+
+
+@query_budget(5)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def bug_stats_view(request):
     """
-    Calculates and returns statistics for the Community Bug Tracker.
+    Returns statistics for the Community Bug Tracker, served from the daily rollups.
     """
     period = request.query_params.get('period', 'weekly').lower()
-    
-    if period == 'weekly':
-        seven_days_ago = timezone.now().date() - timedelta(days=6) # Lấy 7 ngày, tính cả hôm nay
-        queryset = LoggedBug.objects.filter(logged_at__date__gte=seven_days_ago)
-        
-        # Heatmap data
-        heatmap_data = (
-            queryset
-            .annotate(day=TruncDay('logged_at')) # Truncate to day
-            .values('day')
-            .annotate(errors=Count('id'))
-            .order_by('day')
-        )
-        # Top 5 bugs
-        top_bugs = list(
-            queryset
-            .values('error_category', 'error_message', 'language__name')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:5]
-        )
-        
-    elif period == 'monthly':
-        # Dữ liệu 4 tuần gần nhất
-        four_weeks_ago = timezone.now().date() - timedelta(weeks=4)
-        queryset = LoggedBug.objects.filter(logged_at__date__gte=four_weeks_ago)
-
-        # Heatmap data
-        heatmap_data = (
-            queryset
-            .annotate(week=TruncWeek('logged_at')) # Truncate to week
-            .values('week')
-            .annotate(errors=Count('id'))
-            .order_by('week')
-        )
-        
-        # Top 5 bugs
-        top_bugs = list(
-            queryset
-            .values('error_category', 'error_message', 'language__name')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:5]
-        )
-    
-    else:
-        return Response({'error': 'Invalid period. Use "weekly" or "monthly".'}, status=status.HTTP_400_BAD_REQUEST)
 
-    top_bugs_serializer = BugStatsSerializer([
-        {'category': b.get('error_category', 'Error'), 'message': b.get('error_message', ''), 'count': b.get('count', 0), 'language': b.get('language__name', 'N/A')}
-        for b in top_bugs
-    ], many=True)
-    
-    heatmap_serializer = HeatmapDataSerializer([
-        {'day': item.get('day') or item.get('week'), 'errors': item.get('errors', 0)}
-        for item in heatmap_data
-    ], many=True)
+    stats = bug_tracker.get_stats(period)
+    if stats is None:
+        valid_periods = ', '.join(f'"{name}"' for name in bug_tracker.PERIODS)
+        return Response({'error': f'Invalid period. Use one of {valid_periods}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    top_bugs_serializer = BugStatsSerializer(stats['top_bugs'], many=True)
+    heatmap_serializer = HeatmapDataSerializer(stats['heatmap'], many=True)
 
     return Response({
         'heatmap': heatmap_serializer.data,
         'topBugs': top_bugs_serializer.data,
     })
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def vote_buffer_metrics_view(request):
+    """
+    Kích thước buffer vote (write-behind) và thời gian flush gần nhất.
+    """
+    return Response(vote_buffer.metrics())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def scheduler_metrics_view(request):
+    """
+    Lịch, lần chạy tiếp theo, thời gian chạy và số lần lỗi của các job bảo trì.
+    """
+    scheduler.load_jobs()
+    return Response(scheduler.metrics())
+
+def prometheus_metrics_view(request):
+    """
+    Latency histograms (theo route/span) và bộ đếm của process này, định dạng Prometheus.
+    Chỉ trả lời staff hoặc request mang `Authorization: Bearer <INSTRUMENTATION_TOKEN>`.
+    """
+    if not instrumentation.allowed(request):
+        return HttpResponse(status=404)
+    return HttpResponse(instrumentation.render(), content_type=instrumentation.CONTENT_TYPE)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def bug_reviews_view(request):
     """
     Fetches example instances of a specific common bug.
+    Accepts the `fingerprint` returned by bug_stats (preferred) or a raw
+    `error_message`, which is fingerprinted the same way logged bugs are.
     """
+    fingerprint = request.query_params.get('fingerprint')
     error_message = request.query_params.get('error_message')
-    if not error_message:
-        return Response({'error': 'error_message parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    if not fingerprint and not error_message:
+        return Response({'error': 'fingerprint or error_message parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    bug_examples = LoggedBug.objects.filter(
-        error_message=error_message
-    ).select_related('language').order_by('-logged_at')[:3]
-
-    if not bug_examples.exists():
+    bug_examples = bug_tracker.examples_for(fingerprint or fingerprints.fingerprint(error_message))
+    if not bug_examples:
         return Response({'error': 'No examples found for this bug.'}, status=status.HTTP_404_NOT_FOUND)
 
     serializer = LoggedBugSerializer(bug_examples, many=True)
@@ -2045,6 +2168,58 @@ class WeeklyChallengeViewSet(viewsets.ModelViewSet):
         # Trả về không có nội dung nếu người dùng chưa nộp bài
         return Response(None, status=status.HTTP_204_NO_CONTENT)
 
+    def _leaderboard_page(self, request, challenge):
+        """Serve one page of a materialized board as a rank range."""
+        paginator = StandardResultsSetPagination()
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get(paginator.page_size_query_param, paginator.page_size)), 1), paginator.max_page_size)
+        except ValueError:
+            return Response({'error': 'page and page_size must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = leaderboard.top_entries(challenge, page=page, page_size=page_size)
+        serializer = LeaderboardEntrySerializer(entries, many=True, context={'request': request})
+        return Response({
+            'page': page,
+            'page_size': page_size,
+            'has_next': len(entries) == page_size,
+            'results': serializer.data,
+        })
+
+    def _rank_response(self, request, challenge):
+        entry = leaderboard.entry_for(request.user, challenge)
+        if entry is None:
+            return Response(None, status=status.HTTP_204_NO_CONTENT)
+        return Response(LeaderboardEntrySerializer(entry, context={'request': request}).data)
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.AllowAny])
+    def leaderboard(self, request, pk=None):
+        """
+        Bảng xếp hạng của một challenge (phân trang theo rank).
+        """
+        return self._leaderboard_page(request, self.get_object())
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def my_rank(self, request, pk=None):
+        """
+        Thứ hạng của người dùng hiện tại trong challenge này.
+        """
+        return self._rank_response(request, self.get_object())
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny], url_path='leaderboard')
+    def global_leaderboard(self, request):
+        """
+        Bảng xếp hạng tổng của tất cả challenge.
+        """
+        return self._leaderboard_page(request, None)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated], url_path='my_rank')
+    def my_global_rank(self, request):
+        """
+        Thứ hạng tổng của người dùng hiện tại.
+        """
+        return self._rank_response(request, None)
+
 class ChallengeSubmissionViewSet(viewsets.ModelViewSet):
     """
     ViewSet để người dùng nộp bài giải cho các challenge.
@@ -2081,28 +2256,31 @@ class ChallengeSubmissionViewSet(viewsets.ModelViewSet):
             new_status = request.data.get('status')
             if new_status in ['approved', 'rejected']:
                 self.notify_user_of_review(submission, new_status, request.user)
+            if 'status' in request.data or 'runtime_ms' in request.data:
+                leaderboard.record_verdict(submission.challenge, submission.user)
 
         return response
+
+    def perform_destroy(self, instance):
+        challenge, user = instance.challenge, instance.user
+        instance.delete()
+        leaderboard.record_verdict(challenge, user)
     
     def notify_admins(self, submission):
         """
         Tìm tất cả admin và tạo notification cho họ.
         """
-        admin_users = User.objects.filter(profile__role='ADMIN')
-        
+        admin_ids = User.objects.filter(profile__role='ADMIN').values_list('id', flat=True)
         sender = submission.user
-        
-        for admin in admin_users:
-            if admin == sender:
-                continue
-                
-            Notification.objects.create(
-                recipient=admin,
-                sender=sender,
-                notification_type='challenge_submission',
-                submission=submission,
-                message=f"{sender.username} has submitted a solution for the challenge '{submission.challenge.title[:30]}...'"
-            )
+
+        # Một sự kiện cho tất cả admin; worker ghi bằng một bulk_create (deliver bỏ qua chính sender)
+        notifications.notify_many(
+            recipients=list(admin_ids),
+            sender=sender,
+            notification_type='challenge_submission',
+            submission=submission,
+            message=f"{sender.username} has submitted a solution for the challenge '{submission.challenge.title[:30]}...'"
+        )
 
     def notify_user_of_review(self, submission, new_status, admin_user):
         """
@@ -2115,7 +2293,7 @@ class ChallengeSubmissionViewSet(viewsets.ModelViewSet):
         else: # rejected
             message = f"Your solution for '{submission.challenge.title[:30]}...' needs improvement. See feedback from the admin."
             
-        Notification.objects.create(
+        notifications.notify(
             recipient=recipient,
             sender=admin_user, 
             notification_type='challenge_review', 
@@ -2532,8 +2710,8 @@ def chat_with_ai_view(request):
         if not ai_response_raw_text:
             raise Exception("AI service returned an empty response.")
 
-        formatter = AICommentFormatter()
-        formatted_html_response = formatter.format_full_response(ai_response_raw_text, post=None)
+        with instrumentation.span('format'):
+            formatted_html_response = AICommentFormatter().format_full_response(ai_response_raw_text, post=None)
 
         ai_message = ChatMessage.objects.create(
             conversation=conversation,
@@ -0,0 +1,231 @@
+"""
+In-process benchmarks for the REST API hot paths (`manage.py benchmark_api`).
+
+seed_dataset() fills a throwaway test database with a fixed-size, fixed-seed
+dataset through posts.seeding, plus the benchmark user's conversations,
+notifications and bug reports. The benchmark user's last_name records the
+scale and seed, so dataset_label() tells whether a kept database (--keepdb)
+holds the requested dataset. run() then drives every scenario through
+the Django test client, as that user, and records per scenario:
+- latency percentiles (the warm-up requests are dropped)
+- the number of SQL queries per request
+- the response size in bytes
+- the view's query budget (posts/query_budget.py), when it declares one
+A response outside 2xx raises ScenarioFailed: an error page is not a timing.
+
+compare() checks a run against a stored baseline. It flags a scenario
+when:
+- p50 or p90 latency grew by more than the latency threshold (and by at
+  least min_latency_delta_ms, so noise on sub-millisecond endpoints is
+  ignored)
+- the request ran more queries than the baseline allows
+- the response grew by more than the bytes threshold
+- the request ran more queries than its view's budget, baseline or not
+"""
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import bug_tracker, chat_state, notifications, seeding
+from .management.commands.generate_dummy_posts import CODE_TEMPLATES, snippet_rows
+from .models import Community, Post
+
+SCALES = {
+    'small': {'users': 200, 'posts': 2_000, 'comments': 5_000, 'votes': 20_000},
+    'medium': {'users': 2_000, 'posts': 20_000, 'comments': 50_000, 'votes': 200_000},
+    'large': {'users': 20_000, 'posts': 200_000, 'comments': 500_000, 'votes': 2_000_000},
+}
+BENCH_USERNAME = 'benchmark_user'
+CONVERSATIONS = 20
+MESSAGES_PER_CONVERSATION = 20
+NOTIFICATIONS = 60
+BUG_REPORTS = 300
+BUG_MESSAGES = [
+    "TypeError: 'NoneType' object is not subscriptable",
+    "KeyError: 'id'",
+    "IndexError: list index out of range",
+    "ReferenceError: foo is not defined",
+    "NullPointerException at Main.java:42",
+    "SyntaxError: invalid syntax",
+]
+
+
+class ScenarioFailed(Exception):
+    pass
+
+
+class Scenario:
+    def __init__(self, name, method, path, data=None):
+        self.name = name
+        self.method = method
+        self.path = path  # str, or callable(context, iteration) -> str
+        self.data = data
+
+    def request(self, client, context, iteration):
+        path = self.path(context, iteration) if callable(self.path) else self.path
+        if self.method == 'post':
+            return client.post(path, self.data, content_type='application/json')
+        return client.get(path)
+
+
+SCENARIOS = [
+    Scenario('posts_list', 'get', '/api/posts/'),
+    Scenario('posts_list_page_5', 'get', '/api/posts/?page=5'),
+    Scenario('search', 'get', '/api/search/?q=python'),
+    # Toggles on a rotating post: alternately creates and removes the vote
+    Scenario('vote', 'post', lambda context, i: f"/api/posts/{context['post_ids'][(i // 2) % len(context['post_ids'])]}/vote/", {'vote_type': 'up'}),
+    Scenario('notifications_count_and_recent', 'get', '/api/notifications/count/'),
+    Scenario('conversations_list', 'get', '/api/conversations/'),
+    Scenario('bug_stats', 'get', '/api/bugs/stats/?period=weekly'),
+]
+
+
+# --- Dataset ----------------------------------------------------------------
+
+def seed_dataset(scale, seed=0, workers=1, progress=None):
+    """Seed the current (test) database. Returns the sizes used."""
+    sizes = SCALES[scale]
+    seeding.seed_users(sizes['users'], seed=seed, progress=progress)
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    owner = User.objects.get(id=user_ids[0])
+    for index in range(5):
+        Community.objects.get_or_create(name=f'Benchmark {index}', defaults={'owner': owner})
+    community_ids = list(Community.objects.order_by('id').values_list('id', flat=True))
+    tags = seeding.language_tags(list(CODE_TEMPLATES))
+    seeding.seed_posts(sizes['posts'], snippet_rows(tags), user_ids, community_ids, seed=seed, workers=workers, progress=progress)
+    post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+    seeding.seed_comments(sizes['comments'], post_ids, user_ids, seed=seed, workers=workers, progress=progress)
+    seeding.seed_votes(sizes['votes'], post_ids, user_ids, seed=seed, workers=workers, progress=progress)
+    seeding.finish()
+
+    bench_user = User.objects.create_user(BENCH_USERNAME, password=None, last_name=dataset_label(scale, seed))
+    others = list(User.objects.exclude(id=bench_user.id).order_by('id')[:CONVERSATIONS])
+    for other in others:
+        conversation, _ = chat_state.get_or_create_direct(bench_user, other)
+        for index in range(MESSAGES_PER_CONVERSATION):
+            chat_state.post_message(conversation.id, other if index % 2 else bench_user, f'Benchmark message {index}')
+    for index, post_id in enumerate(post_ids[:NOTIFICATIONS]):
+        notifications.deliver([bench_user.id], others[index % len(others)].id, 'comment',
+                              message='commented on your post', post_id=post_id)
+    bug_tracker.log_bugs(bench_user, [
+        {
+            'language': ('Python', 'JavaScript', 'Java')[index % 3],
+            'error_message': BUG_MESSAGES[index % len(BUG_MESSAGES)],
+            'original_code': f'print(items[{index}])',
+            'fixed_code': f'print(items[{index}] if len(items) > {index} else None)',
+        }
+        for index in range(BUG_REPORTS)
+    ])
+    return sizes
+
+
+def dataset_label(scale, seed):
+    return f'{scale} seed={seed}'
+
+
+def seeded_dataset():
+    """The dataset_label() the current database was seeded with, or None if it was not."""
+    return User.objects.filter(username=BENCH_USERNAME).values_list('last_name', flat=True).first()
+
+
+# --- Measuring ----------------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def measure(scenario, client, context, iterations, warmup):
+    latencies, queries, sizes, statuses = [], [], [], set()
+    budgets, over_budget = [], 0
+    for iteration in range(warmup + iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = scenario.request(client, context, iteration)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        if not 200 <= response.status_code < 300:
+            raise ScenarioFailed(
+                f'{scenario.name}: {scenario.method.upper()} answered {response.status_code}: {response.content[:300]!r}'
+            )
+        if iteration < warmup:
+            continue
+        latencies.append(elapsed_ms)
+        queries.append(len(captured.captured_queries))
+        sizes.append(len(response.content))
+        statuses.add(response.status_code)
+        # The middleware counts queries the same way the budget does (no BEGIN/COMMIT/SAVEPOINT)
+        if response.has_header('X-Query-Budget'):
+            budgets.append(int(response['X-Query-Budget']))
+            over_budget += int(response['X-DB-Query-Count']) > budgets[-1]
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'status_codes': sorted(statuses),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p90_ms': round(percentile(latencies, 0.90), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'max_ms': round(latencies[-1], 3),
+        'queries_median': statistics.median(queries),
+        'queries_max': max(queries),
+        'bytes_median': statistics.median(sizes),
+        'query_budget': min(budgets) if budgets else None,
+        'over_budget': over_budget,
+    }
+
+
+def run(iterations=50, warmup=5, only=None):
+    """Run the scenarios (all, or the names in `only`) as the benchmark user. Returns the results document."""
+    cache.clear()
+    client = Client()
+    client.force_login(User.objects.get(username=BENCH_USERNAME))
+    context = {'post_ids': list(Post.objects.order_by('-id').values_list('id', flat=True)[:100])}
+    results = {}
+    for scenario in SCENARIOS:
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = measure(scenario, client, context, iterations, warmup)
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': iterations,
+            'warmup': warmup,
+            'posts': Post.objects.count(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, latency_threshold=0.25, min_latency_delta_ms=1.0, query_increase=0, bytes_threshold=0.10):
+    """[(scenario, message), ...] for every regression of `current` against `baseline`."""
+    regressions = []
+    for name, result in current['results'].items():
+        if result.get('over_budget'):
+            regressions.append((name, f"{result['over_budget']} request(s) over the view's query budget ({result['query_budget']})"))
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        for key in ('p50_ms', 'p90_ms'):
+            delta = result[key] - base[key]
+            if delta > min_latency_delta_ms and result[key] > base[key] * (1 + latency_threshold):
+                regressions.append((name, f'{key} {base[key]:.2f} -> {result[key]:.2f} ms (+{delta / base[key]:.0%})'))
+        if result['queries_max'] > base['queries_max'] + query_increase:
+            regressions.append((name, f"queries {base['queries_max']} -> {result['queries_max']}"))
+        if base['bytes_median'] and result['bytes_median'] > base['bytes_median'] * (1 + bytes_threshold):
+            regressions.append((name, f"bytes {base['bytes_median']:.0f} -> {result['bytes_median']:.0f}"))
+    return regressions
@@ -0,0 +1,388 @@
+"""
+Community Bug Tracker ingestion and aggregation.
+
+Each logged bug is fingerprinted (see fingerprints.py) and attached to a
+canonical BugSignature, its code bodies are stored once per content hash in
+CodeSnippet, and one BugDailyRollup row keyed by (day, language, signature)
+is incremented. The stats endpoint reads only those rollups, and the
+`reconcile_bug_rollups` command rebuilds recent days from raw LoggedBug rows
+to repair any drift. `log_bugs` is the batched variant used by the bulk
+ingestion endpoint: a fixed number of queries per batch instead of per report,
+plus a get_or_create for each language name not yet in the cache.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Greatest, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import fingerprints
+from .models import BugDailyRollup, BugSignature, CodeSnippet, Language, LoggedBug
+
+STATS_CACHE_TIMEOUT = 5 * 60  # seconds; several warm_stats intervals, so a late run never lets it expire
+LANGUAGE_CACHE_TIMEOUT = 60 * 60  # seconds
+TOP_BUGS_LIMIT = 5
+
+# period -> (days covered including today, heatmap bucket)
+PERIODS = {
+    'weekly': (7, 'day'),
+    'monthly': (28, 'week'),
+    'quarterly': (90, 'week'),
+    'yearly': (365, 'month'),
+}
+
+_BUCKET_FUNCTIONS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def resolve_language(name):
+    """Language id for a name (case-insensitive), creating the Language on first sight."""
+    if not name:
+        return None
+    key = name.strip().lower()
+    cache_key = _language_cache_key(key)
+    language_id = cache.get(cache_key)
+    if language_id is None:
+        language, _ = Language.objects.get_or_create(
+            name__iexact=key,
+            defaults={'name': key.capitalize(), 'slug': slugify(key)}
+        )
+        language_id = language.id
+        # Cached only once committed, so a rollback cannot leave a dangling id behind
+        transaction.on_commit(lambda: cache.set(cache_key, language_id, LANGUAGE_CACHE_TIMEOUT))
+    return language_id
+
+
+def _language_cache_key(name):
+    # Hashed: the name comes straight from the client
+    return f'bug_language_{fingerprints.content_hash(name)}'
+
+
+def intern_code(code):
+    """Return the CodeSnippet holding `code`, creating it on first sight."""
+    if code is None:
+        return None
+    digest = fingerprints.content_hash(code)
+    snippet = CodeSnippet.objects.filter(content_hash=digest).first()
+    if snippet is not None:
+        return snippet
+    try:
+        with transaction.atomic():
+            return CodeSnippet.objects.create(content_hash=digest, code=code)
+    except IntegrityError:
+        return CodeSnippet.objects.get(content_hash=digest)
+
+
+def touch_signature(error_message, occurrences=1, seen_at=None):
+    """
+    Resolve the BugSignature for an error message and add `occurrences` to its
+    counters in a single UPDATE (or INSERT on first sight).
+    """
+    seen_at = seen_at or timezone.now()
+    category = fingerprints.categorize(error_message)
+    fp = fingerprints.fingerprint(error_message, category)
+
+    counters = {
+        'occurrence_count': F('occurrence_count') + occurrences,
+        'last_seen': Greatest(F('last_seen'), seen_at),
+    }
+    if not BugSignature.objects.filter(fingerprint=fp).update(**counters):
+        try:
+            with transaction.atomic():
+                return BugSignature.objects.create(
+                    fingerprint=fp,
+                    error_category=category,
+                    normalized_message=fingerprints.normalize(error_message),
+                    sample_message=(error_message or '')[:255],
+                    occurrence_count=occurrences,
+                    last_seen=seen_at,
+                )
+        except IntegrityError:
+            BugSignature.objects.filter(fingerprint=fp).update(**counters)
+    return BugSignature.objects.get(fingerprint=fp)
+
+
+def log_bug(*, user, language_id, error_message, original_code, fixed_code=None, fix_step_count=1):
+    """
+    Store one bug report and update its signature and daily rollup, all in
+    one transaction so the counters never drift from the LoggedBug rows.
+    """
+    with transaction.atomic():
+        signature = touch_signature(error_message)
+        bug = LoggedBug.objects.create(
+            user=user,
+            language_id=language_id,
+            error_message=error_message,
+            error_category=signature.error_category,
+            signature=signature,
+            original_snippet=intern_code(original_code),
+            fixed_snippet=intern_code(fixed_code),
+            fix_step_count=fix_step_count,
+        )
+        record_bug(bug)
+    return bug
+
+
+def _intern_codes(codes):
+    """Map each distinct code body to its CodeSnippet id with one INSERT and one SELECT."""
+    by_hash = {fingerprints.content_hash(code): code for code in codes if code is not None}
+    if not by_hash:
+        return {}
+    CodeSnippet.objects.bulk_create(
+        [CodeSnippet(content_hash=digest, code=code) for digest, code in by_hash.items()],
+        ignore_conflicts=True,
+    )
+    ids = dict(CodeSnippet.objects.filter(content_hash__in=by_hash).values_list('content_hash', 'id'))
+    return {code: ids[digest] for digest, code in by_hash.items()}
+
+
+def _touch_signatures(messages, seen_at):
+    """
+    Batched touch_signature: returns {error_message: BugSignature}, creating
+    missing signatures in one INSERT and bumping every counter in one UPDATE.
+    """
+    fingerprinted = {}
+    for message in messages:
+        category = fingerprints.categorize(message)
+        fingerprinted[message] = (fingerprints.fingerprint(message, category), category)
+
+    occurrences = Counter(fp for fp, _ in (fingerprinted[message] for message in messages))
+    samples = {}
+    for message, (fp, category) in fingerprinted.items():
+        samples.setdefault(fp, (message, category))
+
+    existing = set(BugSignature.objects.filter(fingerprint__in=occurrences).values_list('fingerprint', flat=True))
+    BugSignature.objects.bulk_create(
+        [
+            BugSignature(
+                fingerprint=fp,
+                error_category=category,
+                normalized_message=fingerprints.normalize(message),
+                sample_message=message[:255],
+                occurrence_count=0,
+                last_seen=seen_at,
+            )
+            for fp, (message, category) in samples.items() if fp not in existing
+        ],
+        ignore_conflicts=True,
+    )
+    BugSignature.objects.filter(fingerprint__in=occurrences).update(
+        occurrence_count=F('occurrence_count') + Case(
+            *[When(fingerprint=fp, then=Value(count)) for fp, count in occurrences.items()], default=Value(0)
+        ),
+        last_seen=Greatest(F('last_seen'), seen_at),
+    )
+
+    signatures = BugSignature.objects.filter(fingerprint__in=occurrences).in_bulk(field_name='fingerprint')
+    return {message: signatures[fp] for message, (fp, _) in fingerprinted.items()}
+
+
+def log_bugs(user, reports):
+    """
+    Store a batch of validated bug reports (dicts shaped like log_bug's
+    keyword arguments, with the language given by name under `language`).
+    Returns the created LoggedBug instances, in input order.
+    """
+    if not reports:
+        return []
+
+    now = timezone.now()
+    with transaction.atomic():
+        names = {report.get('language') for report in reports}
+        languages = {name: resolve_language(name) for name in names}
+        language_ids = [languages[report.get('language')] for report in reports]
+        signatures = _touch_signatures([report['error_message'] for report in reports], now)
+        snippets = _intern_codes(
+            [report.get('original_code') for report in reports] + [report.get('fixed_code') for report in reports]
+        )
+        bugs = LoggedBug.objects.bulk_create([
+            LoggedBug(
+                user=user,
+                language_id=language_id,
+                error_message=report['error_message'],
+                error_category=signatures[report['error_message']].error_category,
+                signature=signatures[report['error_message']],
+                original_snippet_id=snippets.get(report.get('original_code')),
+                fixed_snippet_id=snippets.get(report.get('fixed_code')),
+                fix_step_count=report.get('fix_step_count') or 1,
+            )
+            for report, language_id in zip(reports, language_ids)
+        ])
+
+        _increment_rollups(
+            timezone.localdate(now), Counter((bug.language_id, bug.signature_id) for bug in bugs)
+        )
+    return bugs
+
+
+def _rollup_key(day, language_id, signature_id):
+    return {
+        'day': day,
+        'language_id': language_id,
+        'signature_id': signature_id,
+    }
+
+
+def record_bug(bug):
+    """Increment the rollup row for a freshly inserted LoggedBug."""
+    key = _rollup_key(timezone.localdate(bug.logged_at), bug.language_id, bug.signature_id)
+    increment_rollup(key, 1)
+
+
+def _increment_rollups(day, amounts):
+    """
+    Batched increment_rollup for one day: {(language_id, signature_id): amount}.
+    Missing rows are inserted at zero, then one UPDATE adds every amount.
+    """
+    BugDailyRollup.objects.bulk_create(
+        [BugDailyRollup(count=0, **_rollup_key(day, *pair)) for pair in amounts],
+        ignore_conflicts=True,
+    )
+    keys = {pair: Q(language_id=pair[0], signature_id=pair[1]) if pair[0] is not None
+            else Q(language__isnull=True, signature_id=pair[1]) for pair in amounts}
+    matching = Q()
+    for condition in keys.values():
+        matching |= condition
+    BugDailyRollup.objects.filter(matching, day=day).update(
+        count=F('count') + Case(
+            *[When(keys[pair], then=Value(amount)) for pair, amount in amounts.items()], default=Value(0)
+        ),
+    )
+
+
+def increment_rollup(key, amount):
+    if BugDailyRollup.objects.filter(**key).update(count=F('count') + amount):
+        return
+    try:
+        with transaction.atomic():
+            BugDailyRollup.objects.create(count=amount, **key)
+    except IntegrityError:
+        # Another request created the row between our UPDATE and INSERT
+        BugDailyRollup.objects.filter(**key).update(count=F('count') + amount)
+
+
+def reconcile(days=2):
+    """
+    Recompute the rollups of the last `days` days (all days if None) from
+    LoggedBug rows. A full run also resets the signature counters.
+    Returns the number of rollup rows written.
+    """
+    bugs = LoggedBug.objects.filter(signature__isnull=False)
+    rollups = BugDailyRollup.objects.all()
+    if days is not None:
+        since = timezone.localdate() - timedelta(days=days - 1)
+        bugs = bugs.filter(logged_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    grouped = (
+        bugs.annotate(day=TruncDate('logged_at'))
+        .values('day', 'language_id', 'signature_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    fresh = [
+        BugDailyRollup(count=row['total'], **_rollup_key(row['day'], row['language_id'], row['signature_id']))
+        for row in grouped.iterator()
+    ]
+
+    with transaction.atomic():
+        rollups.delete()
+        BugDailyRollup.objects.bulk_create(fresh, batch_size=1000)
+
+        if days is None:
+            signatures = BugSignature.objects.in_bulk()
+            totals = {
+                row['signature_id']: row
+                for row in bugs.values('signature_id').annotate(total=Count('id'), last=Max('logged_at')).order_by()
+            }
+            for signature_id, signature in signatures.items():
+                row = totals.get(signature_id)
+                # Every bug of the signature deleted: nothing left to count
+                signature.occurrence_count = row['total'] if row else 0
+                signature.last_seen = row['last'] if row else signature.first_seen
+            BugSignature.objects.bulk_update(signatures.values(), ['occurrence_count', 'last_seen'], batch_size=1000)
+
+    warm_stats()  # overwrite rather than delete: no miss for the readers
+    return len(fresh)
+
+
+def _stats_cache_key(period):
+    return f'bug_stats_{period}'
+
+
+def get_stats(period):
+    """
+    Heatmap buckets and top bugs for a period, served from the rollups.
+    Returns None for an unknown period.
+    """
+    if period not in PERIODS:
+        return None
+
+    cache_key = _stats_cache_key(period)
+    stats = cache.get(cache_key)
+    if stats is None:
+        stats = _compute_stats(period)
+        cache.set(cache_key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def _compute_stats(period):
+    days, bucket = PERIODS[period]
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rollups = BugDailyRollup.objects.filter(day__gte=since)
+
+    if bucket == 'day':
+        buckets = rollups.values(bucket_start=F('day'))
+    else:
+        buckets = rollups.annotate(bucket_start=_BUCKET_FUNCTIONS[bucket]('day')).values('bucket_start')
+    heatmap = [
+        {'day': row['bucket_start'].isoformat(), 'errors': row['errors']}
+        for row in buckets.annotate(errors=Sum('count')).order_by('bucket_start')
+    ]
+
+    top_bugs = [
+        {
+            'category': row['signature__error_category'],
+            'message': row['signature__sample_message'],
+            'fingerprint': row['signature__fingerprint'],
+            'count': row['total'],
+            'language': row['language__name'] or 'N/A',
+        }
+        for row in rollups.values(
+            'signature__fingerprint', 'signature__error_category', 'signature__sample_message', 'language__name'
+        )
+        .annotate(total=Sum('count'))
+        .order_by('-total')[:TOP_BUGS_LIMIT]
+    ]
+
+    return {'heatmap': heatmap, 'top_bugs': top_bugs}
+
+
+def warm_stats():
+    """
+    Recompute every period's cached stats so the endpoint never computes them
+    inline. Each entry is overwritten only once its new value is ready, and
+    lives several job intervals (STATS_CACHE_TIMEOUT), so a late or skipped
+    run does not expose a miss either. Returns the periods warmed.
+    """
+    for period in PERIODS:
+        cache.set(_stats_cache_key(period), _compute_stats(period), STATS_CACHE_TIMEOUT)
+    return len(PERIODS)
+
+
+def examples_for(fingerprint, limit=3):
+    """Most recent occurrences of a signature, via the (signature, logged_at) index."""
+    signature = BugSignature.objects.filter(fingerprint=fingerprint).only('id').first()
+    if signature is None:
+        return []
+    return list(
+        LoggedBug.objects.filter(signature=signature)
+        .select_related('language', 'signature', 'original_snippet', 'fixed_snippet')
+        .order_by('-logged_at')[:limit]
+    )
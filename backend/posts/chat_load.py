@@ -0,0 +1,214 @@
+"""
+WebSocket load test for the chat layer (`manage.py chat_load_test`).
+
+Simulated clients talk to the ws/chat/<conversation_id>/ route in-process,
+through channels' WebsocketCommunicator and the same auth stack as
+devcove.asgi. Each client holds a real session cookie, so connect time
+includes the session and user lookups. The channel layer is the
+configured one (Redis) or an in-memory layer, as the caller chooses.
+
+run() creates `clients` users spread round-robin over `conversations`
+group conversations (in whatever database is active: the chat_load_test
+command switches to a throwaway test database first) and measures:
+- connect time: from opening the socket until the consumer's state
+  snapshot arrives, with every client connecting at once
+- fan-out latency: every message carries its send time, and every other
+  member of the conversation records how long it took to reach them
+- throughput: messages sent and deliveries per second over the send phase
+- lost deliveries: messages a member never received before the timeout.
+  A full channel layer queue drops group messages silently, so this
+  counter is how overload shows up.
+
+by_group_size() repeats run() for several group sizes at the same client
+count, to show how ChatConsumer's fan-out scales with the size of a room.
+"""
+import asyncio
+import json
+import time
+import uuid
+
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.db import transaction
+
+from . import chat_state
+from .benchmarks import percentile
+from .models import Conversation
+from .routing import websocket_urlpatterns
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+USERNAME_PREFIX = 'chatload_'
+MESSAGE_PREFIX = 'load '
+DEFAULT_TIMEOUT = 60  # seconds to wait for the last delivery
+
+
+class Client:
+    def __init__(self, user, session_key, conversation_id):
+        self.user = user
+        self.session_key = session_key
+        self.conversation_id = conversation_id
+        self.socket = None
+        self.connect_ms = None
+        self.expected = 0  # messages from the other members
+        self.latencies_ms = []
+        self.echoes = 0
+        self.last_received = None
+
+
+# --- Fixture ----------------------------------------------------------------
+
+def create_fixture(clients, conversations):
+    """`clients` users with sessions, round-robin over `conversations` group conversations. Returns [Client]."""
+    suffix = uuid.uuid4().hex[:8]
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{suffix}_{index}', password='!chatload') for index in range(clients)
+        ])
+        if users[0].pk is None:  # backends without RETURNING
+            users = list(User.objects.filter(username__startswith=f'{USERNAME_PREFIX}{suffix}_').order_by('id'))
+        rooms = [Conversation.objects.create() for _ in range(conversations)]
+        members = {room.id: [] for room in rooms}
+        for index, user in enumerate(users):
+            members[rooms[index % conversations].id].append(user)
+        for room in rooms:
+            room.participants.add(*members[room.id])
+            chat_state.ensure_read_states(room, [user.id for user in members[room.id]])
+
+    result = []
+    for index, user in enumerate(users):
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        result.append(Client(user, session.session_key, rooms[index % conversations].id))
+    return result
+
+
+def delete_fixture(clients):
+    Session.objects.filter(session_key__in=[client.session_key for client in clients]).delete()
+    Conversation.objects.filter(id__in={client.conversation_id for client in clients}).delete()
+    User.objects.filter(id__in=[client.user.id for client in clients]).delete()
+
+
+# --- Running ----------------------------------------------------------------
+
+async def _connect(application, client):
+    started = time.perf_counter()
+    client.socket = WebsocketCommunicator(
+        application, f'/ws/chat/{client.conversation_id}/',
+        headers=[(b'cookie', f'{settings.SESSION_COOKIE_NAME}={client.session_key}'.encode())],
+    )
+    connected, _ = await client.socket.connect(timeout=30)
+    if not connected:
+        raise RuntimeError(f'{client.user.username} could not connect')
+    while json.loads(await client.socket.receive_from(timeout=30)).get('type') != 'chat_state':
+        pass
+    client.connect_ms = (time.perf_counter() - started) * 1000
+
+
+async def _send(client, messages, interval):
+    for _ in range(messages):
+        await client.socket.send_json_to({'message': f'{MESSAGE_PREFIX}{time.perf_counter_ns()}'})
+        if interval:
+            await asyncio.sleep(interval)
+
+
+async def _receive(client, messages, deadline):
+    """Collect fan-out latencies until every expected message (and the client's own echoes) arrived."""
+    while len(client.latencies_ms) < client.expected or client.echoes < messages:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        try:
+            event = json.loads(await client.socket.receive_from(timeout=remaining))
+        except asyncio.TimeoutError:
+            return
+        text = event.get('text')
+        if not text or not text.startswith(MESSAGE_PREFIX):
+            continue  # presence, typing, read receipts
+        received_ns = time.perf_counter_ns()
+        client.last_received = time.perf_counter()
+        if event['sender']['id'] == client.user.id:
+            client.echoes += 1
+        else:
+            client.latencies_ms.append((received_ns - int(text[len(MESSAGE_PREFIX):])) / 1e6)
+
+
+def _ms(values, fraction):
+    value = percentile(values, fraction)
+    return None if value is None else round(value, 3)
+
+
+async def _run(clients, messages, interval, timeout):
+    application = AuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+    group_sizes = {}
+    for client in clients:
+        group_sizes[client.conversation_id] = group_sizes.get(client.conversation_id, 0) + 1
+    for client in clients:
+        client.expected = messages * (group_sizes[client.conversation_id] - 1)
+
+    connect_started = time.perf_counter()
+    try:
+        await asyncio.gather(*(_connect(application, client) for client in clients))
+        connect_seconds = time.perf_counter() - connect_started
+
+        started = time.perf_counter()
+        deadline = started + timeout
+        receivers = [asyncio.ensure_future(_receive(client, messages, deadline)) for client in clients]
+        await asyncio.gather(*(_send(client, messages, interval) for client in clients))
+        send_seconds = time.perf_counter() - started
+        await asyncio.gather(*receivers)
+        # Up to the last delivery, so lost messages do not count the timeout as work
+        elapsed = max([send_seconds] + [client.last_received - started for client in clients if client.last_received])
+    finally:
+        await asyncio.gather(*(client.socket.disconnect() for client in clients if client.socket), return_exceptions=True)
+
+    connect_ms = sorted(client.connect_ms for client in clients)
+    latencies = sorted(latency for client in clients for latency in client.latencies_ms)
+    sent = messages * len(clients)
+    expected = sum(client.expected for client in clients)
+    return {
+        'clients': len(clients),
+        'conversations': len(group_sizes),
+        'group_size': round(len(clients) / len(group_sizes), 2),
+        'messages_sent': sent,
+        'connect_ms': {'p50': _ms(connect_ms, 0.50), 'p95': _ms(connect_ms, 0.95), 'max': round(connect_ms[-1], 3)},
+        'connections_per_second': round(len(clients) / connect_seconds, 1),
+        'fanout_ms': {
+            'p50': _ms(latencies, 0.50), 'p95': _ms(latencies, 0.95), 'p99': _ms(latencies, 0.99),
+            'max': round(latencies[-1], 3) if latencies else None,
+        },
+        'send_seconds': round(send_seconds, 3),
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_per_second': round(sent / elapsed, 1),
+        'deliveries_per_second': round(len(latencies) / elapsed, 1),
+        'deliveries_expected': expected,
+        'deliveries_lost': expected - len(latencies),
+    }
+
+
+def run(clients, conversations, messages, interval=0.0, timeout=DEFAULT_TIMEOUT):
+    """One load run; see the module docstring. `interval` is the pause (seconds) between a client's messages."""
+    if clients < 2 or not 1 <= conversations <= clients // 2:
+        raise ValueError('Need at least 2 clients and at most clients // 2 conversations (2+ members each)')
+    fixture = create_fixture(clients, conversations)
+    try:
+        return asyncio.run(_run(fixture, messages, interval, timeout))
+    finally:
+        delete_fixture(fixture)
+
+
+def by_group_size(group_sizes, clients, messages, interval=0.0, timeout=DEFAULT_TIMEOUT):
+    """run() once per group size, with clients // size conversations. Returns [result]."""
+    results = []
+    for size in group_sizes:
+        conversations = max(1, clients // size)
+        results.append(run(conversations * size, conversations, messages, interval, timeout))
+    return results
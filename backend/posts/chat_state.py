@@ -0,0 +1,258 @@
+"""
+Real-time chat state: presence, typing indicators and read receipts.
+
+Presence and typing are ephemeral and live in the cache (Redis, the same
+server as the channel layer) with TTLs, so a crashed worker cannot leave a
+user "online" forever. Read receipts are durable: one ConversationReadState
+row per (conversation, user) holds the last-read message and an unread
+counter that is bumped on every send, so unread counts are a single row read.
+post_message is the one write path for new messages (WebSocket and REST),
+message_window the read path for history.
+"""
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ChatMessage, Conversation, ConversationReadState
+
+PRESENCE_TTL = 90  # seconds; clients heartbeat more often than this
+PRESENCE_REFRESH_INTERVAL = PRESENCE_TTL / 3  # a socket refreshes its presence at most this often
+TYPING_TTL = 6  # seconds
+LAST_SEEN_TTL = 60 * 60 * 24 * 30
+LAST_MESSAGE_PREVIEW_LENGTH = 255
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def _online_key(user_id):
+    return f'chat:online:{user_id}'
+
+
+def _last_seen_key(user_id):
+    return f'chat:last_seen:{user_id}'
+
+
+def _typing_key(conversation_id, user_id):
+    return f'chat:typing:{conversation_id}:{user_id}'
+
+
+# --- Presence ---------------------------------------------------------------
+
+def connect(user_id):
+    """Count one more open socket for the user (a user may have several tabs)."""
+    key = _online_key(user_id)
+    cache.add(key, 0, PRESENCE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, PRESENCE_TTL)
+    cache.touch(key, PRESENCE_TTL)
+
+
+def heartbeat(user_id):
+    if not cache.touch(_online_key(user_id), PRESENCE_TTL):
+        cache.set(_online_key(user_id), 1, PRESENCE_TTL)
+
+
+def disconnect(user_id):
+    """Drop one socket; the user goes offline when the last one closes."""
+    key = _online_key(user_id)
+    try:
+        remaining = cache.decr(key)
+    except ValueError:
+        remaining = 0
+    if remaining <= 0:
+        cache.delete(key)
+    cache.set(_last_seen_key(user_id), timezone.now().isoformat(), LAST_SEEN_TTL)
+    return remaining > 0
+
+
+def presence(user_ids):
+    """{user_id: {'online': bool, 'last_seen': iso string or None}}"""
+    keys = {}
+    for user_id in user_ids:
+        keys[_online_key(user_id)] = user_id
+        keys[_last_seen_key(user_id)] = user_id
+    values = cache.get_many(keys)
+    return {
+        user_id: {
+            'online': (values.get(_online_key(user_id)) or 0) > 0,
+            'last_seen': values.get(_last_seen_key(user_id)),
+        }
+        for user_id in user_ids
+    }
+
+
+# --- Typing -----------------------------------------------------------------
+
+def set_typing(conversation_id, user_id, is_typing):
+    if is_typing:
+        cache.set(_typing_key(conversation_id, user_id), True, TYPING_TTL)
+    else:
+        cache.delete(_typing_key(conversation_id, user_id))
+
+
+def typing_users(conversation_id, user_ids):
+    keys = {_typing_key(conversation_id, user_id): user_id for user_id in user_ids}
+    return [keys[key] for key in cache.get_many(keys)]
+
+
+# --- Messages ---------------------------------------------------------------
+
+def is_participant(conversation_id, user_id):
+    """Indexed lookup on the participants M2M table; never loads the member list."""
+    try:
+        return Conversation.participants.through.objects.filter(
+            conversation_id=conversation_id, user_id=user_id
+        ).exists()
+    except ValidationError:
+        return False
+
+
+def get_or_create_direct(user, other_user):
+    """
+    The 1:1 conversation between two users, found by its unique dm_key.
+    Concurrent callers race on the unique index, and the loser reads the winner's row.
+    Returns (conversation, created).
+    """
+    dm_key = Conversation.direct_key(user.id, other_user.id)
+    conversation = Conversation.objects.filter(dm_key=dm_key).first()
+    if conversation is not None:
+        return conversation, False
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(dm_key=dm_key)
+            conversation.participants.add(user, other_user)
+            ensure_read_states(conversation, [user.id, other_user.id])
+    except IntegrityError:
+        return Conversation.objects.get(dm_key=dm_key), False
+    return conversation, True
+
+
+def conversation_exists(conversation_id):
+    try:
+        return Conversation.objects.filter(id=conversation_id).exists()
+    except ValidationError:
+        return False
+
+
+def message_window(conversation_id, before=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One window of a conversation's history in chronological order, read
+    through the (conversation, created_at, id) index:
+    - neither `before` nor `after`: the latest `limit` messages
+    - `before=<message id>`: the `limit` messages preceding it (scrolling back)
+    - `after=<message id>`: the `limit` messages following it (catching up)
+
+    Returns (messages, has_more_before, has_more_after), or None if the pivot
+    message is not part of the conversation. The pivot itself lies beyond
+    the window, so that side always has more.
+    """
+    messages = ChatMessage.objects.filter(conversation_id=conversation_id).only(
+        'id', 'sender_id', 'text', 'created_at'
+    )
+    pivot_id = before or after
+    if pivot_id:
+        try:
+            pivot = messages.filter(id=pivot_id).values('id', 'created_at').first()
+        except ValidationError:
+            pivot = None
+        if pivot is None:
+            return None
+
+    if after:
+        newer = Q(created_at__gt=pivot['created_at']) | Q(created_at=pivot['created_at'], id__gt=pivot['id'])
+        window = list(messages.filter(newer).order_by('created_at', 'id')[:limit + 1])
+        return window[:limit], True, len(window) > limit
+
+    if before:
+        older = Q(created_at__lt=pivot['created_at']) | Q(created_at=pivot['created_at'], id__lt=pivot['id'])
+        messages = messages.filter(older)
+    window = list(messages.order_by('-created_at', '-id')[:limit + 1])
+    return window[:limit][::-1], len(window) > limit, bool(before)
+
+
+# --- Read receipts ----------------------------------------------------------
+
+def ensure_read_states(conversation, user_ids):
+    ConversationReadState.objects.bulk_create(
+        [ConversationReadState(conversation=conversation, user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def post_message(conversation_id, sender, text):
+    """
+    Store a message and, in the same transaction, refresh the conversation's
+    denormalized last-message columns and everyone's unread counters.
+    """
+    with transaction.atomic():
+        message = ChatMessage.objects.create(conversation_id=conversation_id, sender=sender, text=text)
+        Conversation.objects.filter(id=conversation_id).update(
+            updated_at=message.created_at,
+            last_message=message,
+            last_message_text=text[:LAST_MESSAGE_PREVIEW_LENGTH],
+            last_message_sender=sender,
+            last_message_at=message.created_at,
+        )
+        record_message(message)
+    return message
+
+
+def record_message(message):
+    """
+    Called after a message is stored: everyone else gets one more unread
+    message and the sender's own watermark moves to it.
+    """
+    states = ConversationReadState.objects.filter(conversation_id=message.conversation_id)
+    states.exclude(user_id=message.sender_id).update(unread_count=F('unread_count') + 1)
+    states.filter(user_id=message.sender_id).update(
+        last_read_message=message, last_read_at=message.created_at, unread_count=0
+    )
+
+
+def mark_read(conversation_id, user, message_id=None):
+    """
+    Move the user's watermark forward to `message_id` (the latest message if
+    None). Watermarks never move backwards. Returns the read state, or None
+    if the message does not belong to the conversation.
+    """
+    messages = ChatMessage.objects.filter(conversation_id=conversation_id)
+    if message_id is None:
+        message = messages.order_by('-created_at').only('id', 'created_at').first()
+    else:
+        try:
+            message = messages.filter(id=message_id).only('id', 'created_at').first()
+        except ValidationError:
+            message = None
+        if message is None:
+            return None
+
+    with transaction.atomic():
+        state, _ = ConversationReadState.objects.select_for_update().get_or_create(
+            conversation_id=conversation_id, user=user
+        )
+        if message is None or (state.last_read_at and message.created_at <= state.last_read_at):
+            return state
+
+        state.last_read_message = message
+        state.last_read_at = message.created_at
+        state.unread_count = messages.filter(created_at__gt=message.created_at).exclude(sender=user).count()
+        state.save(update_fields=['last_read_message', 'last_read_at', 'unread_count', 'updated_at'])
+    return state
+
+
+def read_receipt(state):
+    return {
+        'user_id': state.user_id,
+        'message_id': str(state.last_read_message_id) if state.last_read_message_id else None,
+        'read_at': state.last_read_at.isoformat() if state.last_read_at else None,
+    }
+
+
+def read_receipts(conversation_id):
+    states = ConversationReadState.objects.filter(conversation_id=conversation_id)
+    return [read_receipt(state) for state in states]
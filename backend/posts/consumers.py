@@ -1,11 +1,17 @@
 import json
+import logging
+import time
+from channels.consumer import SyncConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from .models import Conversation, ChatMessage
-from .serializers import ChatMessageSerializer
+from django.core.exceptions import ValidationError
+from .models import Conversation
+from . import chat_state, notifications
+from .instrumentation import InstrumentedConsumerMixin
 
-class ChatConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger(__name__)
+
+class ChatConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
         user = self.scope["user"]
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
@@ -13,21 +19,19 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         # Kiểm tra user đã đăng nhập chưa
         if not user.is_authenticated:
-            print(f"[TỪ CHỐI] Lý do: User chưa được xác thực.")
+            logger.info("Chat: từ chối kết nối tới %s, user chưa được xác thực", self.conversation_id)
             await self.close()
             return
             
-        print(f"[THÀNH CÔNG] User '{user.username}' đã được xác thực.")
-        
-        # Kiểm tra user có phải là thành viên cuộc trò chuyện không
-        is_member = await self.is_participant()
-        if not is_member:
-            print(f"[TỪ CHỐI] Lý do: User '{user.username}' không phải thành viên của cuộc trò chuyện '{self.conversation_id}'.")
+        # Kiểm tra user có phải là thành viên cuộc trò chuyện không.
+        # Danh sách thành viên được cache trên connection, không query lại mỗi tin nhắn.
+        self.participant_ids = await self.get_participant_ids()
+        self.is_typing = False
+        if user.id not in self.participant_ids:
+            logger.info("Chat: từ chối user %s, không phải thành viên của %s", user.id, self.conversation_id)
             await self.close()
             return
 
-        print(f"[THÀNH CÔNG] User '{user.username}' là thành viên. Chấp nhận kết nối.")
-
         # Tham gia vào group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -35,72 +39,143 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
-        print(f"--- Kết nối WebSocket cho '{self.room_group_name}' đã được chấp nhận. ---")
+        logger.debug("Chat: user %s đã kết nối %s", user.id, self.room_group_name)
+
+        # Presence + snapshot trạng thái hiện tại (online, đang gõ, đã đọc)
+        await database_sync_to_async(chat_state.connect)(user.id)
+        self.presence_refreshed_at = time.monotonic()
+        await self.send(text_data=json.dumps(await self.get_state_snapshot()))
+        await self.broadcast_presence(online=True)
 
     async def disconnect(self, close_code):
-        print(f"--- WebSocket đã ngắt kết nối, mã lỗi: {close_code} ---")
+        logger.debug("Chat: ngắt kết nối %s, mã %s", getattr(self, 'room_group_name', None), close_code)
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
+        if self.scope["user"].id in getattr(self, 'participant_ids', ()):
+            user = self.scope["user"]
+            await database_sync_to_async(chat_state.set_typing)(self.conversation_id, user.id, False)
+            still_online = await database_sync_to_async(chat_state.disconnect)(user.id)
+            if not still_online:
+                await self.broadcast_presence(online=False)
+
+    async def broadcast_presence(self, online):
+        user_id = self.scope["user"].id
+        state = await database_sync_to_async(chat_state.presence)([user_id])
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {'type': 'chat_event', 'event': {'type': 'presence', 'user_id': user_id, **state[user_id]}}
+        )
 
     @database_sync_to_async
+    def get_state_snapshot(self):
+        return {
+            'type': 'chat_state',
+            'presence': {str(user_id): value for user_id, value in chat_state.presence(self.participant_ids).items()},
+            'typing': chat_state.typing_users(self.conversation_id, self.participant_ids),
+            'read_receipts': chat_state.read_receipts(self.conversation_id),
+        }
+
     def create_message_payload(self, message_obj):
         """
-        Tạo payload message an toàn cho WebSocket (không dùng serializer để tránh lỗi UUID)
+        Tạo payload message an toàn cho WebSocket (không dùng serializer để tránh lỗi UUID).
+        Sender và conversation lấy từ connection, không lazy-load từ DB.
         """
-        try:
-            return {
-                'id': str(message_obj.id),  # Chuyển UUID thành string
-                'text': message_obj.text,
-                'message': message_obj.text,  # Để tương thích với frontend
-                'sender_username': message_obj.sender.username,
-                'sender': {
-                    'id': message_obj.sender.id,
-                    'username': message_obj.sender.username
-                },
-                'created_at': message_obj.created_at.isoformat(),  # Chuyển datetime thành ISO string
-                'conversation': str(message_obj.conversation.id)
-            }
-        except Exception as e:
-            print(f"Lỗi khi tạo payload: {e}")
-            return None
+        sender = self.scope["user"]
+        return {
+            'id': str(message_obj.id),  # Chuyển UUID thành string
+            'text': message_obj.text,
+            'message': message_obj.text,  # Để tương thích với frontend
+            'sender_username': sender.username,
+            'sender': {
+                'id': sender.id,
+                'username': sender.username
+            },
+            'created_at': message_obj.created_at.isoformat(),  # Chuyển datetime thành ISO string
+            'conversation': str(message_obj.conversation_id)
+        }
     
     async def receive(self, text_data):
         try:
             text_data_json = json.loads(text_data)
+
+            # Các sự kiện trạng thái; tin nhắn cũ (không có 'type') vẫn là chat message
+            event_type = text_data_json.get('type', 'message')
+            # Mọi frame từ client đều chứng tỏ user còn online, nhưng chỉ gia hạn presence
+            # tối đa mỗi PRESENCE_REFRESH_INTERVAL giây: không thêm một lượt Redis cho mỗi tin nhắn
+            now = time.monotonic()
+            if now - self.presence_refreshed_at >= chat_state.PRESENCE_REFRESH_INTERVAL:
+                self.presence_refreshed_at = now
+                await database_sync_to_async(chat_state.heartbeat)(self.scope["user"].id)
+            if event_type == 'heartbeat':
+                return
+            if event_type == 'typing':
+                await self.handle_typing(bool(text_data_json.get('is_typing', True)))
+                return
+            if event_type == 'read':
+                await self.handle_read(text_data_json.get('message_id'))
+                return
+
             message_text = text_data_json['message']
 
             # Lưu tin nhắn vào DB
             chat_message = await self.save_message(message_text)
 
             if chat_message:
-                # Tạo payload an toàn không chứa UUID objects
-                message_payload = await self.create_message_payload(chat_message)
-                
-                if message_payload:
-                    # Gửi payload đã được serialize đi
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            'type': 'chat_message',
-                            'message': message_payload 
-                        }
-                    )
-                else:
-                    print("Không thể tạo payload message")
+                # Gửi payload đã được serialize đi
+                await self.channel_layer.group_send(
+                    self.room_group_name,
+                    {
+                        'type': 'chat_message',
+                        'message': self.create_message_payload(chat_message)
+                    }
+                )
                     
         except json.JSONDecodeError:
-            print("Lỗi decode JSON")
+            logger.debug("Chat: tin nhắn không phải JSON hợp lệ")
             await self.send(text_data=json.dumps({'error': 'Invalid JSON format'}))
         except KeyError:
-            print("Thiếu trường 'message' trong dữ liệu")
+            logger.debug("Chat: thiếu trường 'message'")
             await self.send(text_data=json.dumps({'error': 'Message field is required'}))
         except Exception as e:
-            print(f"Lỗi trong receive: {e}")
+            logger.error("Chat: lỗi trong receive: %s", e, exc_info=True)
             await self.send(text_data=json.dumps({'error': 'Không thể gửi tin nhắn'}))
 
+    async def handle_typing(self, is_typing):
+        user = self.scope["user"]
+        self.is_typing = is_typing
+        await database_sync_to_async(chat_state.set_typing)(self.conversation_id, user.id, is_typing)
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat_event',
+                'event': {'type': 'typing', 'user_id': user.id, 'username': user.username, 'is_typing': is_typing},
+                'skip_channel': self.channel_name,
+            }
+        )
+
+    async def handle_read(self, message_id):
+        state = await database_sync_to_async(chat_state.mark_read)(
+            self.conversation_id, self.scope["user"], message_id
+        )
+        if state is None:
+            await self.send(text_data=json.dumps({'error': 'Unknown message_id'}))
+            return
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {'type': 'chat_event', 'event': {'type': 'read_receipt', **chat_state.read_receipt(state)}}
+        )
+
+    async def chat_event(self, event):
+        """
+        Sự kiện trạng thái (presence, typing, read_receipt) từ room group
+        """
+        if event.get('skip_channel') == self.channel_name:
+            return
+        await self.send(text_data=json.dumps(event['event']))
+
     async def chat_message(self, event):
         """
         Nhận message từ room group và gửi đến WebSocket
@@ -111,38 +186,81 @@ class ChatConsumer(AsyncWebsocketConsumer):
             # Gửi message đến client
             await self.send(text_data=json.dumps(message))
         except Exception as e:
-            print(f"Lỗi khi gửi message đến client: {e}")
+            logger.warning("Chat: lỗi khi gửi message đến client: %s", e)
 
     @database_sync_to_async
-    def is_participant(self):
-        user = self.scope["user"]
-        print(f"  [Kiểm tra DB] Đang kiểm tra user '{user.username}' (ID: {user.id}) trong cuộc trò chuyện '{self.conversation_id}'")
+    def get_participant_ids(self):
+        """Một query duy nhất trên bảng M2M; rỗng nếu conversation không tồn tại."""
         try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            is_member = conversation.participants.filter(id=user.id).exists()
-            print(f"  [Kiểm tra DB] Tìm thấy cuộc trò chuyện. Kết quả kiểm tra thành viên: {is_member}")
-            return is_member
-        except Conversation.DoesNotExist:
-            print(f"  [Kiểm tra DB] THẤT BẠI. Không tồn tại cuộc trò chuyện với ID '{self.conversation_id}'.")
-            return False
-        except Exception as e:
-            # Bắt các lỗi khác, ví dụ: id không phải là UUID hợp lệ
-            print(f"  [Kiểm tra DB] THẤT BẠI. Đã xảy ra lỗi không mong muốn: {e}")
-            return False
+            return set(
+                Conversation.participants.through.objects.filter(
+                    conversation_id=self.conversation_id
+                ).values_list('user_id', flat=True)
+            )
+        except (ValueError, ValidationError) as e:
+            # Ví dụ: id không phải là UUID hợp lệ
+            logger.info("Chat: conversation_id không hợp lệ '%s': %s", self.conversation_id, e)
+            return set()
 
     @database_sync_to_async
     def save_message(self, message_text):
+        """
+        Một lần chuyển sang thread DB cho mỗi tin nhắn: INSERT tin nhắn, UPDATE
+        các cột last_message/updated_at của conversation và bộ đếm chưa đọc.
+        """
         try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            message = ChatMessage.objects.create(
-                conversation=conversation,
-                sender=self.scope["user"],
-                text=message_text
-            )
-            # Cập nhật thời gian của conversation
-            conversation.save()
-            print(f"Đã lưu tin nhắn: ID={message.id}, Text='{message_text}', User='{self.scope['user'].username}'")
+            message = chat_state.post_message(self.conversation_id, self.scope["user"], message_text)
+            if self.is_typing:
+                self.is_typing = False
+                chat_state.set_typing(self.conversation_id, self.scope["user"].id, False)
             return message
         except Exception as e:
-            print(f"Lỗi khi lưu tin nhắn: {e}")
-            return None
\ No newline at end of file
+            logger.error("Chat: lỗi khi lưu tin nhắn: %s", e, exc_info=True)
+            return None
+
+
+
+class NotificationConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Kênh thông báo riêng của mỗi user: nhận notification mới và số chưa đọc
+    theo thời gian thực thay cho việc polling.
+    """
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = notifications.group_name(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        count = await database_sync_to_async(notifications.unread_count)(user.id)
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'count': count}))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_created(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event['notification'],
+            'count': event['count'],
+        }))
+
+    async def notification_count(self, event):
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'count': event['count']}))
+
+
+class NotificationWorker(SyncConsumer):
+    """
+    Worker cho kênh 'notifications' (chạy bằng `python manage.py runworker notifications`):
+    nhận các sự kiện do notifications.notify_many() đẩy vào và fan-out ngoài request.
+    """
+    def notification_fanout(self, message):
+        payload = {key: value for key, value in message.items() if key != 'type'}
+        try:
+            notifications.deliver(**payload)
+        except Exception as e:
+            notifications.logger.error("Notification fan-out failed: %s", e)
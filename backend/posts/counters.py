@@ -0,0 +1,96 @@
+"""
+Materialized Tag and Community statistics: posts_count, members_count
+(distinct post authors) and last_activity_at.
+
+The functions here are called from the Post and Post.tags signals in
+posts/signals.py and apply deltas with UPDATE ... SET x = x + n. A post
+entering a tag or community adds a member only if its author had no other
+post there, and leaving removes one only if the author has none left.
+Each check is one indexed EXISTS-style query per change.
+
+Bulk writes (bulk_create, queryset.update, raw SQL) bypass signals;
+rebuild() / the rebuild_taxonomy_counters command recomputes everything
+from the posts table.
+"""
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Community, Post, Tag
+
+PostTag = Post.tags.through
+
+
+def _apply(model, ids, posts_delta, member_ids=(), members_delta=0, active_at=None):
+    if not ids:
+        return
+    # Clamped at 0 so a drifted counter never trips the unsigned CHECK; rebuild() restores the true value
+    changes = {'posts_count': Greatest(F('posts_count') + posts_delta, Value(0))}
+    if active_at is not None:
+        changes['last_activity_at'] = Greatest(Coalesce(F('last_activity_at'), Value(active_at)), Value(active_at))
+    model.objects.filter(id__in=ids).update(**changes)
+    if member_ids and members_delta:
+        model.objects.filter(id__in=member_ids).update(members_count=Greatest(F('members_count') + members_delta, Value(0)))
+
+
+def _tags_with_other_posts_by(author_id, tag_ids, post_id):
+    return set(
+        PostTag.objects.filter(tag_id__in=tag_ids, post__author_id=author_id)
+        .exclude(post_id=post_id).values_list('tag_id', flat=True).distinct()
+    )
+
+
+def tags_added(post, tag_ids):
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    new_member_in = tag_ids - _tags_with_other_posts_by(post.author_id, tag_ids, post.id)
+    _apply(Tag, tag_ids, 1, new_member_in, 1, active_at=post.created_at or timezone.now())
+
+
+def tags_removed(post, tag_ids):
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    member_left = tag_ids - _tags_with_other_posts_by(post.author_id, tag_ids, post.id)
+    _apply(Tag, tag_ids, -1, member_left, -1)
+
+
+def _has_other_posts_in(community_id, author_id, post_id):
+    return Post.objects.filter(community_id=community_id, author_id=author_id).exclude(id=post_id).exists()
+
+
+def community_joined(post, community_id):
+    if community_id is None:
+        return
+    new_member = not _has_other_posts_in(community_id, post.author_id, post.id)
+    _apply(Community, [community_id], 1, [community_id] if new_member else (), 1,
+           active_at=post.created_at or timezone.now())
+
+
+def community_left(post, community_id):
+    if community_id is None:
+        return
+    member_left = not _has_other_posts_in(community_id, post.author_id, post.id)
+    _apply(Community, [community_id], -1, [community_id] if member_left else (), -1)
+
+
+def rebuild():
+    """Recompute every Tag and Community counter from the posts table. Returns (tags, communities) updated."""
+    def scalar(queryset, group_field, aggregate):
+        return Subquery(queryset.values(group_field).annotate(value=aggregate).values('value'))
+
+    tag_posts = PostTag.objects.filter(tag_id=OuterRef('id'))
+    tags = Tag.objects.update(
+        posts_count=Coalesce(scalar(tag_posts, 'tag_id', Count('post_id')), Value(0), output_field=IntegerField()),
+        members_count=Coalesce(scalar(tag_posts, 'tag_id', Count('post__author_id', distinct=True)), Value(0), output_field=IntegerField()),
+        last_activity_at=scalar(tag_posts, 'tag_id', Max('post__created_at')),
+    )
+
+    community_posts = Post.objects.filter(community_id=OuterRef('id'))
+    communities = Community.objects.update(
+        posts_count=Coalesce(scalar(community_posts, 'community_id', Count('id')), Value(0), output_field=IntegerField()),
+        members_count=Coalesce(scalar(community_posts, 'community_id', Count('author_id', distinct=True)), Value(0), output_field=IntegerField()),
+        last_activity_at=scalar(community_posts, 'community_id', Max('created_at')),
+    )
+    return tags, communities
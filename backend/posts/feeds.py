@@ -0,0 +1,166 @@
+"""
+Follower graph and the "following" timeline.
+
+Follow/unfollow go through follow() / unfollow(), which keep
+Profile.followers_count / following_count in step with the Follow table so
+profiles never COUNT the graph.
+
+Timelines are fanned out on write: a new post is copied into a FeedEntry
+row for each follower of its author, so reading a timeline is one indexed
+range scan. Authors with at least FANOUT_FOLLOWER_LIMIT followers are
+skipped at write time, because one post would cost that many rows. Their
+posts are pulled in at read time instead (fan-out on read) and merged into
+the timeline. Timelines are capped at TIMELINE_MAX_ENTRIES by prune().
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from .models import FeedEntry, Follow, Post, Profile
+
+FANOUT_FOLLOWER_LIMIT = 10000
+FANOUT_BATCH_SIZE = 1000
+FOLLOW_BACKFILL_POSTS = 50
+TIMELINE_MAX_ENTRIES = 800
+TIMELINE_PAGE_SIZE = 20
+
+
+# --- Follower graph ---------------------------------------------------------
+
+def follow(follower, followee):
+    """Returns True if a new Follow was created."""
+    try:
+        with transaction.atomic():
+            Follow.objects.create(follower=follower, following=followee)
+            Profile.objects.filter(user=followee).update(followers_count=F('followers_count') + 1)
+            Profile.objects.filter(user=follower).update(following_count=F('following_count') + 1)
+    except IntegrityError:
+        return False
+    if not is_pull_author(followee.id):
+        transaction.on_commit(lambda: backfill(follower.id, followee.id))
+    return True
+
+
+def unfollow(follower, followee):
+    """Returns True if a Follow was removed."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, following=followee).delete()
+        if not deleted:
+            return False
+        Profile.objects.filter(user=followee, followers_count__gt=0).update(followers_count=F('followers_count') - 1)
+        Profile.objects.filter(user=follower, following_count__gt=0).update(following_count=F('following_count') - 1)
+        FeedEntry.objects.filter(owner=follower, author=followee).delete()
+    return True
+
+
+def follower_count(user_id):
+    return Profile.objects.filter(user_id=user_id).values_list('followers_count', flat=True).first() or 0
+
+
+def reconcile_counts():
+    """Recompute every profile's follow counters from the Follow table. Returns the rows updated."""
+    def count_of(field):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{field: OuterRef('user_id')})
+            .values(field).annotate(n=Count('id')).values('n')
+        ), Value(0))
+
+    return Profile.objects.update(followers_count=count_of('following'), following_count=count_of('follower'))
+
+
+# --- Fan-out on write -------------------------------------------------------
+
+def is_pull_author(user_id):
+    """Authors with this many followers are read at request time rather than copied into timelines."""
+    return follower_count(user_id) >= FANOUT_FOLLOWER_LIMIT
+
+
+def fan_out(post):
+    """Copy a new post into its author's followers' timelines (run after commit)."""
+    if is_pull_author(post.author_id):
+        return 0
+    follower_ids = Follow.objects.filter(following_id=post.author_id).values_list('follower_id', flat=True)
+    written = 0
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(FeedEntry(owner_id=follower_id, post_id=post.id, author_id=post.author_id, created_at=post.created_at))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    return written + len(batch)
+
+
+def post_published(post):
+    transaction.on_commit(lambda: fan_out(post))
+
+
+def backfill(owner_id, author_id, limit=FOLLOW_BACKFILL_POSTS):
+    """Seed a new follower's timeline with the author's recent posts."""
+    recent = Post.objects.filter(author_id=author_id).order_by('-created_at', '-id').values_list('id', 'created_at')[:limit]
+    FeedEntry.objects.bulk_create([
+        FeedEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, created_at=created_at)
+        for post_id, created_at in recent
+    ], ignore_conflicts=True)
+
+
+def prune(max_entries=TIMELINE_MAX_ENTRIES):
+    """Trim every timeline to its newest `max_entries` rows. Returns the number of rows deleted."""
+    deleted = 0
+    owners = FeedEntry.objects.values('owner_id').annotate(n=Count('id')).filter(n__gt=max_entries)
+    for row in owners.iterator():
+        entries = FeedEntry.objects.filter(owner_id=row['owner_id'])
+        oldest_kept = entries.order_by('-created_at', '-post_id').values('created_at', 'post_id')[max_entries - 1]
+        older = Q(created_at__lt=oldest_kept['created_at']) | Q(created_at=oldest_kept['created_at'], post_id__lt=oldest_kept['post_id'])
+        count, _ = entries.filter(older).delete()
+        deleted += count
+    return deleted
+
+
+# --- Reading ----------------------------------------------------------------
+
+def encode_cursor(created_at, post_id):
+    return f'{created_at.isoformat()}_{post_id}'
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, post_id = cursor.rsplit('_', 1)
+        parsed = parse_datetime(created_at)
+        if parsed is None:
+            return None
+        return parsed, int(post_id)
+    except (ValueError, AttributeError):
+        return None
+
+
+def timeline(user, cursor=None, limit=TIMELINE_PAGE_SIZE):
+    """
+    One page of the user's following timeline, newest first, as
+    ([(post_id, created_at), ...], next_cursor). `cursor` is a decoded
+    (created_at, post_id) pair from the previous page; None starts at the top.
+    """
+    def older_than(queryset, created_field, id_field):
+        if cursor is None:
+            return queryset
+        created_at, post_id = cursor
+        return queryset.filter(
+            Q(**{f'{created_field}__lt': created_at})
+            | Q(**{created_field: created_at, f'{id_field}__lt': post_id})
+        )
+
+    pushed = older_than(FeedEntry.objects.filter(owner=user), 'created_at', 'post_id')
+    rows = list(pushed.order_by('-created_at', '-post_id').values_list('post_id', 'created_at')[:limit])
+
+    pull_authors = list(Profile.objects.filter(
+        user__follower_set__follower=user, followers_count__gte=FANOUT_FOLLOWER_LIMIT
+    ).values_list('user_id', flat=True))
+    if pull_authors:
+        pulled = older_than(Post.objects.filter(author_id__in=pull_authors), 'created_at', 'id')
+        rows += list(pulled.order_by('-created_at', '-id').values_list('id', 'created_at')[:limit])
+        rows = sorted(dict(rows).items(), key=lambda row: (row[1], row[0]), reverse=True)[:limit]
+
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+    return rows, next_cursor
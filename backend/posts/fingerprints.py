@@ -0,0 +1,77 @@
+"""
+Error message fingerprinting for the Community Bug Tracker.
+
+Messages are normalized (paths, quoted identifiers, addresses and numbers are
+replaced by placeholders) so that reports differing only by line numbers or
+variable names share one fingerprint. Pure functions only: data migrations
+import this module.
+"""
+import hashlib
+import re
+
+DEFAULT_CATEGORY = 'UnknownError'
+MAX_NORMALIZED_LENGTH = 255
+
+_CATEGORY_LINE_RE = re.compile(
+    r'^\s*(?:Uncaught\s+)?(?:[\w$]+\.)*([A-Z][\w$]*(?:Error|Exception|Warning))\b\s*(?::|$)',
+    re.MULTILINE,
+)
+_CATEGORY_ANYWHERE_RE = re.compile(r'\b([A-Z]\w*(?:Error|Exception|Warning))\b')
+
+# Order matters: URLs and paths first so their digits are not seen as numbers
+_NORMALIZERS = [
+    (re.compile(r'\b[a-z][a-z0-9+.-]*://\S+', re.IGNORECASE), '<url>'),
+    (re.compile(r'(?:[A-Za-z]:)?(?:[\\/][\w.@~-]+)+[\\/]?|(?:\.{1,2}|~)?(?:[\w.@-]+[\\/])+[\w.@-]+'), '<path>'),
+    (re.compile(r'\b[\w.-]+\.(?:py|pyw|js|jsx|mjs|cjs|ts|tsx|java|kt|rb|go|php|cs|cpp|cc|c|h|rs|swift|scala)\b'), '<path>'),
+    (re.compile(r'"(?:[^"\\\n]|\\.)*"'), '<str>'),
+    (re.compile(r"'(?:[^'\\\n]|\\.)*'"), '<str>'),
+    (re.compile(r'`[^`\n]*`'), '<str>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<hex>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'(?<![\w<])[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?\b', re.IGNORECASE), '<n>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def categorize(error_message):
+    """
+    Extract the exception class name. The last matching line wins so that the
+    final line of a traceback is preferred over the "Traceback" header.
+    """
+    message = error_message or ''
+    matches = _CATEGORY_LINE_RE.findall(message)
+    if matches:
+        return matches[-1]
+    match = _CATEGORY_ANYWHERE_RE.search(message)
+    return match.group(1) if match else DEFAULT_CATEGORY
+
+
+def headline(error_message):
+    """
+    The line that identifies the error: the final exception line of a
+    traceback, otherwise the first non-empty line.
+    """
+    message = error_message or ''
+    lines = [line for line in message.splitlines() if line.strip()]
+    for line in reversed(lines):
+        if _CATEGORY_LINE_RE.match(line):
+            return line.strip()
+    return lines[0].strip() if lines else ''
+
+
+def normalize(error_message):
+    normalized = headline(error_message)
+    for pattern, placeholder in _NORMALIZERS:
+        normalized = pattern.sub(placeholder, normalized)
+    return normalized.strip()[:MAX_NORMALIZED_LENGTH]
+
+
+def fingerprint(error_message, category=None):
+    """Stable 40-char fingerprint of (category, normalized message)."""
+    category = category or categorize(error_message)
+    payload = f'{category}\n{normalize(error_message)}'
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def content_hash(code):
+    return hashlib.sha256((code or '').encode('utf-8')).hexdigest()
@@ -0,0 +1,74 @@
+"""
+Weekly Helper badge.
+
+A user is a Weekly Helper while they commented (not as a bot) on at least
+MIN_POSTS distinct posts by other people in the last WINDOW_DAYS days.
+
+update() is set-based:
+- one grouped query finds the candidates
+- one bulk insert creates their missing profiles
+- two UPDATEs flip only the profiles whose flag actually changes
+Each change opens or closes a HelperPeriod, so the badge history survives
+the weekly recomputation. It is run by the update_helpers command on a
+schedule.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Comment, HelperPeriod, Profile
+
+logger = logging.getLogger(__name__)
+
+MIN_POSTS = 5
+WINDOW_DAYS = 7
+
+
+def candidate_ids(now=None):
+    since = (now or timezone.now()) - timedelta(days=WINDOW_DAYS)
+    return set(
+        Comment.objects.filter(created__gte=since, is_bot=False)
+        .exclude(post__author=F('author'))
+        .values('author')
+        .annotate(commented_posts=Count('post', distinct=True))
+        .filter(commented_posts__gte=MIN_POSTS)
+        .values_list('author', flat=True)
+    )
+
+
+def update(now=None):
+    """Recompute the badge. Returns {'candidates', 'profiles_created', 'promoted', 'demoted', 'seconds'}."""
+    started = time.monotonic()
+    now = now or timezone.now()
+    helper_ids = candidate_ids(now)
+
+    with transaction.atomic():
+        missing = helper_ids - set(Profile.objects.filter(user_id__in=helper_ids).values_list('user_id', flat=True))
+        Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+
+        current = Profile.objects.filter(is_weekly_helper=True)
+        demoted = list(current.exclude(user_id__in=helper_ids).values_list('user_id', flat=True))
+        promoted = list(
+            Profile.objects.filter(user_id__in=helper_ids, is_weekly_helper=False).values_list('user_id', flat=True)
+        )
+        Profile.objects.filter(user_id__in=demoted).update(is_weekly_helper=False)
+        Profile.objects.filter(user_id__in=promoted).update(is_weekly_helper=True)
+
+        HelperPeriod.objects.filter(user_id__in=demoted, ended_at__isnull=True).update(ended_at=now)
+        HelperPeriod.objects.bulk_create(
+            [HelperPeriod(user_id=user_id, started_at=now) for user_id in promoted], ignore_conflicts=True
+        )
+
+    summary = {
+        'candidates': len(helper_ids),
+        'profiles_created': len(missing),
+        'promoted': len(promoted),
+        'demoted': len(demoted),
+        'seconds': round(time.monotonic() - started, 4),
+    }
+    logger.info('Weekly helpers updated: %s', summary)
+    return summary
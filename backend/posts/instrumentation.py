@@ -0,0 +1,288 @@
+"""
+Latency instrumentation for HTTP requests and WebSocket consumer events,
+exported in Prometheus text format at /api/metrics/.
+
+Every request and every consumer event is counted. A sampled fraction
+(settings.INSTRUMENTATION_SAMPLE_RATE) is also timed, and its wall time
+is split into exclusive spans:
+- db: SQL queries, through an execute_wrapper installed on every connection
+- ai: Gemini calls (get_ai_response)
+- format: AICommentFormatter
+- serialize: rendering the response body
+- app: everything else, i.e. view and serializer code outside the spans above
+A span opened inside another pauses the outer one, so the spans of a
+request add up to its duration. Each span goes into a histogram per route
+(the URL name) and method, or per consumer and event type.
+
+Unsampled requests cost one random() call and a counter increment; with
+no trace active the DB wrapper is a single context-variable lookup.
+
+Metrics are kept in the process that served the request, so each ASGI/WSGI
+process is a scrape target. The endpoint only answers staff users and
+requests carrying `Authorization: Bearer <settings.INSTRUMENTATION_TOKEN>`.
+The client address is not trusted: behind a reverse proxy every request
+comes from the proxy.
+"""
+import bisect
+import contextvars
+import hmac
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from channels.exceptions import StopConsumer
+from django.conf import settings
+
+from . import scheduler, vote_buffer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_SAMPLE_RATE = 0.1
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help)
+METRICS = {
+    'devcove_http_requests_total': ('counter', 'HTTP requests by route, method and status.'),
+    'devcove_http_request_duration_seconds': ('histogram', 'Sampled HTTP request latency.'),
+    'devcove_http_request_span_seconds': ('histogram', 'Sampled HTTP request time per span (db, ai, format, serialize, app).'),
+    'devcove_ws_events_total': ('counter', 'WebSocket consumer events by consumer, event and outcome.'),
+    'devcove_ws_event_duration_seconds': ('histogram', 'Sampled consumer event handling latency.'),
+    'devcove_ws_event_span_seconds': ('histogram', 'Sampled consumer event time per span.'),
+}
+
+_trace = contextvars.ContextVar('instrumentation_trace', default=None)
+_lock = threading.Lock()
+_counters = defaultdict(int)  # (metric, labels) -> value
+_histograms = {}  # (metric, labels) -> Histogram
+
+
+def sample_rate():
+    return getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+
+
+def sampled():
+    rate = sample_rate()
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+# --- Tracing ----------------------------------------------------------------
+
+class Trace:
+    """Exclusive time per span for one request or event."""
+
+    def __init__(self):
+        self.started = self.mark = time.perf_counter()
+        self.current = 'app'
+        self.stack = []
+        self.spans = defaultdict(float)
+
+    def _charge(self):
+        now = time.perf_counter()
+        self.spans[self.current] += now - self.mark
+        self.mark = now
+
+    def enter(self, name):
+        self._charge()
+        self.stack.append(self.current)
+        self.current = name
+
+    def exit(self):
+        self._charge()
+        self.current = self.stack.pop() if self.stack else 'app'
+
+    def finish(self):
+        """Charge the time left to the open span. Returns the total duration in seconds."""
+        self._charge()
+        return self.mark - self.started
+
+
+@contextmanager
+def span(name):
+    """Attribute the time spent in the block to `name` when the current request is sampled."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    trace.enter(name)
+    try:
+        yield
+    finally:
+        trace.exit()
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    if _trace.get() is None:
+        return execute(sql, params, many, context)
+    with span('db'):
+        return execute(sql, params, many, context)
+
+
+def install(connection):
+    """connection_created receiver: time every query of sampled requests on this connection."""
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+# --- Recording --------------------------------------------------------------
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+
+def _inc(metric, labels):
+    with _lock:
+        _counters[(metric, labels)] += 1
+
+
+def _record(prefix, labels, trace):
+    total = trace.finish()
+    with _lock:
+        _histogram(f'devcove_{prefix}_duration_seconds', labels).observe(total)
+        for name, seconds in trace.spans.items():
+            _histogram(f'devcove_{prefix}_span_seconds', labels + (('span', name),)).observe(seconds)
+
+
+def _histogram(metric, labels):
+    key = (metric, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    return histogram
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match.route) if match else 'unmatched'
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = Trace() if sampled() else None
+        token = _trace.set(trace)
+        try:
+            response = self.get_response(request)
+        finally:
+            _trace.reset(token)
+        labels = (('route', _route(request)), ('method', request.method))
+        _inc('devcove_http_requests_total', labels + (('status', str(response.status_code)),))
+        if trace is not None:
+            _record('http_request', labels, trace)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook: time the rendering as 'serialize'
+        trace = _trace.get()
+        if trace is not None:
+            trace.enter('serialize')
+            response.add_post_render_callback(lambda rendered: trace.exit())
+        return response
+
+
+class InstrumentedConsumerMixin:
+    """Put first in a consumer's bases: counts and times every message the consumer handles."""
+
+    async def dispatch(self, message):
+        labels = (('consumer', type(self).__name__), ('event', message['type']))
+        trace = Trace() if sampled() else None
+        token = _trace.set(trace)
+        outcome = 'error'
+        try:
+            await super().dispatch(message)
+            outcome = 'ok'
+        except StopConsumer:  # how channels ends a consumer after websocket.disconnect
+            outcome = 'ok'
+            raise
+        finally:
+            _trace.reset(token)
+            _inc('devcove_ws_events_total', labels + (('outcome', outcome),))
+            if trace is not None:
+                _record('ws_event', labels, trace)
+
+
+# --- Exporting --------------------------------------------------------------
+
+def allowed(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    token = getattr(settings, 'INSTRUMENTATION_TOKEN', None)
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _gauges():
+    """Point-in-time values read from the shared cache: vote buffer and scheduler jobs."""
+    buffer_state = vote_buffer.metrics()
+    yield 'devcove_vote_buffer_entries', 'Votes waiting in the write-behind buffer.', (), buffer_state['buffered_entries']
+    yield 'devcove_vote_buffer_flushes', 'Write-behind flushes so far.', (), buffer_state['flushes']
+    if not scheduler.REGISTRY:
+        scheduler.load_jobs()
+    for name, job in scheduler.metrics()['jobs'].items():
+        for field in ('runs', 'failures', 'skipped'):
+            yield f'devcove_scheduler_job_{field}', f'Scheduler job {field}.', (('job', name),), job.get(field, 0)
+
+
+def render():
+    """Every metric of this process in Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(h.counts), h.sum) for key, h in _histograms.items())
+
+    lines = [
+        '# HELP devcove_instrumentation_sample_rate Fraction of requests and events that are timed.',
+        '# TYPE devcove_instrumentation_sample_rate gauge',
+        f'devcove_instrumentation_sample_rate {sample_rate()}',
+    ]
+    described = set()
+
+    def describe(metric):
+        if metric not in described:
+            described.add(metric)
+            kind, help_text = METRICS[metric]
+            lines.extend([f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}'])
+
+    for (metric, labels), value in counters:
+        describe(metric)
+        lines.append(f'{metric}{_labels(labels)} {value}')
+    for (metric, labels), counts, total in histograms:
+        describe(metric)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{_labels(labels, (("le", bound),))} {cumulative}')
+        lines.append(f'{metric}_sum{_labels(labels)} {total:.6f}')
+        lines.append(f'{metric}_count{_labels(labels)} {cumulative}')
+
+    for metric, help_text, labels, value in _gauges():
+        if metric not in described:
+            described.add(metric)
+            lines.extend([f'# HELP {metric} {help_text}', f'# TYPE {metric} gauge'])
+        lines.append(f'{metric}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
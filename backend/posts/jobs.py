@@ -0,0 +1,46 @@
+"""
+Maintenance jobs run by `manage.py run_scheduler` (see posts/scheduler.py).
+Times are in settings.TIME_ZONE; settings.SCHEDULER_JOBS can override them.
+"""
+from . import bug_tracker, feeds, related, scheduler, vote_buffer, votes
+
+# Existing management commands
+scheduler.register_command('update_helpers', '5 0 * * *')
+scheduler.register_command('compute_trending', '*/5 * * * *')
+scheduler.register_command('build_recommendations', '20 * * * *', timeout=30 * 60)
+scheduler.register_command('build_recommendations_full', '0 5 * * 0', '--full', command='build_recommendations', timeout=2 * 60 * 60)
+scheduler.register_command('reconcile_bug_rollups', '15 2 * * *')
+scheduler.register_command('rebuild_taxonomy_counters', '45 2 * * *', timeout=30 * 60)
+scheduler.register_command('purge_notifications', '30 3 * * *', timeout=30 * 60)
+scheduler.register_command('prune_feeds', '0 4 * * *', timeout=30 * 60)
+
+
+@scheduler.register('flush_votes', '* * * * *', timeout=5 * 60)
+def flush_votes():
+    """Safety net behind `flush_votes --loop`: nothing stays buffered for long if that worker is down."""
+    if not vote_buffer.enabled():
+        return 'write-behind disabled'
+    return vote_buffer.flush()
+
+
+@scheduler.register('warm_bug_stats', '* * * * *')
+def warm_bug_stats():
+    return f'{bug_tracker.warm_stats()} periods warmed'
+
+
+@scheduler.register('refresh_related_cascade', '* * * * *', timeout=10 * 60)
+def refresh_related_cascade():
+    return f'{related.refresh_cascade()} related lists refreshed'
+
+
+@scheduler.register('reconcile_vote_counters', '0 3 * * *', timeout=30 * 60)
+def reconcile_vote_counters():
+    drifted = votes.drifted()
+    if drifted:
+        votes.reconcile(drifted)
+    return f'{len(drifted)} posts repaired'
+
+
+@scheduler.register('reconcile_follow_counts', '30 4 * * 0', timeout=30 * 60)
+def reconcile_follow_counts():
+    return f'{feeds.reconcile_counts()} profiles recounted'
@@ -0,0 +1,243 @@
+"""
+Materialized leaderboards for weekly challenges.
+
+Rankings are stored in LeaderboardEntry rows (one board per challenge plus a
+global board with challenge=None) and maintained incrementally whenever a
+submission receives a verdict. Reads are indexed lookups on (challenge, rank)
+and (challenge, user), so top-N and "my rank" never scan submissions.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.expressions import Window
+from django.db.models.functions import RowNumber
+
+from .models import ChallengeSubmission, LeaderboardEntry, WeeklyChallenge
+
+REVIEWED_STATUSES = ('approved', 'rejected')
+GLOBAL_BOARD_LOCK = 0x6C6272  # pg advisory lock key of the global board
+
+# Ordering shared by the incremental path and the full rebuild
+BOARD_ORDERING = [
+    F('approved_count').desc(),
+    F('runtime_ms').asc(nulls_last=True),
+    F('achieved_at').asc(),
+    F('user_id').asc(),
+]
+
+
+def _board(challenge):
+    if challenge is None:
+        return LeaderboardEntry.objects.filter(challenge__isnull=True)
+    return LeaderboardEntry.objects.filter(challenge=challenge)
+
+
+def _ranks_above(entry):
+    """Q matching entries that sort strictly before `entry` on the same board."""
+    if entry.runtime_ms is None:
+        runtime_better = Q(runtime_ms__isnull=False)
+        runtime_equal = Q(runtime_ms__isnull=True)
+    else:
+        runtime_better = Q(runtime_ms__lt=entry.runtime_ms)
+        runtime_equal = Q(runtime_ms=entry.runtime_ms)
+
+    same_approvals = Q(approved_count=entry.approved_count)
+    same_runtime = same_approvals & runtime_equal
+    return (
+        Q(approved_count__gt=entry.approved_count)
+        | (same_approvals & runtime_better)
+        | (same_runtime & Q(achieved_at__lt=entry.achieved_at))
+        | (same_runtime & Q(achieved_at=entry.achieved_at) & Q(user_id__lt=entry.user_id))
+    )
+
+
+def _lock_board(challenge):
+    """
+    Serialize writers of one board for the rest of the transaction, so two
+    verdicts never compute the same position. A challenge board locks its
+    challenge row; the global board has no row and takes an advisory lock.
+    """
+    if challenge is not None:
+        WeeklyChallenge.objects.select_for_update().filter(pk=challenge.pk).exists()
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [GLOBAL_BOARD_LOCK])
+    # SQLite serializes writers on its own
+
+
+def _place(challenge, user, values):
+    """
+    Upsert the user's entry on one board under the board lock. A moved entry
+    only shifts the ranks between its old and new position; a new entry shifts
+    the ranks below it and a removed one closes the gap it leaves.
+    `values=None` removes the user from the board.
+    """
+    _lock_board(challenge)
+    board = _board(challenge)
+    entry = board.filter(user=user).first()
+    old_rank = entry.rank if entry is not None else None
+
+    if values is None:
+        if entry is not None:
+            entry.delete()
+            board.filter(rank__gt=old_rank).update(rank=F('rank') - 1)
+        return None
+    if entry is None:
+        entry = LeaderboardEntry(challenge=challenge, user=user)
+
+    for field, value in values.items():
+        setattr(entry, field, value)
+
+    others = board.exclude(user=user)
+    position = others.filter(_ranks_above(entry)).count() + 1
+    if old_rank is None:
+        others.filter(rank__gte=position).update(rank=F('rank') + 1)
+    elif position < old_rank:
+        others.filter(rank__gte=position, rank__lt=old_rank).update(rank=F('rank') + 1)
+    elif position > old_rank:
+        others.filter(rank__gt=old_rank, rank__lte=position).update(rank=F('rank') - 1)
+
+    entry.rank = position
+    entry.save()
+    return entry
+
+
+def _best_submission(challenge, user):
+    """Best reviewed submission of a user for one challenge, in board order."""
+    return ChallengeSubmission.objects.filter(
+        challenge=challenge,
+        user=user,
+        status__in=REVIEWED_STATUSES,
+    ).order_by(
+        F('status').asc(),  # 'approved' < 'rejected'
+        F('runtime_ms').asc(nulls_last=True),
+        'submitted_at',
+    ).first()
+
+
+def _global_values(user):
+    totals = LeaderboardEntry.objects.filter(
+        challenge__isnull=False, user=user
+    ).aggregate(
+        entries=Count('id'),
+        approved=Count('id', filter=Q(approved_count__gt=0)),
+        runtime=Sum('runtime_ms', filter=Q(approved_count__gt=0)),
+        achieved=Max('achieved_at', filter=Q(approved_count__gt=0)),
+        last_seen=Max('achieved_at'),
+    )
+    if not totals['entries']:
+        return None
+    return {
+        'submission': None,
+        'approved_count': totals['approved'],
+        'runtime_ms': totals['runtime'],
+        'achieved_at': totals['achieved'] or totals['last_seen'],
+    }
+
+
+def record_verdict(challenge, user):
+    """
+    Refresh the challenge board and the global board for one user.
+    Called whenever one of the user's submissions is reviewed, re-reviewed or deleted.
+    """
+    with transaction.atomic():
+        best = _best_submission(challenge, user)
+        values = None
+        if best is not None:
+            values = {
+                'submission': best,
+                'approved_count': 1 if best.status == 'approved' else 0,
+                'runtime_ms': best.runtime_ms,
+                'achieved_at': best.submitted_at,
+            }
+        _place(challenge, user, values)
+        _place(None, user, _global_values(user))
+
+
+def top_entries(challenge=None, page=1, page_size=10):
+    """One page of a board, fetched as a rank range instead of OFFSET/COUNT."""
+    start = (page - 1) * page_size
+    return list(
+        _board(challenge)
+        .filter(rank__gt=start, rank__lte=start + page_size)
+        .select_related('user', 'user__profile')
+        .order_by('rank')
+    )
+
+
+def entry_for(user, challenge=None):
+    return _board(challenge).select_related('user', 'user__profile').filter(user=user).first()
+
+
+def _rerank(challenge):
+    ranked = _board(challenge).annotate(
+        new_rank=Window(expression=RowNumber(), order_by=BOARD_ORDERING)
+    ).only('id', 'rank')
+    changed = []
+    for entry in ranked:
+        if entry.rank != entry.new_rank:
+            entry.rank = entry.new_rank
+            changed.append(entry)
+    LeaderboardEntry.objects.bulk_update(changed, ['rank'], batch_size=1000)
+    return len(changed)
+
+
+def rebuild_all():
+    """
+    Recompute every board from ChallengeSubmission rows. Used to backfill
+    the table and to repair drift; the request path never calls this.
+    """
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+
+        best = {}
+        reviewed = ChallengeSubmission.objects.filter(
+            status__in=REVIEWED_STATUSES
+        ).order_by(
+            F('status').asc(),
+            F('runtime_ms').asc(nulls_last=True),
+            'submitted_at',
+        ).values('id', 'challenge_id', 'user_id', 'status', 'runtime_ms', 'submitted_at')
+        for row in reviewed.iterator():
+            best.setdefault((row['challenge_id'], row['user_id']), row)
+
+        entries = [
+            LeaderboardEntry(
+                challenge_id=challenge_id,
+                user_id=user_id,
+                submission_id=row['id'],
+                approved_count=1 if row['status'] == 'approved' else 0,
+                runtime_ms=row['runtime_ms'],
+                achieved_at=row['submitted_at'],
+            )
+            for (challenge_id, user_id), row in best.items()
+        ]
+
+        totals = {}
+        for entry in entries:
+            approved, runtime, achieved, last_seen = totals.get(entry.user_id, (0, None, None, None))
+            if entry.approved_count:
+                approved += 1
+                if entry.runtime_ms is not None:
+                    runtime = (runtime or 0) + entry.runtime_ms
+                achieved = max(achieved, entry.achieved_at) if achieved else entry.achieved_at
+            last_seen = max(last_seen, entry.achieved_at) if last_seen else entry.achieved_at
+            totals[entry.user_id] = (approved, runtime, achieved, last_seen)
+
+        entries.extend(
+            LeaderboardEntry(
+                challenge_id=None,
+                user_id=user_id,
+                approved_count=approved,
+                runtime_ms=runtime,
+                achieved_at=achieved or last_seen,
+            )
+            for user_id, (approved, runtime, achieved, last_seen) in totals.items()
+        )
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+
+        challenge_ids = {entry.challenge_id for entry in entries if entry.challenge_id}
+        for challenge_id in challenge_ids:
+            _rerank(challenge_id)
+        _rerank(None)
+
+    return len(entries)
@@ -1,17 +1,17 @@
-import random
+import time
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from django.db import IntegrityError
-from posts.models import Post, Vote
+from posts import seeding
+from posts.models import Post
 
 class Command(BaseCommand):
-    help = "Auto upvote/downvote existing posts for demo using Vote model"
+    help = "Auto upvote/downvote existing posts for demo using Vote model (bulk insert, see posts/seeding.py)"
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--count', '-n',
-            type=int, default=100,
-            help="Tổng số lượt vote sẽ tạo (mặc định=100)"
+            type=seeding.parse_size, default=100,
+            help="Tổng số lượt vote sẽ tạo, vd 100, 1M, 20M (mặc định=100)"
         )
         parser.add_argument(
             '--direction', '-d',
@@ -19,44 +19,36 @@ class Command(BaseCommand):
             default='random',
             help="Hướng vote: 'up', 'down' hay 'random' (mặc định)"
         )
+        parser.add_argument('--seed', type=int, default=0, help='Seed ngẫu nhiên; cùng seed cho ra cùng dữ liệu')
+        parser.add_argument('--batch-size', type=int, default=seeding.DEFAULT_BATCH_SIZE, help='Số dòng mỗi lần bulk insert / transaction')
+        parser.add_argument('--workers', type=int, default=seeding.default_workers(), help='Số process sinh dữ liệu song song')
 
     def handle(self, *args, **options):
         n = options['count']
         direction = options['direction']
-        users = list(User.objects.all())
-        posts = list(Post.objects.all())
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
 
-        if not users:
+        if not user_ids:
             self.stdout.write(self.style.ERROR("Chưa có user nào trong DB."))
             return
-        if not posts:
+        if not post_ids:
             self.stdout.write(self.style.ERROR("Chưa có post nào trong DB."))
             return
 
-        created = 0
-        for _ in range(n):
-            user = random.choice(users)
-            post = random.choice(posts)
-
-            # Chọn hướng vote
-            if direction == 'random':
-                is_up = random.choice([True, False])
-            else:
-                is_up = (direction == 'up')
-
-            try:
-                # Nếu user đã vote trước đó, update lại
-                vote_obj, did_create = Vote.objects.update_or_create(
-                    user=user, post=post,
-                    defaults={'is_upvote': is_up}
-                )
-                created += 1
-            except IntegrityError:
-                # unique_together lỗi
-                continue
+        started = time.monotonic()
+        # Cặp (user, post) đã có vote thì bỏ qua; bộ đếm của post được tính lại một lượt ở cuối
+        attempted = seeding.seed_votes(
+            n, post_ids, user_ids, direction=direction, seed=options['seed'],
+            batch_size=options['batch_size'], workers=options['workers'],
+            progress=seeding.reporter(self.stdout.write),
+        )
+        elapsed = time.monotonic() - started
+        seeding.finish(taxonomy=False)
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"Đã tạo/cập nhật {created} lượt vote (direction={direction})!"
+                f"Đã tạo tối đa {attempted} lượt vote (direction={direction}, bỏ qua cặp đã vote) "
+                f"trong {elapsed:.1f}s ({attempted / max(elapsed, 1e-9):,.0f}/giây)!"
             )
         )
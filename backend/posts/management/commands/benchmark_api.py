@@ -0,0 +1,109 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from posts import benchmarks, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the REST API hot paths in-process on a seeded test database: latency percentiles, '
+        'queries and bytes per request, compared against a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmarks.SCALES), default='small', help='Dataset size')
+        parser.add_argument('--seed', type=int, default=0, help='Dataset random seed')
+        parser.add_argument('--workers', type=int, default=seeding.default_workers(), help='Seeding processes')
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario first')
+        parser.add_argument('--scenario', action='append', dest='only', choices=[s.name for s in benchmarks.SCENARIOS],
+                            help='Only run this scenario (repeatable)')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database (and its dataset) for the next run')
+        parser.add_argument('--output', default='benchmark-results.json', help='Where to write this run as JSON')
+        parser.add_argument('--baseline', default='benchmarks/baseline.json', help='Baseline JSON to compare against')
+        parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline instead of comparing')
+        parser.add_argument('--max-latency-regression', type=float, default=0.25, help='Allowed p50/p90 growth (0.25 = +25%%)')
+        parser.add_argument('--min-latency-delta-ms', type=float, default=1.0, help='Ignore latency growth smaller than this')
+        parser.add_argument('--max-query-increase', type=int, default=0, help='Extra queries per request allowed')
+        parser.add_argument('--max-bytes-regression', type=float, default=0.10, help='Allowed response size growth')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        # DEBUG off, 'testserver' allowed, as under the test runner
+        setup_test_environment(debug=False)
+        try:
+            self._create_test_db(old_name, options)
+            try:
+                # The benchmark measures request handling; notification fan-out is delivered inline.
+                # Budget headers stay on so each scenario is also checked against its view's query budget
+                with override_settings(NOTIFICATIONS_ASYNC=False, QUERY_BUDGET_HEADERS=True):
+                    document = self._run(options)
+            except benchmarks.ScenarioFailed as e:
+                raise CommandError(str(e))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+        finally:
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as output:
+            json.dump(document, output, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']) or '.', exist_ok=True)
+            with open(options['baseline'], 'w') as output:
+                json.dump(document, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(f"No baseline at {options['baseline']}; run with --save-baseline to create one"))
+            return
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = benchmarks.compare(
+            document, baseline,
+            latency_threshold=options['max_latency_regression'],
+            min_latency_delta_ms=options['min_latency_delta_ms'],
+            query_increase=options['max_query_increase'],
+            bytes_threshold=options['max_bytes_regression'],
+        )
+        if regressions:
+            for name, message in regressions:
+                self.stdout.write(self.style.ERROR(f'REGRESSION {name}: {message}'))
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def _create_test_db(self, old_name, options):
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        seeded = benchmarks.seeded_dataset()
+        wanted = benchmarks.dataset_label(options['scale'], options['seed'])
+        if seeded is not None and seeded != wanted:
+            self.stdout.write(f'The kept test database holds the {seeded} dataset; recreating it for {wanted}')
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=False)
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=True)
+
+    def _run(self, options):
+        if benchmarks.seeded_dataset() is not None:
+            self.stdout.write('Reusing the seeded test database')
+        else:
+            started = time.monotonic()
+            sizes = benchmarks.seed_dataset(options['scale'], seed=options['seed'], workers=options['workers'],
+                                            progress=seeding.reporter(self.stdout.write, steps=2))
+            self.stdout.write(f'Seeded {sizes} in {time.monotonic() - started:.1f}s')
+
+        document = benchmarks.run(iterations=options['iterations'], warmup=options['warmup'], only=options['only'])
+        document['meta'].update(scale=options['scale'], seed=options['seed'])
+
+        self.stdout.write(f"{'scenario':<32} {'p50':>8} {'p90':>8} {'p99':>8} {'queries':>8} {'bytes':>9}  status")
+        for name, result in document['results'].items():
+            self.stdout.write(
+                f"{name:<32} {result['p50_ms']:>8.2f} {result['p90_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['queries_max']:>8} {result['bytes_median']:>9.0f}  {result['status_codes']}"
+            )
+        return document
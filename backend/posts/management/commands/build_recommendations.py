@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Index new posts for content recommendations (TF-IDF), or rebuild the whole index with --full'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Refit vocabulary and IDF and recompute every neighbor list',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['full']:
+            indexed = recommendations.build()
+            scope = 'rebuilt index over'
+        else:
+            indexed = recommendations.update()
+            scope = 'indexed'
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'{scope.capitalize()} {indexed} posts in {elapsed:.2f}s'))
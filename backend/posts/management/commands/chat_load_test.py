@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import chat_load
+
+
+def _sizes(value):
+    return [int(size) for size in value.split(',') if size.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test ChatConsumer in-process on a throwaway test database: N authenticated clients over '
+        'M conversations; connect time, fan-out latency percentiles, throughput and lost deliveries, '
+        'optionally per group size'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20, help='Simulated WebSocket clients')
+        parser.add_argument('--conversations', type=int, default=5, help='Conversations the clients are spread over')
+        parser.add_argument('--messages', type=int, default=20, help='Messages sent by each client')
+        parser.add_argument('--interval-ms', type=float, default=0.0, help='Pause between a client\'s messages (0 = flood)')
+        parser.add_argument('--group-sizes', type=_sizes,
+                            help='Comma-separated members per conversation, e.g. 2,5,10,25: one run per size at --clients')
+        parser.add_argument('--timeout', type=float, default=chat_load.DEFAULT_TIMEOUT, help='Seconds to wait for deliveries')
+        parser.add_argument(
+            '--redis', action='store_true',
+            help='Use the configured CHANNEL_LAYERS (Redis) instead of an in-memory layer',
+        )
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database for the next run')
+
+    def handle(self, *args, **options):
+        # The fixture users, sessions and conversations never touch the configured database
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            if options['redis']:
+                results = self.run(options)
+            else:
+                with override_settings(CHANNEL_LAYERS=chat_load.IN_MEMORY_LAYER):
+                    results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        self.stdout.write(
+            f"{'group':>6} {'convs':>6} {'clients':>8} {'conn p50':>9} {'conn p95':>9} {'fan p50':>8} "
+            f"{'fan p95':>8} {'fan p99':>8} {'msg/s':>8} {'deliv/s':>9} {'lost':>6}"
+        )
+        for result in results:
+            connect, fanout = result['connect_ms'], result['fanout_ms']
+            self.stdout.write(
+                f"{result['group_size']:>6} {result['conversations']:>6} {result['clients']:>8} "
+                f"{connect['p50']:>9.2f} {connect['p95']:>9.2f} {fanout['p50'] or 0:>8.2f} {fanout['p95'] or 0:>8.2f} "
+                f"{fanout['p99'] or 0:>8.2f} {result['messages_per_second']:>8.1f} {result['deliveries_per_second']:>9.1f} "
+                f"{result['deliveries_lost']:>6}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        lost = sum(result['deliveries_lost'] for result in results)
+        if lost:
+            self.stdout.write(self.style.WARNING(f'{lost} deliveries lost (channel layer capacity or --timeout exceeded)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All messages delivered to every member'))
+
+    def run(self, options):
+        interval = options['interval_ms'] / 1000
+        try:
+            if options['group_sizes']:
+                return chat_load.by_group_size(options['group_sizes'], options['clients'], options['messages'],
+                                               interval, options['timeout'])
+            return [chat_load.run(options['clients'], options['conversations'], options['messages'],
+                                  interval, options['timeout'])]
+        except ValueError as e:
+            raise CommandError(str(e))
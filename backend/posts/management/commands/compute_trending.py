@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending tag and community scores from the hourly activity buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild-buckets', action='store_true',
+            help='First recount the buckets of the whole window from posts, comments and votes',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['rebuild_buckets']:
+            buckets = trending.rebuild_buckets()
+            self.stdout.write(f'Rebuilt {buckets} activity buckets')
+        ranked = trending.compute()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {ranked[trending.TAG]} tags and {ranked[trending.COMMUNITY]} communities in {elapsed:.2f}s"
+        ))
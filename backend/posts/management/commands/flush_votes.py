@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import vote_buffer
+
+
+class Command(BaseCommand):
+    help = 'Apply write-behind vote buffers to Vote rows and post counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep flushing every --interval seconds')
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Seconds between flushes (default: settings.VOTES_FLUSH_INTERVAL)',
+        )
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Also apply the generation being closed; use when switching write-behind off',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or vote_buffer.flush_interval()
+        while True:
+            summary = vote_buffer.flush(drain=options['drain'])
+            if summary is None:
+                self.stdout.write(self.style.WARNING('Another flusher holds the lock, skipping'))
+            elif summary['entries'] or not options['loop']:
+                self.stdout.write(
+                    f"Flushed {summary['entries']} buffered votes on {summary['posts']} posts "
+                    f"({summary['votes_changed']} rows changed) in {summary['seconds']:.3f}s"
+                )
+            if not options['loop']:
+                break
+            time.sleep(interval)
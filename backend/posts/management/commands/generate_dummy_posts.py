@@ -1,8 +1,8 @@
-import random
+import time
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from posts.models import Post, Tag, Community
-from django.utils.text import slugify
+from posts import seeding
+from posts.models import Community
 
 # Mẫu code snippets phong phú và đa dạng cho từng ngôn ngữ
 CODE_TEMPLATES = {
@@ -532,13 +532,25 @@ func main() {
     }
 }
 
+def snippet_rows(tags):
+    """[(language, title, description, code, tag_id), ...] for seeding.seed_posts; tags is {language: Tag}."""
+    return [
+        (language, f"{snippet['title']} - {tag.name}", snippet['description'], snippet['code'], tag.id)
+        for language, tag in tags.items()
+        for snippet in CODE_TEMPLATES[language]['snippets']
+    ]
+
+
 class Command(BaseCommand):
-    help = 'Tự động tạo post với content là code snippets đa dạng, tự động tạo tag tương ứng với ngôn ngữ.'
+    help = 'Tự động tạo post với content là code snippets đa dạng, tự động tạo tag tương ứng với ngôn ngữ (bulk insert, xem posts/seeding.py).'
 
     def add_arguments(self, parser):
-        parser.add_argument('--count', '-c', type=int, default=30, help='Số lượng bài viết (mặc định: 30)')
+        parser.add_argument('--count', '-c', type=seeding.parse_size, default=30, help='Số lượng bài viết, vd 30, 100k, 1M (mặc định: 30)')
         parser.add_argument('--language', '-l', type=str, help='Chỉ tạo post cho ngôn ngữ cụ thể')
         parser.add_argument('--yes', '-y', action='store_true', help='Bỏ qua xác nhận')
+        parser.add_argument('--seed', type=int, default=0, help='Seed ngẫu nhiên; cùng seed cho ra cùng dữ liệu')
+        parser.add_argument('--batch-size', type=int, default=seeding.DEFAULT_BATCH_SIZE, help='Số dòng mỗi lần bulk insert / transaction')
+        parser.add_argument('--workers', type=int, default=seeding.default_workers(), help='Số process sinh nội dung song song')
 
     def handle(self, *args, **options):
         User = get_user_model()
@@ -554,10 +566,10 @@ class Command(BaseCommand):
             )
             return
 
-        communities = list(Community.objects.all())
-        authors = list(User.objects.filter(is_active=True))
+        community_ids = list(Community.objects.order_by('id').values_list('id', flat=True))
+        author_ids = list(User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
         
-        if not authors:
+        if not author_ids:
             self.stdout.write(self.style.ERROR('Không tìm thấy tác giả nào đang hoạt động.'))
             return
 
@@ -568,101 +580,24 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR('Đã hủy tạo bài viết.'))
                 return
 
-        # Chuẩn bị danh sách ngôn ngữ sẽ sử dụng
-        languages_to_use = [target_language] if target_language else list(CODE_TEMPLATES.keys())
-        
         # Tạo tất cả tags cần thiết trước khi tạo posts
         self.stdout.write('Đang chuẩn bị tags...')
-        created_tags = {}
-        for language in languages_to_use:
-            tag_name = language.upper() if language in ['php', 'css', 'sql'] else language.capitalize()
-            tag_slug = slugify(tag_name)
-            
-            # Tìm tag existing hoặc tạo mới
-            try:
-                tag = Tag.objects.get(slug=tag_slug)
-                created_tags[language] = tag
-            except Tag.DoesNotExist:
-                try:
-                    tag = Tag.objects.create(name=tag_name, slug=tag_slug)
-                    created_tags[language] = tag
-                    self.stdout.write(f'Đã tạo tag mới: {tag_name}')
-                except Exception as e:
-                    # Nếu vẫn lỗi (có thể do race condition), thử get lại
-                    try:
-                        tag = Tag.objects.get(slug=tag_slug)
-                        created_tags[language] = tag
-                    except Tag.DoesNotExist:
-                        self.stdout.write(
-                            self.style.ERROR(f'Không thể tạo tag cho {language}: {str(e)}')
-                        )
-                        continue
-        
-        self.stdout.write(f'Đã chuẩn bị {len(created_tags)} tags. Bắt đầu tạo posts...')
-        
-        created = 0
-        
-        for i in range(count):
-            try:
-                # Chọn ngôn ngữ từ danh sách có sẵn tags
-                available_languages = list(created_tags.keys())
-                if not available_languages:
-                    self.stdout.write(self.style.ERROR('Không có tag nào có sẵn để tạo posts.'))
-                    break
-                    
-                language = random.choice(available_languages)
-                language_data = CODE_TEMPLATES[language]
-                
-                # Chọn snippet ngẫu nhiên
-                snippet_data = random.choice(language_data['snippets'])
-                
-                # Lấy tag đã được tạo trước đó
-                tag = created_tags[language]
-                
-                # Chọn tác giả và community ngẫu nhiên
-                author = random.choice(authors)
-                community = random.choice(communities) if communities else None
-                
-                # Tạo title và content
-                title = f"{snippet_data['title']} - {tag.name}"
-                content = f"{snippet_data['description']}\n\n```{language}\n{snippet_data['code']}\n```"
-                
-                # Tạo post
-                post = Post.objects.create(
-                    title=title,
-                    content=content,
-                    author=author,
-                    community=community
-                )
-                
-                # Gán tag
-                post.tags.add(tag)
-                
-                # Tạo slug
-                post.slug = slugify(title)[:50]
-                if not post.slug:  # Fallback nếu slug rỗng
-                    post.slug = f"post-{post.id}"
-                
-                post.save()
-                created += 1
-                
-                # In progress mỗi 10 bài
-                if created % 10 == 0:
-                    self.stdout.write(f'Đã tạo {created}/{count} bài viết...')
-                    
-            except Exception as e:
-                self.stdout.write(
-                    self.style.WARNING(f'Lỗi khi tạo bài viết {i+1}: {str(e)}')
-                )
-                continue
-
-        # Tổng kết
+        tags = seeding.language_tags([target_language] if target_language else list(CODE_TEMPLATES))
+        self.stdout.write(f'Đã chuẩn bị {len(tags)} tags. Bắt đầu tạo posts...')
+
+        started = time.monotonic()
+        created = seeding.seed_posts(
+            count, snippet_rows(tags), author_ids, community_ids,
+            seed=options['seed'], batch_size=options['batch_size'], workers=options['workers'],
+            progress=seeding.reporter(self.stdout.write),
+        )
+        elapsed = time.monotonic() - started
+        # bulk_create bỏ qua signals: tính lại bộ đếm tag/community và trending
+        seeding.finish(vote_counters=False)
+
         self.stdout.write(
             self.style.SUCCESS(
-                f'Hoàn thành! Đã tạo {created}/{count} bài viết code snippet.'
+                f'Hoàn thành! Đã tạo {created}/{count} bài viết code snippet trong {elapsed:.1f}s '
+                f'({created / max(elapsed, 1e-9):,.0f} bài/giây).'
             )
         )
-        
-        # Thống kê tag đã sử dụng
-        if created > 0:
-            self.stdout.write(f'Số lượng tag được sử dụng: {len(created_tags)}')
\ No newline at end of file
@@ -1,45 +1,45 @@
 # posts/management/commands/populate_comments.py
 
-import random
+import time
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from posts.models import Post, Comment
-from faker import Faker
+from posts import seeding
+from posts.models import Post
 
 class Command(BaseCommand):
-    help = "Populate the database with random demo comments"
+    help = "Populate the database with random demo comments (bulk insert, see posts/seeding.py)"
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--count', '-n',
-            type=int,
+            type=seeding.parse_size,
             default=100,
-            help="Số lượng comment sẽ tạo (mặc định=100)"
+            help="Số lượng comment sẽ tạo, vd 100, 50k, 5M (mặc định=100)"
         )
+        parser.add_argument('--seed', type=int, default=0, help='Seed ngẫu nhiên; cùng seed cho ra cùng dữ liệu')
+        parser.add_argument('--batch-size', type=int, default=seeding.DEFAULT_BATCH_SIZE, help='Số dòng mỗi lần bulk insert / transaction')
+        parser.add_argument('--workers', type=int, default=seeding.default_workers(), help='Số process sinh nội dung song song')
 
     def handle(self, *args, **options):
-        fake = Faker()
-        users = list(User.objects.all())
-        posts = list(Post.objects.all())
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
 
-        if not users:
+        if not user_ids:
             self.stdout.write(self.style.ERROR("Chưa có user nào trong DB. Tạo user trước!"))
             return
-        if not posts:
+        if not post_ids:
             self.stdout.write(self.style.ERROR("Chưa có post nào trong DB. Tạo ít nhất 1 post!"))
             return
 
         n = options['count']
-        created = 0
-        for _ in range(n):
-            author = random.choice(users)
-            post = random.choice(posts)
-            text = fake.sentence(nb_words=random.randint(5, 20))
-            Comment.objects.create(
-                post=post,
-                author=author,
-                text=text
-            )
-            created += 1
+        started = time.monotonic()
+        created = seeding.seed_comments(
+            n, post_ids, user_ids, seed=options['seed'], batch_size=options['batch_size'],
+            workers=options['workers'], progress=seeding.reporter(self.stdout.write),
+        )
+        elapsed = time.monotonic() - started
+        seeding.finish(vote_counters=False, taxonomy=False)
 
-        self.stdout.write(self.style.SUCCESS(f"Đã tạo {created} comment demo!"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tạo {created} comment demo trong {elapsed:.1f}s ({created / max(elapsed, 1e-9):,.0f}/giây)!"
+        ))
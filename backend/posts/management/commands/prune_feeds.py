@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Trim following timelines to their cap; optionally recount follow counters and seed timelines from existing follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-entries',
+            type=int,
+            default=feeds.TIMELINE_MAX_ENTRIES,
+            help=f'Entries kept per timeline (default={feeds.TIMELINE_MAX_ENTRIES})',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute Profile.followers_count / following_count from the Follow table',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Seed every timeline with recent posts of the authors it follows',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        if options['recount']:
+            updated = feeds.reconcile_counts()
+            self.stdout.write(f'Recounted follow counters on {updated} profiles')
+
+        if options['backfill']:
+            pairs = 0
+            for follower_id, following_id in Follow.objects.values_list('follower_id', 'following_id').iterator():
+                if not feeds.is_pull_author(following_id):
+                    feeds.backfill(follower_id, following_id)
+                    pairs += 1
+            self.stdout.write(f'Backfilled timelines for {pairs} follows')
+
+        deleted = feeds.prune(max_entries=options['max_entries'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Pruned {deleted} timeline entries in {elapsed:.2f}s')
+        )
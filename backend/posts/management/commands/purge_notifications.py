@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import notifications
+
+
+class Command(BaseCommand):
+    help = 'Delete notifications past their retention period (read and unread are kept for different lengths)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--read-days', type=int, default=notifications.READ_RETENTION_DAYS,
+            help='Delete read notifications older than this many days',
+        )
+        parser.add_argument(
+            '--unread-days', type=int, default=notifications.UNREAD_RETENTION_DAYS,
+            help='Delete any notification older than this many days',
+        )
+
+    def handle(self, *args, **options):
+        deleted = notifications.purge(read_days=options['read_days'], unread_days=options['unread_days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired notifications'))
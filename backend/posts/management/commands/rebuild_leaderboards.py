@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized weekly challenge leaderboards from submissions'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = leaderboard.rebuild_all()
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt {count} leaderboard entries in {elapsed:.2f}s'
+            )
+        )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import related
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed related-posts neighbor lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post', type=int, action='append', dest='post_ids',
+            help='Only refresh this post (repeatable); default is every post',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        refreshed = related.rebuild(options['post_ids'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Refreshed related posts for {refreshed} posts in {elapsed:.2f}s')
+        )
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored Tag and Community counters (posts, members, last activity) from the posts table'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        tags, communities = counters.rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt counters for {tags} tags and {communities} communities in {elapsed:.2f}s')
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bug_tracker
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Community Bug Tracker daily rollups from raw LoggedBug rows (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=2,
+            help='Number of most recent days to reconcile (default=2)',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild rollups for the whole history',
+        )
+
+    def handle(self, *args, **options):
+        days = None if options['full'] else options['days']
+        started = time.monotonic()
+        written = bug_tracker.reconcile(days=days)
+        elapsed = time.monotonic() - started
+
+        scope = 'all days' if days is None else f'last {days} days'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Reconciled {written} bug rollup rows ({scope}) in {elapsed:.2f}s'
+            )
+        )
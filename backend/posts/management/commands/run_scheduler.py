@@ -0,0 +1,64 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import scheduler
+
+
+class Command(BaseCommand):
+    help = 'Run registered maintenance jobs on their cron schedules (one leader per cluster)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', help='Show the registered jobs, their next run and metrics, then exit')
+        parser.add_argument('--run', metavar='JOB', action='append', help='Run this job now (repeatable) and exit; still respects its lock')
+        parser.add_argument('--once', action='store_true', help='Run the jobs due this minute and exit')
+        parser.add_argument('--workers', type=int, default=scheduler.DEFAULT_WORKERS, help='Jobs that may run at the same time')
+
+    def handle(self, *args, **options):
+        jobs = scheduler.load_jobs()
+
+        if options['list']:
+            for name, state in scheduler.metrics()['jobs'].items():
+                self.stdout.write(
+                    f"{name:<28} {state['schedule']:<14} next {state['next_run_at']}  "
+                    f"runs={state['runs']} failures={state['failures']} skipped={state['skipped']} "
+                    f"last={state.get('last_status', '-')} {state.get('last_seconds', '-')}s"
+                )
+            return
+
+        if options['run']:
+            unknown = set(options['run']) - set(jobs)
+            if unknown:
+                raise CommandError(f"Unknown job(s): {', '.join(sorted(unknown))}")
+            for name in options['run']:
+                self._report(name, scheduler.run_job(jobs[name]))
+            return
+
+        if options['once']:
+            minute = timezone.now().replace(second=0, microsecond=0)
+            if not scheduler.tick(minute, self._run_now, scheduler.node_id()):
+                self.stdout.write('Nothing due this minute, or another node is the leader')
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write(self.style.SUCCESS(
+            f"Scheduler {scheduler.node_id()} running {len(jobs)} jobs with {options['workers']} workers"
+        ))
+        scheduler.run_forever(workers=options['workers'], stop=stop)
+        self.stdout.write('Scheduler stopped')
+
+    def _run_now(self, job, moment):
+        self._report(job.name, scheduler.run_job(job, moment))
+
+    def _report(self, name, outcome):
+        state = scheduler.metrics()['jobs'].get(name, {})
+        if outcome == 'ok':
+            self.stdout.write(self.style.SUCCESS(f"{name}: ok in {state.get('last_seconds', 0):.2f}s"))
+        elif outcome == 'failed':
+            self.stdout.write(self.style.ERROR(f"{name}: failed: {state.get('last_error')}"))
+        else:
+            self.stdout.write(self.style.WARNING(f'{name}: skipped ({outcome})'))
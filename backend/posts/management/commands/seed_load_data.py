@@ -0,0 +1,82 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seeding
+from posts.management.commands.generate_dummy_posts import CODE_TEMPLATES, snippet_rows
+from posts.models import Community, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed load-test volumes in bulk, e.g. --users 100k --posts 1M --comments 5M --votes 20M '
+        '(new rows are added to what exists; see posts/seeding.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=seeding.parse_size, default=0, help='Users to create (with profiles)')
+        parser.add_argument('--posts', type=seeding.parse_size, default=0, help='Code-snippet posts to create')
+        parser.add_argument('--comments', type=seeding.parse_size, default=0, help='Comments to create')
+        parser.add_argument('--votes', type=seeding.parse_size, default=0, help='Votes to attempt (existing pairs are skipped)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed reproduces the same data')
+        parser.add_argument('--batch-size', type=int, default=seeding.DEFAULT_BATCH_SIZE, help='Rows per bulk insert and transaction')
+        parser.add_argument('--workers', type=int, default=seeding.default_workers(), help='Content generation processes')
+        parser.add_argument('--skip-finish', action='store_true', help='Do not recompute counters and trending afterwards')
+
+    def handle(self, *args, **options):
+        if not any(options[kind] for kind in ('users', 'posts', 'comments', 'votes')):
+            raise CommandError('Nothing to seed: pass at least one of --users, --posts, --comments, --votes')
+
+        common = {
+            'seed': options['seed'],
+            'batch_size': options['batch_size'],
+            'progress': seeding.reporter(self.stdout.write),
+        }
+        generated = dict(common, workers=options['workers'])
+        timings = {}
+
+        def phase(name, run):
+            started = time.monotonic()
+            rows = run()
+            timings[name] = (rows, time.monotonic() - started)
+            seconds = timings[name][1]
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {rows:,} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)'
+            ))
+
+        if options['users']:
+            phase('users', lambda: seeding.seed_users(options['users'], **common))
+
+        user_ids = list(User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        if not user_ids and (options['posts'] or options['comments'] or options['votes']):
+            raise CommandError('No users to author posts, comments or votes; add --users')
+
+        if options['posts']:
+            tags = seeding.language_tags(list(CODE_TEMPLATES))
+            community_ids = list(Community.objects.order_by('id').values_list('id', flat=True))
+            phase('posts', lambda: seeding.seed_posts(
+                options['posts'], snippet_rows(tags), user_ids, community_ids, **generated
+            ))
+
+        if options['comments'] or options['votes']:
+            post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+            if not post_ids:
+                raise CommandError('No posts to comment on or vote for; add --posts')
+            if options['comments']:
+                phase('comments', lambda: seeding.seed_comments(options['comments'], post_ids, user_ids, **generated))
+            if options['votes']:
+                phase('votes', lambda: seeding.seed_votes(options['votes'], post_ids, user_ids, **generated))
+
+        if not options['skip_finish']:
+            started = time.monotonic()
+            summary = seeding.finish(
+                vote_counters=bool(options['votes']),
+                taxonomy=bool(options['posts']),
+                activity=bool(options['posts'] or options['comments'] or options['votes']),
+            )
+            self.stdout.write(f'Recomputed counters in {time.monotonic() - started:.1f}s: {summary}')
+        self.stdout.write(
+            'Related posts and recommendations are not rebuilt here; '
+            'run rebuild_related_posts / build_recommendations --full if the benchmark needs them.'
+        )
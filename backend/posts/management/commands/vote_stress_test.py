@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from posts import votes
+from posts.models import Post, Vote
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer votes.cast from concurrent threads on a throwaway test database and check the stored '
+        'counters against the Vote table'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Simulated voters')
+        parser.add_argument('--clicks', type=int, default=25, help='Vote clicks per voter')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent worker threads')
+        parser.add_argument(
+            '--double-click', type=float, default=0.3,
+            help='Probability that a click is sent twice at once (default=0.3)',
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database for the next run')
+
+    def handle(self, *args, **options):
+        # The generated users, post and votes never touch the configured database
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+    def run(self, options):
+        if connection.vendor == 'sqlite' and options['threads'] > 1:
+            self.stdout.write(self.style.WARNING('SQLite serializes writers; expect "database is locked" errors'))
+
+        suffix = uuid.uuid4().hex[:8]
+        author = User.objects.create(username=f'votestress_author_{suffix}')
+        post = Post.objects.create(title=f'Vote stress {suffix}', author=author)
+        User.objects.bulk_create([
+            User(username=f'votestress_{suffix}_{index}') for index in range(options['users'])
+        ])
+        voter_ids = list(User.objects.filter(username__startswith=f'votestress_{suffix}_').values_list('id', flat=True))
+
+        clicks = []
+        for voter_id in voter_ids:
+            for _ in range(options['clicks']):
+                is_upvote = random.random() < 0.6
+                copies = 2 if random.random() < options['double_click'] else 1
+                clicks.extend([(voter_id, is_upvote)] * copies)
+
+        errors = []
+        latencies = []
+        lock = threading.Lock()
+
+        def click(args):
+            voter_id, is_upvote = args
+            started = time.perf_counter()
+            try:
+                votes.cast(voter_id, post.id, is_upvote)
+            except Exception as e:
+                with lock:
+                    errors.append(f'{type(e).__name__}: {e}')
+            finally:
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                close_old_connections()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(click, clicks))
+            elapsed = time.perf_counter() - started
+
+            post.refresh_from_db()
+            actual_up = Vote.objects.filter(post=post, is_upvote=True).count()
+            actual_down = Vote.objects.filter(post=post, is_upvote=False).count()
+            latencies.sort()
+
+            self.stdout.write(
+                f'{len(clicks)} clicks from {len(voter_ids)} voters on {options["threads"]} threads '
+                f'in {elapsed:.2f}s ({len(clicks) / elapsed:.1f} votes/s)'
+            )
+            self.stdout.write(
+                f'latency p50={latencies[len(latencies) // 2] * 1000:.1f}ms '
+                f'p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms'
+            )
+            self.stdout.write(
+                f'stored up/down {post.upvote_count}/{post.downvote_count}, '
+                f'actual {actual_up}/{actual_down}, errors {len(errors)}'
+            )
+            for error in sorted(set(errors))[:5]:
+                self.stdout.write(f'  {error}')
+
+            if (post.upvote_count, post.downvote_count) != (actual_up, actual_down):
+                raise CommandError('Stored counters drifted from the Vote table')
+            if errors:
+                raise CommandError(f'{len(errors)} clicks failed')
+            self.stdout.write(self.style.SUCCESS('Counters consistent, no failed clicks'))
+        finally:
+            post.delete()
+            User.objects.filter(id__in=voter_ids + [author.id]).delete()
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0040_bookmark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challengesubmission',
+            name='runtime_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Runtime reported by the judge/reviewer, used as a leaderboard tie-breaker.', null=True),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('runtime_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('achieved_at', models.DateTimeField()),
+                ('rank', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('challenge', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='posts.weeklychallenge')),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.challengesubmission')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['challenge', 'rank'], name='posts_leade_challen_603275_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('challenge', 'user'), name='unique_challenge_leaderboard_entry'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('challenge__isnull', True)), fields=('user',), name='unique_global_leaderboard_entry'),
+        ),
+    ]
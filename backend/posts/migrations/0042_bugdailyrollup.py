@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:22
+
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    LoggedBug = apps.get_model('posts', 'LoggedBug')
+    BugDailyRollup = apps.get_model('posts', 'BugDailyRollup')
+
+    merged = {}
+    grouped = (
+        LoggedBug.objects.annotate(day=TruncDate('logged_at'))
+        .values('day', 'language_id', 'error_category', 'error_message')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for row in grouped.iterator():
+        category = row['error_category'] or 'UnknownError'
+        digest = hashlib.sha1((row['error_message'] or '').encode('utf-8')).hexdigest()
+        key = (row['day'], row['language_id'], category, digest)
+        if key in merged:
+            merged[key].count += row['total']
+        else:
+            merged[key] = BugDailyRollup(
+                day=row['day'], language_id=row['language_id'], error_category=category,
+                message_hash=digest, error_message=(row['error_message'] or '')[:255], count=row['total'],
+            )
+    BugDailyRollup.objects.bulk_create(merged.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0041_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BugDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('error_category', models.CharField(max_length=100)),
+                ('message_hash', models.CharField(max_length=40)),
+                ('error_message', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('language', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bug_rollups', to='posts.language')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='posts_bugda_day_3c4043_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bugdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'language', 'error_category', 'message_hash'), name='unique_bug_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='bugdailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('language__isnull', True)), fields=('day', 'error_category', 'message_hash'), name='unique_bug_rollup_key_no_language'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
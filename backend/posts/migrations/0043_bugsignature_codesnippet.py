@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0042_bugdailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BugSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('error_category', models.CharField(db_index=True, max_length=100)),
+                ('normalized_message', models.CharField(max_length=255)),
+                ('sample_message', models.CharField(max_length=255)),
+                ('occurrence_count', models.PositiveIntegerField(default=0)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-last_seen'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CodeSnippet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('code', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bugdailyrollup',
+            name='signature',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='posts.bugsignature'),
+        ),
+        migrations.AddField(
+            model_name='loggedbug',
+            name='fixed_snippet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='posts.codesnippet'),
+        ),
+        migrations.AddField(
+            model_name='loggedbug',
+            name='original_snippet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='posts.codesnippet'),
+        ),
+        migrations.AddField(
+            model_name='loggedbug',
+            name='signature',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='posts.bugsignature'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+from posts import fingerprints
+
+
+def backfill_signatures(apps, schema_editor):
+    LoggedBug = apps.get_model('posts', 'LoggedBug')
+    BugSignature = apps.get_model('posts', 'BugSignature')
+    CodeSnippet = apps.get_model('posts', 'CodeSnippet')
+    BugDailyRollup = apps.get_model('posts', 'BugDailyRollup')
+
+    snippets = {}
+    signatures = {}
+    bugs = list(LoggedBug.objects.order_by('logged_at'))
+
+    for bug in bugs:
+        for code in (bug.original_code, bug.fixed_code):
+            if code is not None:
+                snippets.setdefault(fingerprints.content_hash(code), code)
+
+        category = fingerprints.categorize(bug.error_message)
+        fp = fingerprints.fingerprint(bug.error_message, category)
+        signature = signatures.get(fp)
+        if signature is None:
+            signature = signatures[fp] = BugSignature(
+                fingerprint=fp,
+                error_category=category,
+                normalized_message=fingerprints.normalize(bug.error_message),
+                sample_message=bug.error_message[:255],
+                occurrence_count=0,
+                last_seen=bug.logged_at,
+            )
+        signature.occurrence_count += 1
+        signature.last_seen = bug.logged_at
+        bug.error_category = category
+        bug.signature_fp = fp
+
+    CodeSnippet.objects.bulk_create(
+        [CodeSnippet(content_hash=digest, code=code) for digest, code in snippets.items()],
+        batch_size=500,
+    )
+    BugSignature.objects.bulk_create(signatures.values(), batch_size=500)
+
+    snippet_ids = dict(CodeSnippet.objects.values_list('content_hash', 'id'))
+    signature_ids = dict(BugSignature.objects.values_list('fingerprint', 'id'))
+    for bug in bugs:
+        bug.signature_id = signature_ids[bug.signature_fp]
+        bug.original_snippet_id = snippet_ids.get(fingerprints.content_hash(bug.original_code)) if bug.original_code is not None else None
+        bug.fixed_snippet_id = snippet_ids.get(fingerprints.content_hash(bug.fixed_code)) if bug.fixed_code is not None else None
+    LoggedBug.objects.bulk_update(
+        bugs, ['signature', 'error_category', 'original_snippet', 'fixed_snippet'], batch_size=500
+    )
+
+    # Rollups are now keyed by signature instead of the raw message hash
+    BugDailyRollup.objects.all().delete()
+    grouped = (
+        LoggedBug.objects.annotate(day=TruncDate('logged_at'))
+        .values('day', 'language_id', 'signature_id', 'signature__error_category', 'signature__fingerprint', 'error_message')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    merged = {}
+    for row in grouped.iterator():
+        key = (row['day'], row['language_id'], row['signature_id'])
+        if key in merged:
+            merged[key].count += row['total']
+        else:
+            merged[key] = BugDailyRollup(
+                day=row['day'], language_id=row['language_id'], signature_id=row['signature_id'],
+                error_category=row['signature__error_category'], message_hash=row['signature__fingerprint'],
+                error_message=row['error_message'][:255], count=row['total'],
+            )
+    BugDailyRollup.objects.bulk_create(merged.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0043_bugsignature_codesnippet'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0044_backfill_bug_signatures'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='bugdailyrollup',
+            name='unique_bug_rollup_key',
+        ),
+        migrations.RemoveConstraint(
+            model_name='bugdailyrollup',
+            name='unique_bug_rollup_key_no_language',
+        ),
+        migrations.RemoveField(
+            model_name='bugdailyrollup',
+            name='error_category',
+        ),
+        migrations.RemoveField(
+            model_name='bugdailyrollup',
+            name='error_message',
+        ),
+        migrations.RemoveField(
+            model_name='bugdailyrollup',
+            name='message_hash',
+        ),
+        migrations.RemoveField(
+            model_name='loggedbug',
+            name='fixed_code',
+        ),
+        migrations.RemoveField(
+            model_name='loggedbug',
+            name='original_code',
+        ),
+        migrations.AlterField(
+            model_name='bugdailyrollup',
+            name='signature',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='posts.bugsignature'),
+        ),
+        migrations.AddIndex(
+            model_name='loggedbug',
+            index=models.Index(fields=['signature', '-logged_at'], name='posts_logge_signatu_cc57cb_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bugdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'language', 'signature'), name='unique_bug_rollup_signature'),
+        ),
+        migrations.AddConstraint(
+            model_name='bugdailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('language__isnull', True)), fields=('day', 'signature'), name='unique_bug_rollup_signature_no_language'),
+        ),
+    ]
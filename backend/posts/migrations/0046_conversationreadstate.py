@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_read_states(apps, schema_editor):
+    """
+    Nothing tracked reads before, so existing history is treated as read:
+    every participant starts with the watermark on the latest message.
+    """
+    Conversation = apps.get_model('posts', 'Conversation')
+    ChatMessage = apps.get_model('posts', 'ChatMessage')
+    ConversationReadState = apps.get_model('posts', 'ConversationReadState')
+    Membership = Conversation.participants.through
+
+    states = []
+    for conversation_id, user_id in Membership.objects.values_list('conversation_id', 'user_id').iterator():
+        last = ChatMessage.objects.filter(conversation_id=conversation_id).order_by('-created_at').values('id', 'created_at').first()
+        states.append(ConversationReadState(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            last_read_message_id=last['id'] if last else None,
+            last_read_at=last['created_at'] if last else None,
+        ))
+    ConversationReadState.objects.bulk_create(states, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0045_loggedbug_signature_cleanup'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chatmessage',
+            name='read_by',
+        ),
+        migrations.CreateModel(
+            name='ConversationReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='posts.conversation')),
+                ('last_read_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.chatmessage')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='conversationreadstate',
+            constraint=models.UniqueConstraint(fields=('conversation', 'user'), name='unique_conversation_read_state'),
+        ),
+        migrations.RunPython(create_read_states, migrations.RunPython.noop),
+    ]
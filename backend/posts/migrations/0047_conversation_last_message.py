@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_last_message(apps, schema_editor):
+    Conversation = apps.get_model('posts', 'Conversation')
+    ChatMessage = apps.get_model('posts', 'ChatMessage')
+
+    conversations = []
+    for conversation in Conversation.objects.only('id').iterator():
+        last = ChatMessage.objects.filter(conversation_id=conversation.id).order_by('-created_at').first()
+        if last is None:
+            continue
+        conversation.last_message_id = last.id
+        conversation.last_message_text = last.text[:255]
+        conversation.last_message_sender_id = last.sender_id
+        conversation.last_message_at = last.created_at
+        conversations.append(conversation)
+    Conversation.objects.bulk_update(
+        conversations,
+        ['last_message', 'last_message_text', 'last_message_sender', 'last_message_at'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0046_conversationreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.chatmessage'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_text',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['-updated_at', '-id'], name='posts_conve_updated_1786b1_idx'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
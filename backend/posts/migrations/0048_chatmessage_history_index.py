@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0047_conversation_last_message'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='posts_chatm_convers_024dad_idx'),
+        ),
+    ]
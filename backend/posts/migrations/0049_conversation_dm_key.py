@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0048_chatmessage_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='dm_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def merge_direct_conversations(apps, schema_editor):
+    """
+    Give every 1:1 conversation its dm_key. When the same pair has several
+    conversations (created by racing get_or_create calls), keep the oldest,
+    move the others' messages into it and delete them.
+    """
+    Conversation = apps.get_model('posts', 'Conversation')
+    ChatMessage = apps.get_model('posts', 'ChatMessage')
+    ConversationReadState = apps.get_model('posts', 'ConversationReadState')
+    Membership = Conversation.participants.through
+
+    members = defaultdict(list)
+    for conversation_id, user_id in Membership.objects.values_list('conversation_id', 'user_id').iterator():
+        members[conversation_id].append(user_id)
+
+    by_pair = defaultdict(list)
+    for conversation_id, user_ids in members.items():
+        if len(user_ids) == 2:
+            low, high = sorted(user_ids)
+            by_pair[f'{low}:{high}'].append(conversation_id)
+
+    for dm_key, conversation_ids in by_pair.items():
+        conversations = list(Conversation.objects.filter(id__in=conversation_ids).order_by('created_at', 'id'))
+        keep, duplicates = conversations[0], conversations[1:]
+
+        if duplicates:
+            duplicate_ids = [conversation.id for conversation in duplicates]
+            ChatMessage.objects.filter(conversation_id__in=duplicate_ids).update(conversation_id=keep.id)
+            Conversation.objects.filter(id__in=duplicate_ids).delete()
+
+            last = ChatMessage.objects.filter(conversation_id=keep.id).order_by('-created_at').first()
+            if last is not None:
+                keep.last_message_id = last.id
+                keep.last_message_text = last.text[:255]
+                keep.last_message_sender_id = last.sender_id
+                keep.last_message_at = last.created_at
+                keep.updated_at = max(keep.updated_at, last.created_at)
+
+            # Unread counters now span the merged history
+            for state in ConversationReadState.objects.filter(conversation_id=keep.id):
+                unread = ChatMessage.objects.filter(conversation_id=keep.id).exclude(sender_id=state.user_id)
+                if state.last_read_at:
+                    unread = unread.filter(created_at__gt=state.last_read_at)
+                state.unread_count = unread.count()
+                state.save(update_fields=['unread_count'])
+
+        keep.dm_key = dm_key
+        Conversation.objects.filter(id=keep.id).update(
+            dm_key=keep.dm_key,
+            updated_at=keep.updated_at,
+            last_message_id=keep.last_message_id,
+            last_message_text=keep.last_message_text,
+            last_message_sender_id=keep.last_message_sender_id,
+            last_message_at=keep.last_message_at,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0049_conversation_dm_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_direct_conversations, migrations.RunPython.noop),
+    ]
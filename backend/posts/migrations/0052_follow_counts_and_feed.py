@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_follow_counts(apps, schema_editor):
+    Profile = apps.get_model('posts', 'Profile')
+    Follow = apps.get_model('posts', 'Follow')
+
+    def count_of(field):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{field: OuterRef('user_id')})
+            .values(field).annotate(n=Count('id')).values('n')
+        ), Value(0))
+
+    Profile.objects.update(followers_count=count_of('following'), following_count=count_of('follower'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0051_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-created_at', '-post'], name='posts_feede_owner_i_42645e_idx'), models.Index(fields=['owner', 'author'], name='posts_feede_owner_i_b27698_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'post'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
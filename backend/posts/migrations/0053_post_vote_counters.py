@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Vote = apps.get_model('posts', 'Vote')
+
+    def count_of(is_upvote):
+        return Coalesce(Subquery(
+            Vote.objects.filter(post_id=OuterRef('id'), is_upvote=is_upvote)
+            .values('post_id').annotate(n=Count('id')).values('n')
+        ), Value(0))
+
+    Post.objects.update(upvote_count=count_of(True), downvote_count=count_of(False))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0052_follow_counts_and_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='downvote_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='upvote_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0053_post_vote_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='posts.post')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['post', 'rank'], name='posts_relat_post_id_3454d1_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedpost',
+            constraint=models.UniqueConstraint(fields=('post', 'related'), name='unique_related_post'),
+        ),
+    ]
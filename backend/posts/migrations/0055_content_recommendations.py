@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0054_related_post_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField(auto_now_add=True)),
+                ('document_count', models.PositiveIntegerField()),
+                ('vocabulary', models.JSONField(help_text='{term: [column, idf]}')),
+            ],
+            options={
+                'get_latest_by': 'built_at',
+            },
+        ),
+        migrations.CreateModel(
+            name='ContentVector',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='content_vector', serialize=False, to='posts.post')),
+                ('indices', models.JSONField(default=list)),
+                ('weights', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_posts', to='posts.post')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['post', 'rank'], name='posts_simil_post_id_5fed00_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarpost',
+            constraint=models.UniqueConstraint(fields=('post', 'similar'), name='unique_similar_post'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Tag = apps.get_model('posts', 'Tag')
+    Community = apps.get_model('posts', 'Community')
+    PostTag = Post.tags.through
+
+    def scalar(queryset, group_field, aggregate):
+        return Subquery(queryset.values(group_field).annotate(value=aggregate).values('value'))
+
+    tag_posts = PostTag.objects.filter(tag_id=OuterRef('id'))
+    Tag.objects.update(
+        posts_count=Coalesce(scalar(tag_posts, 'tag_id', Count('post_id')), Value(0), output_field=IntegerField()),
+        members_count=Coalesce(scalar(tag_posts, 'tag_id', Count('post__author_id', distinct=True)), Value(0), output_field=IntegerField()),
+        last_activity_at=scalar(tag_posts, 'tag_id', Max('post__created_at')),
+    )
+    community_posts = Post.objects.filter(community_id=OuterRef('id'))
+    Community.objects.update(
+        posts_count=Coalesce(scalar(community_posts, 'community_id', Count('id')), Value(0), output_field=IntegerField()),
+        members_count=Coalesce(scalar(community_posts, 'community_id', Count('author_id', distinct=True)), Value(0), output_field=IntegerField()),
+        last_activity_at=scalar(community_posts, 'community_id', Max('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0055_content_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='community',
+            index=models.Index(fields=['-posts_count'], name='posts_commu_posts_c_e0dace_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='community',
+            index=models.Index(fields=['-last_activity_at'], name='posts_commu_last_ac_b49c29_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-posts_count'], name='posts_tag_posts_c_890376_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-last_activity_at'], name='posts_tag_last_ac_e0824e_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
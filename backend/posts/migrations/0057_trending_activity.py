@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0056_tag_community_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(choices=[('tag', 'Tag'), ('community', 'Community')], max_length=10)),
+                ('subject_id', models.PositiveIntegerField()),
+                ('hour', models.DateTimeField()),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+                ('votes', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(choices=[('tag', 'Tag'), ('community', 'Community')], max_length=10)),
+                ('subject_id', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['subject', 'rank'],
+                'indexes': [models.Index(fields=['subject', 'rank'], name='posts_trend_subject_ddff30_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='trendingscore',
+            constraint=models.UniqueConstraint(fields=('subject', 'subject_id'), name='unique_trending_score'),
+        ),
+        migrations.AddIndex(
+            model_name='activitybucket',
+            index=models.Index(fields=['hour'], name='posts_activ_hour_747e28_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='activitybucket',
+            constraint=models.UniqueConstraint(fields=('subject', 'subject_id', 'hour'), name='unique_activity_bucket'),
+        ),
+    ]
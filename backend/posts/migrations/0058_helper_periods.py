@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def open_current_periods(apps, schema_editor):
+    Profile = apps.get_model('posts', 'Profile')
+    HelperPeriod = apps.get_model('posts', 'HelperPeriod')
+    now = timezone.now()
+    HelperPeriod.objects.bulk_create([
+        HelperPeriod(user_id=user_id, started_at=now)
+        for user_id in Profile.objects.filter(is_weekly_helper=True).values_list('user_id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0057_trending_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HelperPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='helper_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['user', '-started_at'], name='posts_helpe_user_id_30bce7_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='helperperiod',
+            constraint=models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('user',), name='unique_open_helper_period'),
+        ),
+        migrations.RunPython(open_current_periods, migrations.RunPython.noop),
+    ]
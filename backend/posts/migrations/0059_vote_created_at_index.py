@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0058_helper_periods'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['created_at'], name='posts_vote_created_fac431_idx'),
+        ),
+    ]
@@ -14,10 +14,28 @@ class Conversation(models.Model):
     participants = models.ManyToManyField(User, related_name='conversations')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # "<smaller user id>:<larger user id>" for 1:1 conversations, NULL otherwise
+    dm_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    # Denormalized copy of the latest message, written on send
+    last_message = models.ForeignKey('ChatMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_text = models.CharField(max_length=255, blank=True, default='')
+    last_message_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-updated_at', '-id']),
+        ]
 
     def __str__(self):
         return f"Conversation {self.id}"
 
+    @staticmethod
+    def direct_key(user_id, other_user_id):
+        low, high = sorted((user_id, other_user_id))
+        return f"{low}:{high}"
+
 class ChatMessage(models.Model):
     """
     Represents a single message within a conversation.
@@ -27,14 +45,37 @@ class ChatMessage(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
-    read_by = models.ManyToManyField(User, related_name='read_messages', blank=True)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Keyset windows of a conversation's history
+            models.Index(fields=['conversation', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} at {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+class ConversationReadState(models.Model):
+    """
+    Read watermark of one participant in one conversation: the last message
+    they have read plus a running count of messages received since then.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_read_states')
+    last_read_message = models.ForeignKey(ChatMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_read_state'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.conversation_id}: {self.unread_count} unread"
+
 class BotSession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     post = models.ForeignKey(
@@ -56,6 +97,16 @@ class Community(models.Model):
                                     on_delete=models.CASCADE,
                                     related_name='owned_communities')
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    # Denormalized stats, maintained by posts.counters (signals) and rebuild_taxonomy_counters
+    posts_count = models.PositiveIntegerField(default=0)
+    members_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-posts_count']),
+            models.Index(fields=['-last_activity_at']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -88,6 +139,10 @@ class Tag(models.Model):
     slug = models.SlugField(max_length=50, unique=True, blank=True)
     color = models.CharField(max_length=7, default='#007bff')  # Hex color code
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized stats, maintained by posts.counters (signals) and rebuild_taxonomy_counters
+    posts_count = models.PositiveIntegerField(default=0)
+    members_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -97,12 +152,12 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
     
-    def posts_count(self):
-        # This will now count posts associated with this Tag (not language)
-        return self.posts.count() 
-    
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['-posts_count']),
+            models.Index(fields=['-last_activity_at']),
+        ]
     
 class Post(models.Model):
     title        = models.CharField(max_length=255)
@@ -118,6 +173,16 @@ class Post(models.Model):
     # Tags are now for general categorization, not programming languages
     tags         = models.ManyToManyField(Tag, blank=True, related_name='posts') 
     created_at   = models.DateTimeField(auto_now_add=True)
+    # Denormalized vote counters, moved by posts.votes.cast in the vote's transaction
+    upvote_count   = models.IntegerField(default=0)
+    downvote_count = models.IntegerField(default=0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # community_id lúc load: signals biết bài có đổi community không mà không cần SELECT lại
+        instance._loaded_community_id = instance.__dict__.get('community_id', models.DEFERRED)
+        return instance
     
     def comment_count(self):
         return self.comments.count()  # nếu bạn dùng related_name='comments'
@@ -127,10 +192,8 @@ class Post(models.Model):
     
     @property
     def score(self):
-        """Tính điểm dựa trên vote"""
-        upvotes = self.votes.filter(is_upvote=True).count()
-        downvotes = self.votes.filter(is_upvote=False).count()
-        return upvotes - downvotes
+        """Tính điểm dựa trên vote (bộ đếm lưu sẵn, không COUNT)"""
+        return self.upvote_count - self.downvote_count
     
     @property
     def comment_count(self):
@@ -173,6 +236,9 @@ class Vote(models.Model):
 
     class Meta:
         unique_together = ('user', 'post')  # Một user chỉ vote 1 lần cho 1 post
+        indexes = [
+            models.Index(fields=['created_at']),  # trending.recount_votes
+        ]
     
     def save(self, *args, **kwargs):
         # tự động set value mỗi lần tạo hoặc update
@@ -209,11 +275,9 @@ class Profile(models.Model):
         default=Role.USER,
     )
     
-    def followers_count(self):
-        return self.user.follower_set.count()
-    
-    def following_count(self):
-        return self.user.following_set.count()
+    # Denormalized from Follow; kept in step by posts.feeds.follow/unfollow
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
 
 class Follow(models.Model):
     follower = models.ForeignKey(User, related_name='following_set', on_delete=models.CASCADE)
@@ -225,7 +289,168 @@ class Follow(models.Model):
     
     def __str__(self):
         return f"{self.follower.username}→{self.following.username}"
-    
+
+
+class HelperPeriod(models.Model):
+    """
+    One stretch of time a user held the Weekly Helper badge, written by
+    posts.helpers.update(). ended_at is NULL while the badge is held.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='helper_periods')
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=models.Q(ended_at__isnull=True), name='unique_open_helper_period'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-started_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} helper {self.started_at:%Y-%m-%d} → {self.ended_at or '…'}"
+
+
+class RelatedPost(models.Model):
+    """
+    Precomputed "related posts" neighbor, kept per post by posts.related.
+    rank 0 is the closest neighbor.
+    """
+    post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='neighbors')
+    related = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'related'], name='unique_related_post'),
+        ]
+        indexes = [
+            models.Index(fields=['post', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} ~ {self.related_id} ({self.score:.3f})"
+
+
+class ContentIndex(models.Model):
+    """
+    Vocabulary and IDF weights of the last full TF-IDF build (posts.recommendations).
+    New posts are vectorized against the latest row until the next rebuild.
+    """
+    built_at = models.DateTimeField(auto_now_add=True)
+    document_count = models.PositiveIntegerField()
+    vocabulary = models.JSONField(help_text="{term: [column, idf]}")
+
+    class Meta:
+        get_latest_by = 'built_at'
+
+    def __str__(self):
+        return f"Content index {self.built_at:%Y-%m-%d %H:%M} ({len(self.vocabulary)} terms)"
+
+
+class ContentVector(models.Model):
+    """L2-normalized sparse TF-IDF vector of one post, columns from the latest ContentIndex."""
+    post = models.OneToOneField('Post', on_delete=models.CASCADE, primary_key=True, related_name='content_vector')
+    indices = models.JSONField(default=list)
+    weights = models.JSONField(default=list)
+
+
+class SimilarPost(models.Model):
+    """Top-K content (cosine) neighbor of a post; rank 0 is the closest."""
+    post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='similar_posts')
+    similar = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'similar'], name='unique_similar_post'),
+        ]
+        indexes = [
+            models.Index(fields=['post', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} ≈ {self.similar_id} ({self.score:.3f})"
+
+
+class ActivityBucket(models.Model):
+    """
+    Hourly activity counts of one tag or community, kept by posts.trending
+    for the last trending.WINDOW_HOURS hours.
+    """
+    TAG = 'tag'
+    COMMUNITY = 'community'
+    SUBJECT_CHOICES = [(TAG, 'Tag'), (COMMUNITY, 'Community')]
+
+    subject = models.CharField(max_length=10, choices=SUBJECT_CHOICES)
+    subject_id = models.PositiveIntegerField()
+    hour = models.DateTimeField()
+    posts = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    votes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subject', 'subject_id', 'hour'], name='unique_activity_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} {self.subject_id} @ {self.hour:%Y-%m-%d %H}h"
+
+
+class TrendingScore(models.Model):
+    """Last computed trend score of a tag or community; rank 0 is the hottest."""
+    subject = models.CharField(max_length=10, choices=ActivityBucket.SUBJECT_CHOICES)
+    subject_id = models.PositiveIntegerField()
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['subject', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['subject', 'subject_id'], name='unique_trending_score'),
+        ]
+        indexes = [
+            models.Index(fields=['subject', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} {self.subject} {self.subject_id} ({self.score:.2f})"
+
+
+class FeedEntry(models.Model):
+    """
+    One post in a user's precomputed "following" timeline, written when the
+    post is published (fan-out on write). created_at copies the post's so
+    the timeline is read straight off the (owner, created_at) index.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post']),
+            models.Index(fields=['owner', 'author']),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} <- post {self.post_id}"
+
 
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
@@ -248,12 +473,17 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     read_at = models.DateTimeField(null=True, blank=True)
     submission = models.ForeignKey('ChallengeSubmission', on_delete=models.CASCADE, null=True, blank=True)
+    # Coalescing: repeated events with the same group_key fold into one unread row
+    group_key = models.CharField(max_length=100, blank=True, default='')
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_ids = models.JSONField(default=list, blank=True)  # distinct senders folded into the row
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['recipient', 'group_key', 'is_read']),
         ]
     
     def __str__(self):
@@ -292,22 +522,54 @@ class Notification(models.Model):
         """
         Tạo URL động.
         """
-        if self.notification_type in ['comment', 'vote', 'bot_analysis'] and self.post:
-            return f"/post/{self.post.id}"
+        if self.notification_type in ['comment', 'vote', 'bot_analysis'] and self.post_id:
+            return f"/post/{self.post_id}"
         
-        elif self.notification_type == 'follow' and self.sender:
+        elif self.notification_type == 'follow' and self.sender_id:
             return f"/profile/{self.sender.username}"
 
-        elif self.notification_type == 'challenge_submission' and self.submission:
-            return f"/admin/review/{self.submission.id}"
+        elif self.notification_type == 'challenge_submission' and self.submission_id:
+            return f"/admin/review/{self.submission_id}"
         
-        elif self.notification_type == 'challenge_review' and self.submission:
-            return f"/challenges/{self.submission.challenge.id}"
+        elif self.notification_type == 'challenge_review' and self.submission_id:
+            return f"/challenges/{self.submission.challenge_id}"
         
         # Fallback URL
         return "/"
     
 
+class BugSignature(models.Model):
+    """
+    Canonical identity of a bug: every LoggedBug whose normalized error
+    message hashes to the same fingerprint is an occurrence of one signature.
+    """
+    fingerprint = models.CharField(max_length=40, unique=True)
+    error_category = models.CharField(max_length=100, db_index=True)
+    normalized_message = models.CharField(max_length=255)
+    sample_message = models.CharField(max_length=255)
+    occurrence_count = models.PositiveIntegerField(default=0)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-last_seen']
+
+    def __str__(self):
+        return f"{self.error_category}: {self.normalized_message[:50]} (x{self.occurrence_count})"
+
+
+class CodeSnippet(models.Model):
+    """
+    Content-addressed code body, shared by every LoggedBug with identical code.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    code = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"CodeSnippet {self.content_hash[:12]}"
+
+
 class LoggedBug(models.Model):
     """
     Stores information about a specific bug fixed by the AI.
@@ -320,10 +582,11 @@ class LoggedBug(models.Model):
     error_message = models.CharField(max_length=255, db_index=True)
     error_category = models.CharField(max_length=100, blank=True, null=True, db_index=True, help_text="e.g., TypeError, ReferenceError, NameError")
     
-    # The code itself
-    original_code = models.TextField()
-    fixed_code = models.TextField(blank=True, null=True, help_text="The final version of the code after DevAlly fix.")
+    # The code itself, deduplicated by content hash
+    original_snippet = models.ForeignKey(CodeSnippet, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    fixed_snippet = models.ForeignKey(CodeSnippet, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     fix_step_count = models.PositiveSmallIntegerField(default=1)
+    signature = models.ForeignKey(BugSignature, on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences')
 
     # Context
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, help_text="User who encountered the bug")
@@ -334,11 +597,45 @@ class LoggedBug(models.Model):
         indexes = [
             models.Index(fields=['logged_at', 'language']),
             models.Index(fields=['error_category']),
+            models.Index(fields=['signature', '-logged_at']),
         ]
 
+    @property
+    def original_code(self):
+        return self.original_snippet.code if self.original_snippet_id else ''
+
+    @property
+    def fixed_code(self):
+        """The final version of the code after DevAlly fix."""
+        return self.fixed_snippet.code if self.fixed_snippet_id else None
+
     def __str__(self):
         return f"{self.error_category or 'Bug'} in {self.language.name if self.language else 'N/A'} at {self.logged_at.strftime('%Y-%m-%d')}"
-    
+
+
+class BugDailyRollup(models.Model):
+    """
+    Pre-aggregated LoggedBug counts per (day, language, bug signature).
+    Serves the Community Bug Tracker stats without scanning raw bug rows.
+    """
+    day = models.DateField()
+    language = models.ForeignKey(Language, on_delete=models.CASCADE, null=True, blank=True, related_name='bug_rollups')
+    signature = models.ForeignKey(BugSignature, on_delete=models.CASCADE, related_name='daily_rollups')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'language', 'signature'], name='unique_bug_rollup_signature'),
+            models.UniqueConstraint(fields=['day', 'signature'], condition=models.Q(language__isnull=True), name='unique_bug_rollup_signature_no_language'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.signature_id} x{self.count} on {self.day}"
+
 
 class WeeklyChallenge(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -380,6 +677,7 @@ class ChallengeSubmission(models.Model):
         default='pending'
     )
     feedback = models.TextField(blank=True, null=True)
+    runtime_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Runtime reported by the judge/reviewer, used as a leaderboard tie-breaker.")
 
     def __str__(self):
         return f"Submission by {self.user.username} for {self.challenge.title}"
@@ -387,6 +685,38 @@ class ChallengeSubmission(models.Model):
     class Meta:
         ordering = ['-submitted_at']
 
+
+class LeaderboardEntry(models.Model):
+    """
+    Materialized leaderboard row, kept up to date on every submission verdict.
+    A row with challenge=None belongs to the global leaderboard.
+    """
+    challenge = models.ForeignKey(WeeklyChallenge, on_delete=models.CASCADE, null=True, blank=True, related_name='leaderboard_entries')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    submission = models.ForeignKey(ChallengeSubmission, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Sort key: approved_count DESC, runtime_ms ASC (nulls last), achieved_at ASC
+    approved_count = models.PositiveIntegerField(default=0)
+    runtime_ms = models.PositiveIntegerField(null=True, blank=True)
+    achieved_at = models.DateTimeField()
+
+    rank = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['challenge', 'user'], name='unique_challenge_leaderboard_entry'),
+            models.UniqueConstraint(fields=['user'], condition=models.Q(challenge__isnull=True), name='unique_global_leaderboard_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['challenge', 'rank']),
+        ]
+
+    def __str__(self):
+        board = self.challenge.title if self.challenge else 'Global'
+        return f"#{self.rank} {self.user.username} ({board})"
+
 class Bookmark(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookmarks')
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='bookmarked_by')
@@ -0,0 +1,254 @@
+"""
+Notification delivery.
+
+Callers use notify() / notify_many(). Once the surrounding transaction
+commits, the event is handed to the `notifications` channel and
+NotificationWorker (`python manage.py runworker notifications`) fans it
+out, so the request never pays for it. When NOTIFICATIONS_ASYNC is off or
+the channel layer is unreachable, deliver() runs inline instead.
+
+deliver() writes one batch per event. For types listed in
+COALESCE_TEMPLATES, an unread notification with the same group_key from
+within COALESCE_WINDOW absorbs the new event ("Alice and 11 others upvoted
+your post") instead of adding a row. The row keeps the ids of its distinct
+senders, so an actor acting again is not counted twice. Everything else is inserted with
+bulk_create. Unread counters live in the cache and are filled lazily from
+the database on a miss. Each recipient gets a push on their WebSocket group
+(`notifications_<user id>`, see NotificationConsumer).
+
+purge() enforces retention; see the purge_notifications command.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+WORKER_CHANNEL = 'notifications'
+UNREAD_CACHE_TIMEOUT = 60 * 60 * 24
+COALESCE_WINDOW = timedelta(hours=6)
+READ_RETENTION_DAYS = 30
+UNREAD_RETENTION_DAYS = 90
+PURGE_BATCH_SIZE = 5000
+
+# notification_type -> (one actor, several actors)
+COALESCE_TEMPLATES = {
+    'vote': (
+        "{actor} upvoted your post '{subject}'",
+        "{actor} and {others} others upvoted your post '{subject}'",
+    ),
+    'comment': (
+        "{actor} commented on your post '{subject}'",
+        "{actor} and {others} others commented on your post '{subject}'",
+    ),
+    'follow': (
+        "{actor} started following you",
+        "{actor} and {others} others started following you",
+    ),
+}
+
+
+def group_name(user_id):
+    return f'notifications_{user_id}'
+
+
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+# --- Unread counter ---------------------------------------------------------
+
+def unread_count(user_id):
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.add(_unread_key(user_id), count, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def _adjust_unread(user_id, amount):
+    """Apply a delta to a cached counter; a missing counter is left for the next read to fill."""
+    try:
+        count = cache.incr(_unread_key(user_id), amount)
+    except ValueError:
+        return
+    if count < 0:
+        cache.delete(_unread_key(user_id))
+
+
+def reset_unread(user_id):
+    cache.set(_unread_key(user_id), 0, UNREAD_CACHE_TIMEOUT)
+    _send(user_id, {'type': 'notification.count', 'count': 0})
+
+
+def marked_read(user_id, count=1):
+    _adjust_unread(user_id, -count)
+    _send(user_id, {'type': 'notification.count', 'count': unread_count(user_id)})
+
+
+# --- Push -------------------------------------------------------------------
+
+def _send(user_id, event):
+    """Best effort: the REST endpoints remain the source of truth if the layer is down."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name(user_id), event)
+    except Exception as e:
+        logger.warning(f"Failed to push notification event to user {user_id}: {e}")
+
+
+def push(notification):
+    _send(notification.recipient_id, {
+        'type': 'notification.created',
+        'notification': NotificationSerializer(notification).data,
+        'count': unread_count(notification.recipient_id),
+    })
+
+
+# --- Fan-out ----------------------------------------------------------------
+
+def group_key_for(notification_type, post_id=None, comment_id=None, submission_id=None):
+    return f'{notification_type}:{post_id or ""}:{comment_id or ""}:{submission_id or ""}'
+
+
+def _render(notification_type, actor, actor_count, subject, message):
+    templates = COALESCE_TEMPLATES.get(notification_type)
+    if templates is None:
+        return message
+    single, several = templates
+    template = single if actor_count == 1 else several
+    return template.format(actor=actor, others=actor_count - 1, subject=subject)
+
+
+def deliver(recipient_ids, sender_id, notification_type, message='', subject='',
+            post_id=None, comment_id=None, submission_id=None):
+    """
+    Write one event for many recipients: a single SELECT for open groups, one
+    bulk_update for the coalesced rows and one bulk_create for the rest.
+    Returns the touched notifications.
+    """
+    recipient_ids = [user_id for user_id in dict.fromkeys(recipient_ids) if user_id != sender_id]
+    if not recipient_ids:
+        return []
+
+    sender = User.objects.select_related('profile').get(id=sender_id)
+    group_key = group_key_for(notification_type, post_id, comment_id, submission_id)
+    now = timezone.now()
+
+    with transaction.atomic():
+        open_groups = {}
+        if notification_type in COALESCE_TEMPLATES:
+            candidates = Notification.objects.select_for_update().filter(
+                recipient_id__in=recipient_ids,
+                group_key=group_key,
+                is_read=False,
+                created_at__gte=now - COALESCE_WINDOW,
+            ).order_by('created_at')
+            open_groups = {notification.recipient_id: notification for notification in candidates}
+
+        coalesced = list(open_groups.values())
+        for notification in coalesced:
+            actors = notification.actor_ids or [notification.sender_id]  # rows from before actor_ids
+            if sender_id not in actors:
+                actors.append(sender_id)
+                notification.actor_count += 1
+            notification.actor_ids = actors
+            notification.sender = sender
+            notification.created_at = now
+            notification.message = _render(notification_type, sender.username, notification.actor_count, subject, message)
+        Notification.objects.bulk_update(coalesced, ['actor_count', 'actor_ids', 'sender', 'created_at', 'message'])
+
+        created = Notification.objects.bulk_create([
+            Notification(
+                recipient_id=user_id,
+                sender=sender,
+                notification_type=notification_type,
+                message=_render(notification_type, sender.username, 1, subject, message),
+                post_id=post_id,
+                comment_id=comment_id,
+                submission_id=submission_id,
+                group_key=group_key,
+                actor_ids=[sender_id],
+            )
+            for user_id in recipient_ids if user_id not in open_groups
+        ], batch_size=500)
+
+    for notification in created:
+        _adjust_unread(notification.recipient_id, 1)
+    for notification in coalesced + created:
+        push(notification)
+    return coalesced + created
+
+
+def _enqueue(payload):
+    if getattr(settings, 'NOTIFICATIONS_ASYNC', False):
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            try:
+                async_to_sync(channel_layer.send)(WORKER_CHANNEL, {'type': 'notification.fanout', **payload})
+                return
+            except Exception as e:
+                logger.warning(f"Notification worker unreachable, delivering inline: {e}")
+    deliver(**payload)
+
+
+def notify_many(recipients, sender, notification_type, message='', subject='', post=None, comment=None, submission=None):
+    """
+    Queue one notification event for several recipients (users or ids).
+    Nothing is written until the current transaction commits.
+    """
+    payload = {
+        'recipient_ids': [getattr(recipient, 'id', recipient) for recipient in recipients],
+        'sender_id': sender.id,
+        'notification_type': notification_type,
+        'message': message,
+        'subject': subject,
+        'post_id': post.id if post else None,
+        'comment_id': comment.id if comment else None,
+        'submission_id': str(submission.id) if submission else None,
+    }
+    transaction.on_commit(lambda: _enqueue(payload))
+
+
+def notify(recipient, sender, notification_type, message='', **kwargs):
+    notify_many([recipient], sender, notification_type, message, **kwargs)
+
+
+# --- Retention --------------------------------------------------------------
+
+def purge(read_days=READ_RETENTION_DAYS, unread_days=UNREAD_RETENTION_DAYS, batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete read notifications older than `read_days` and every notification
+    older than `unread_days`, `batch_size` rows at a time so a large backlog
+    never holds one long lock. Returns the number of deleted rows.
+    """
+    now = timezone.now()
+    expired = Notification.objects.filter(
+        is_read=True, created_at__lt=now - timedelta(days=read_days)
+    ) | Notification.objects.filter(created_at__lt=now - timedelta(days=unread_days))
+
+    deleted = 0
+    stale_counters = set()
+    while True:
+        batch = list(expired.order_by().values_list('id', 'recipient_id', 'is_read')[:batch_size])
+        if not batch:
+            break
+        Notification.objects.filter(id__in=[row[0] for row in batch]).delete()
+        stale_counters.update(recipient_id for _, recipient_id, is_read in batch if not is_read)
+        deleted += len(batch)
+
+    # Recipients who lost unread rows get their counter recomputed on the next read
+    cache.delete_many([_unread_key(user_id) for user_id in stale_counters])
+    return deleted
@@ -0,0 +1,33 @@
+import gzip
+import io
+import zlib
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+MAX_DECOMPRESSED_BYTES = 5 * 1024 * 1024  # 5 MB
+
+
+class GzipJSONParser(JSONParser):
+    """
+    JSONParser that also accepts bodies sent with `Content-Encoding: gzip`.
+    The decompressed size is capped so a small payload cannot expand without bound.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').lower() if request is not None else ''
+
+        if encoding == 'gzip':
+            try:
+                with gzip.GzipFile(fileobj=stream) as body:
+                    raw = body.read(MAX_DECOMPRESSED_BYTES + 1)
+            except (OSError, EOFError, zlib.error) as exc:
+                raise ParseError(f'Invalid gzip body - {exc}')
+            if len(raw) > MAX_DECOMPRESSED_BYTES:
+                raise ParseError('Decompressed body is too large.')
+            stream = io.BytesIO(raw)
+        elif encoding not in ('', 'identity'):
+            raise ParseError(f'Unsupported Content-Encoding "{encoding}".')
+
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,147 @@
+"""
+Query budgets: the most SQL queries a view may run, declared next to the
+view as base + per_item * (number of items in the response).
+
+    @query_budget(4)                       # function view: above @api_view
+    @api_view(['GET'])
+    def bug_stats_view(request): ...
+
+    @action(detail=False, methods=['get'])
+    @query_budget(6, items='notifications')  # viewset action
+    def count_and_recent(self, request): ...
+
+    class PostViewSet(viewsets.ModelViewSet):
+        query_budgets = {'list': QueryBudget(12)}  # inherited actions
+
+items names the response key(s) holding the returned rows. By default a
+list response counts its own length and a paginated one its 'results'.
+
+QueryBudgetMiddleware counts every query a request runs, and the time
+spent in the database, through connection.execute_wrapper. Transaction
+control (BEGIN, SAVEPOINT, RELEASE, ...) is timed but not counted: whether
+it goes through the cursor depends on the backend and on the enclosing
+atomic block (a TestCase), so counting it would make budgets differ
+between SQLite, PostgreSQL and tests.
+- with settings.QUERY_BUDGET_HEADERS (defaults to DEBUG) the response
+  carries X-DB-Query-Count, X-DB-Time-Ms and, for budgeted views,
+  X-Query-Budget
+- a request over its budget is logged as a warning; with
+  settings.QUERY_BUDGET_STRICT (turned on by posts.test_runner) it raises
+  QueryBudgetExceeded, listing the queries, so the test fails
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget:
+    def __init__(self, base, per_item=0, items=None):
+        self.base = base
+        self.per_item = per_item
+        self.items = (items,) if isinstance(items, str) else items
+
+    def count_items(self, data):
+        if not self.per_item:
+            return 0
+        if self.items:
+            if not isinstance(data, dict):
+                return 0
+            return sum(len(data.get(key) or ()) for key in self.items)
+        if isinstance(data, list):
+            return len(data)
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            return len(data['results'])
+        return 0
+
+    def limit(self, data):
+        return self.base + self.per_item * self.count_items(data)
+
+    def __repr__(self):
+        return f'QueryBudget({self.base}, per_item={self.per_item})'
+
+
+def query_budget(base, per_item=0, items=None):
+    """Decorator: attach a QueryBudget to a view function or viewset action."""
+    def decorator(view):
+        view.query_budget = QueryBudget(base, per_item, items)
+        return view
+    return decorator
+
+
+def budget_for(view_func, method):
+    """The QueryBudget that applies to a resolved view for this HTTP method, or None."""
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is not None:
+        return budget
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return None
+    actions = getattr(view_func, 'actions', None)  # set by ViewSet.as_view()
+    name = actions.get(method.lower()) if actions else method.lower()
+    if name is None:
+        return None
+    budget = getattr(cls, 'query_budgets', {}).get(name)
+    return budget or getattr(getattr(cls, name, None), 'query_budget', None)
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries (transaction control excluded) and their total duration."""
+
+    def __init__(self, keep_sql=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            if not sql.lstrip().upper().startswith(TRANSACTION_CONTROL):
+                self.count += 1
+                if self.keep_sql:
+                    self.statements.append(sql)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = budget_for(view_func, request.method)
+
+    def __call__(self, request):
+        strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        counter = QueryCounter(keep_sql=strict)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        budget = getattr(request, '_query_budget', None)
+        limit = budget.limit(getattr(response, 'data', None)) if budget else None
+        if getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG):
+            response['X-DB-Query-Count'] = str(counter.count)
+            response['X-DB-Time-Ms'] = f'{counter.seconds * 1000:.2f}'
+            if limit is not None:
+                response['X-Query-Budget'] = str(limit)
+
+        if limit is not None and counter.count > limit:
+            message = f'{request.method} {request.path} ran {counter.count} queries, budget {limit} ({budget!r})'
+            if strict:
+                raise QueryBudgetExceeded('\n'.join([message, *counter.statements]))
+            logger.warning(message)
+        return response
@@ -0,0 +1,277 @@
+"""
+Content-based recommendations: TF-IDF over post titles and bodies.
+
+Tokenization is code-aware. Identifiers are kept whole and also split on
+snake_case and camelCase boundaries, so `getUserName`, `get_user_name`
+and "get the user name" share the terms get/user/name. Title tokens count
+twice.
+
+build() fits the vocabulary and IDF over every post and builds an
+L2-normalized scipy CSR matrix. It then finds each post's TOP_K cosine
+neighbors in row blocks: one sparse product per block, with the dense
+(block x posts) result bounded by CELL_BUDGET, and argpartition for the
+top-K. Vectors, vocabulary and neighbor lists are persisted
+(ContentVector, ContentIndex, SimilarPost).
+
+update() is the incremental path for posts created (or edited, see
+post_edited) since. It vectorizes them against the stored vocabulary and runs one block product against the
+stored matrix. It writes their lists and merges them into the lists of
+existing posts they now beat; an edited post's old entries in those lists
+are replaced by its new score. IDF stays as of the last build(), so
+schedule a full build periodically (build_recommendations --full).
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Bookmark, ContentIndex, ContentVector, Post, SimilarPost, Vote
+
+TOP_K = 10
+DEFAULT_LIMIT = 5
+MIN_SIMILARITY = 0.05
+MIN_DF = 2
+MAX_DF_RATIO = 0.6
+MAX_FEATURES = 50000
+TITLE_WEIGHT = 2
+CELL_BUDGET = 8_000_000  # dense similarity cells per block (~32 MB of float32)
+MERGE_CANDIDATES = 50  # existing posts checked per new post in update()
+SEED_LIMIT = 50
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+WORD_PART_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my no not of on or so than that the then there these this to too was we what when
+where which while who why will with you your
+""".split())
+
+
+def tokenize(text):
+    for identifier in IDENTIFIER_RE.findall(text or ''):
+        parts = [part.lower() for chunk in identifier.split('_') for part in WORD_PART_RE.findall(chunk)]
+        if len(parts) > 1:
+            yield identifier.lower()
+        for part in parts:
+            if len(part) > 1 and part not in STOPWORDS and not part.isdigit():
+                yield part
+
+
+def _term_counts(title, content):
+    counts = Counter(tokenize(content))
+    for term in tokenize(title):
+        counts[term] += TITLE_WEIGHT
+    return counts
+
+
+def _vectorize(counts, vocabulary):
+    """Sublinear TF x IDF, L2-normalized; returns (indices, weights) sorted by column."""
+    row = {}
+    for term, count in counts.items():
+        entry = vocabulary.get(term)
+        if entry is not None:
+            column, idf = entry
+            row[column] = (1 + math.log(count)) * idf
+    norm = math.sqrt(sum(weight * weight for weight in row.values()))
+    if not norm:
+        return [], []
+    columns = sorted(row)
+    return columns, [row[column] / norm for column in columns]
+
+
+def _matrix(rows, width):
+    """CSR matrix from [(indices, weights), ...]."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(indices) for indices, _ in rows])
+    indices = np.fromiter((i for row_indices, _ in rows for i in row_indices), dtype=np.int32, count=indptr[-1])
+    data = np.fromiter((w for _, row_weights in rows for w in row_weights), dtype=np.float32, count=indptr[-1])
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), width))
+
+
+def _top_k(block, matrix, block_positions, k=TOP_K):
+    """
+    For each row of `block`, the best k rows of `matrix` as [(position, score), ...].
+    block_positions[i] is the row of `matrix` holding block row i itself (or None).
+    """
+    scores = (block @ matrix.T).toarray()
+    for row, position in enumerate(block_positions):
+        if position is not None:
+            scores[row, position] = 0.0
+    width = scores.shape[1]
+    if width == 0:
+        return [[] for _ in block_positions]
+    kth = min(k, width) - 1
+    best = np.argpartition(-scores, kth, axis=1)[:, :kth + 1]
+    results = []
+    for row in range(scores.shape[0]):
+        candidates = sorted(best[row], key=lambda column: scores[row, column], reverse=True)
+        results.append([
+            (int(column), float(scores[row, column])) for column in candidates
+            if scores[row, column] >= MIN_SIMILARITY
+        ])
+    return results
+
+
+def _block_size(width):
+    return max(1, min(1024, CELL_BUDGET // max(width, 1)))
+
+
+def _write_lists(lists):
+    """lists: {post_id: [(similar_post_id, score), ...] best first}; replaces those posts' rows."""
+    with transaction.atomic():
+        SimilarPost.objects.filter(post_id__in=list(lists)).delete()
+        SimilarPost.objects.bulk_create([
+            SimilarPost(post_id=post_id, similar_id=similar_id, score=score, rank=rank)
+            for post_id, neighbors in lists.items()
+            for rank, (similar_id, score) in enumerate(neighbors[:TOP_K])
+        ], batch_size=1000)
+
+
+def _load_vectors():
+    post_ids, rows = [], []
+    for post_id, indices, weights in ContentVector.objects.order_by('post_id').values_list('post_id', 'indices', 'weights').iterator():
+        post_ids.append(post_id)
+        rows.append((indices, weights))
+    return post_ids, rows
+
+
+# --- Building ---------------------------------------------------------------
+
+def build():
+    """Full rebuild of vocabulary, vectors and neighbor lists. Returns the number of posts indexed."""
+    post_ids, documents = [], []
+    for post_id, title, content in Post.objects.order_by('id').values_list('id', 'title', 'content').iterator():
+        post_ids.append(post_id)
+        documents.append(_term_counts(title, content))
+
+    document_count = len(documents)
+    document_frequency = Counter(term for counts in documents for term in counts)
+    max_df = max(MIN_DF, MAX_DF_RATIO * document_count)
+    kept = [term for term, df in document_frequency.items() if MIN_DF <= df <= max_df]
+    kept.sort(key=lambda term: (-document_frequency[term], term))
+    vocabulary = {
+        term: [column, math.log((1 + document_count) / (1 + document_frequency[term])) + 1]
+        for column, term in enumerate(kept[:MAX_FEATURES])
+    }
+
+    rows = [_vectorize(counts, vocabulary) for counts in documents]
+    matrix = _matrix(rows, len(vocabulary))
+
+    lists = {}
+    size = _block_size(len(post_ids))
+    for start in range(0, len(post_ids), size):
+        positions = list(range(start, min(start + size, len(post_ids))))
+        for position, neighbors in zip(positions, _top_k(matrix[positions], matrix, positions)):
+            lists[post_ids[position]] = [(post_ids[column], score) for column, score in neighbors]
+
+    with transaction.atomic():
+        ContentIndex.objects.all().delete()
+        ContentIndex.objects.create(document_count=document_count, vocabulary=vocabulary)
+        ContentVector.objects.all().delete()
+        ContentVector.objects.bulk_create([
+            ContentVector(post_id=post_id, indices=indices, weights=weights)
+            for post_id, (indices, weights) in zip(post_ids, rows)
+        ], batch_size=1000)
+        SimilarPost.objects.all().delete()
+        _write_lists(lists)
+    return document_count
+
+
+def update():
+    """Index posts created (or edited) since the last build/update. Returns the number of posts added."""
+    index = ContentIndex.objects.order_by('-built_at').first()
+    if index is None:
+        return build()
+
+    # One transaction: a failure must not leave vectors written without their lists,
+    # or the next update() would see nothing new
+    with transaction.atomic():
+        new_posts = list(Post.objects.filter(content_vector__isnull=True).order_by('id').values_list('id', 'title', 'content'))
+        if not new_posts:
+            return 0
+        vocabulary = index.vocabulary
+        ContentVector.objects.bulk_create([
+            ContentVector(post_id=post_id, indices=indices, weights=weights)
+            for post_id, (indices, weights) in (
+                (post_id, _vectorize(_term_counts(title, content), vocabulary)) for post_id, title, content in new_posts
+            )
+        ], batch_size=1000, ignore_conflicts=True)
+
+        post_ids, rows = _load_vectors()
+        matrix = _matrix(rows, len(vocabulary))
+        position_of = {post_id: position for position, post_id in enumerate(post_ids)}
+        new_positions = [position_of[post_id] for post_id, _, _ in new_posts if post_id in position_of]
+        new_ids = {post_ids[position] for position in new_positions}
+
+        own_lists = {}
+        offers = defaultdict(list)  # existing post -> [(new post, score)]
+        size = _block_size(len(post_ids))
+        for start in range(0, len(new_positions), size):
+            positions = new_positions[start:start + size]
+            for position, neighbors in zip(positions, _top_k(matrix[positions], matrix, positions, k=MERGE_CANDIDATES)):
+                post_id = post_ids[position]
+                own_lists[post_id] = [(post_ids[column], score) for column, score in neighbors[:TOP_K]]
+                for column, score in neighbors:
+                    if post_ids[column] not in new_ids:
+                        offers[post_ids[column]].append((post_id, score))
+
+        # Lists that hold an edited post carry its old score: drop it there, the offers re-add it with the new one
+        touched = set(offers) | set(
+            SimilarPost.objects.filter(similar_id__in=new_ids).exclude(post_id__in=new_ids).values_list('post_id', flat=True)
+        )
+        merged = defaultdict(list)
+        for post_id, similar_id, score in SimilarPost.objects.filter(post_id__in=list(touched)).values_list('post_id', 'similar_id', 'score'):
+            merged[post_id].append((similar_id, score))
+        changed = {}
+        for post_id in touched:
+            current = merged[post_id]
+            kept = [(similar_id, score) for similar_id, score in current if similar_id not in new_ids]
+            combined = sorted(kept + offers[post_id], key=lambda item: item[1], reverse=True)[:TOP_K]
+            if combined != sorted(current, key=lambda item: item[1], reverse=True)[:TOP_K]:
+                changed[post_id] = combined
+
+        _write_lists({**own_lists, **changed})
+    return len(new_positions)
+
+
+def post_edited(post_id):
+    """Drop an edited post's vector, so the next update() re-indexes its new title and body."""
+    ContentVector.objects.filter(post_id=post_id).delete()
+
+
+# --- Reading ----------------------------------------------------------------
+
+def _posts_in_order(post_ids):
+    posts = Post.objects.select_related('author', 'community', 'language').prefetch_related('tags').in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def similar_posts(post_id, limit=DEFAULT_LIMIT):
+    similar_ids = list(
+        SimilarPost.objects.filter(post_id=post_id).order_by('rank').values_list('similar_id', flat=True)[:limit]
+    )
+    return _posts_in_order(similar_ids)
+
+
+def similar_post_ids(post_id, limit=TOP_K):
+    return list(SimilarPost.objects.filter(post_id=post_id).order_by('rank').values_list('similar_id', flat=True)[:limit])
+
+
+def recommended_for(user, limit=DEFAULT_LIMIT):
+    """
+    "You might like": neighbors of the posts the user recently bookmarked or
+    upvoted, ranked by summed similarity, excluding the seeds and the user's own posts.
+    """
+    seeds = set(Bookmark.objects.filter(user=user).order_by('-created_at').values_list('post_id', flat=True)[:SEED_LIMIT])
+    seeds.update(Vote.objects.filter(user=user, is_upvote=True).order_by('-created_at').values_list('post_id', flat=True)[:SEED_LIMIT])
+    if not seeds:
+        return []
+    ranked = SimilarPost.objects.filter(post_id__in=seeds).exclude(similar_id__in=seeds).exclude(
+        similar__author=user
+    ).values('similar_id').annotate(total=Sum('score')).order_by('-total', '-similar_id')[:limit]
+    return _posts_in_order([row['similar_id'] for row in ranked])
@@ -0,0 +1,194 @@
+"""
+Related-posts index.
+
+Every post keeps its TOP_K nearest neighbors in RelatedPost, so the
+related_posts endpoint is one indexed range read. Similarity is
+IDF-weighted Jaccard over tags:
+- each shared tag counts by log(1 + N / df), so rare tags matter more
+  than "python"
+- LANGUAGE_BONUS is added for the same programming language
+- COMMUNITY_BONUS is added for the same community
+
+Candidates come from the tag, language and community posting lists, each
+capped to its most recent entries, so one hot tag cannot make a refresh
+scan the whole table.
+
+The index is refreshed incrementally, never in the request. When a post
+is created or its tags, language or community change, it is queued once
+the request commits, and the `refresh_related_cascade` scheduler job
+recomputes its list. The job then also recomputes the lists of the posts
+that listed it and of its new neighbors (similarity is nearly symmetric,
+so those are the lists it most likely entered; at most CASCADE_LIMIT of
+each). Deleting a post queues the lists it leaves. The
+rebuild_related_posts command recomputes everything. Each run counts the
+posts (for the IDF weights) once, not once per list.
+
+The queue is a journal in the cache addressed by an atomic sequence
+number. Each job run applies the entries that existed at the previous run,
+so an entry whose number was taken but whose value is not written yet is
+never skipped.
+"""
+import math
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Post, RelatedPost
+
+TOP_K = 10
+DEFAULT_LIMIT = 5
+CANDIDATES_PER_LIST = 300
+CASCADE_LIMIT = 50
+LANGUAGE_BONUS = 0.15
+COMMUNITY_BONUS = 0.1
+
+CASCADE_PREFIX = 'related:cascade'
+CASCADE_SEQ_KEY = f'{CASCADE_PREFIX}:seq'
+CASCADE_READY_KEY = f'{CASCADE_PREFIX}:ready'
+CASCADE_DONE_KEY = f'{CASCADE_PREFIX}:done'
+CASCADE_TTL = 60 * 60 * 24
+
+PostTag = Post.tags.through
+
+
+def _candidate_ids(post_id, tag_ids, language_id, community_id):
+    candidates = set()
+    for tag_id in tag_ids:
+        candidates.update(
+            PostTag.objects.filter(tag_id=tag_id).exclude(post_id=post_id)
+            .order_by('-post_id').values_list('post_id', flat=True)[:CANDIDATES_PER_LIST]
+        )
+    for field, value in (('language_id', language_id), ('community_id', community_id)):
+        if value is not None:
+            candidates.update(
+                Post.objects.filter(**{field: value}).exclude(id=post_id)
+                .order_by('-id').values_list('id', flat=True)[:CANDIDATES_PER_LIST]
+            )
+    return candidates
+
+
+def neighbors(post_id, k=TOP_K, total_posts=None):
+    """[(related_post_id, score), ...] best first, computed from the live tables."""
+    post = Post.objects.filter(id=post_id).values('language_id', 'community_id').first()
+    if post is None:
+        return []
+    tag_ids = set(PostTag.objects.filter(post_id=post_id).values_list('tag_id', flat=True))
+    candidates = _candidate_ids(post_id, tag_ids, post['language_id'], post['community_id'])
+    if not candidates:
+        return []
+
+    candidate_tags = defaultdict(set)
+    for candidate_id, tag_id in PostTag.objects.filter(post_id__in=candidates).values_list('post_id', 'tag_id'):
+        candidate_tags[candidate_id].add(tag_id)
+
+    all_tags = tag_ids.union(*candidate_tags.values())
+    total_posts = total_posts or Post.objects.count()
+    document_frequency = dict(
+        PostTag.objects.filter(tag_id__in=all_tags).values('tag_id').annotate(n=Count('id')).values_list('tag_id', 'n')
+    )
+    weight = {tag_id: math.log(1 + total_posts / document_frequency.get(tag_id, 1)) for tag_id in all_tags}
+
+    scored = []
+    meta = Post.objects.filter(id__in=candidates).values_list('id', 'language_id', 'community_id')
+    for candidate_id, language_id, community_id in meta:
+        other_tags = candidate_tags.get(candidate_id, set())
+        union = sum(weight[tag_id] for tag_id in tag_ids | other_tags)
+        score = sum(weight[tag_id] for tag_id in tag_ids & other_tags) / union if union else 0.0
+        if post['language_id'] is not None and language_id == post['language_id']:
+            score += LANGUAGE_BONUS
+        if post['community_id'] is not None and community_id == post['community_id']:
+            score += COMMUNITY_BONUS
+        if score > 0:
+            scored.append((candidate_id, score))
+
+    # Newer posts win ties
+    scored.sort(key=lambda item: (item[1], item[0]), reverse=True)
+    return scored[:k]
+
+
+def refresh(post_id, total_posts=None):
+    """Recompute one post's stored neighbor list; returns the new related ids."""
+    top = neighbors(post_id, total_posts=total_posts)
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id=post_id).delete()
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+            for rank, (related_id, score) in enumerate(top)
+        ])
+    return [related_id for related_id, _ in top]
+
+
+def _cascade_key(seq):
+    return f'{CASCADE_PREFIX}:{seq}'
+
+
+def _queue_cascade(changed_ids=(), post_ids=()):
+    """Journal entry: posts whose similarity inputs changed, and posts whose lists only need a refresh."""
+    if not changed_ids and not post_ids:
+        return
+    cache.add(CASCADE_SEQ_KEY, 0, None)
+    cache.set(_cascade_key(cache.incr(CASCADE_SEQ_KEY)), (list(changed_ids), list(post_ids)[:CASCADE_LIMIT]), CASCADE_TTL)
+
+
+def post_changed(post_id):
+    """
+    Call when a post is created or its tags, language or community change.
+    After commit it is queued for refresh_cascade(), which recomputes its list
+    and the lists it entered or left.
+    """
+    transaction.on_commit(lambda: _queue_cascade(changed_ids=[post_id]))
+
+
+def post_removed(post_id):
+    """Call before deleting a post: the lists that contained it are queued for refresh after commit."""
+    listed_in = list(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True)[:CASCADE_LIMIT])
+    transaction.on_commit(lambda: _queue_cascade(post_ids=listed_in))
+
+
+def refresh_cascade():
+    """Refresh the lists queued by post_changed / post_removed (scheduler job). Returns the number refreshed."""
+    done = cache.get(CASCADE_DONE_KEY) or 0
+    ready = cache.get(CASCADE_READY_KEY) or 0
+    keys = [_cascade_key(seq) for seq in range(done + 1, ready + 1)]
+    changed_ids, post_ids = set(), set()
+    for queued in cache.get_many(keys).values():
+        if isinstance(queued, list):  # entry queued before changed posts were journaled
+            queued = ([], queued)
+        changed_ids.update(queued[0])
+        post_ids.update(queued[1])
+
+    total_posts = Post.objects.count()
+    changed = list(Post.objects.filter(id__in=changed_ids).order_by('id').values_list('id', flat=True))
+    for post_id in changed:
+        post_ids.update(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True)[:CASCADE_LIMIT])
+        post_ids.update(refresh(post_id, total_posts))
+    post_ids.difference_update(changed)
+    existing = Post.objects.filter(id__in=post_ids).order_by('id').values_list('id', flat=True)
+    refreshed = len(changed) + rebuild(list(existing), total_posts)
+
+    cache.set(CASCADE_DONE_KEY, max(done, ready), None)
+    cache.delete_many(keys)
+    cache.set(CASCADE_READY_KEY, cache.get(CASCADE_SEQ_KEY) or 0, None)
+    return refreshed
+
+
+def related_posts(post_id, limit=DEFAULT_LIMIT):
+    """The stored neighbors, best first, as Post instances ready for PostSerializer."""
+    rows = RelatedPost.objects.filter(post_id=post_id).order_by('rank').select_related(
+        'related__author', 'related__community', 'related__language'
+    ).prefetch_related('related__tags')[:limit]
+    return [row.related for row in rows]
+
+
+def rebuild(post_ids=None, total_posts=None):
+    """Recompute the lists of `post_ids` (every post if None). Returns the number of posts refreshed."""
+    if post_ids is None:
+        post_ids = Post.objects.order_by('id').values_list('id', flat=True).iterator()
+    total_posts = total_posts or Post.objects.count()
+    refreshed = 0
+    for post_id in post_ids:
+        refresh(post_id, total_posts)
+        refreshed += 1
+    return refreshed
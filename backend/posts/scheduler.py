@@ -0,0 +1,290 @@
+"""
+In-process scheduler for maintenance jobs: `python manage.py run_scheduler`.
+
+Jobs are registered in <app>/jobs.py modules, either as a function or as
+an existing management command:
+
+    scheduler.register_command('update_helpers', '5 0 * * *')
+
+    @scheduler.register('flush_votes', '* * * * *')
+    def flush_votes(): ...
+
+Schedules are five-field cron expressions (minute hour day-of-month month
+day-of-week, in settings.TIME_ZONE) or @hourly / @daily / @weekly.
+settings.SCHEDULER_JOBS = {'name': '<cron>' or None} overrides a schedule
+or disables a job without touching code.
+
+Several workers can run the command; coordination goes through the shared
+cache (Redis):
+- leader lock: only the worker holding LEADER_KEY dispatches jobs. The
+  lock is renewed every tick, and a standby takes over within LEADER_TTL
+  after the leader dies.
+- slot claim: each (job, minute) is claimed once, so a leader change never
+  runs the same slot twice.
+- job lock: a job still running (here or on another node) is skipped
+  instead of overlapping; the lock expires after the job's timeout.
+Each job's runs, failures, skips and durations are kept in the cache and
+returned by metrics().
+"""
+import io
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'scheduler'
+LEADER_KEY = f'{PREFIX}:leader'
+LEADER_TTL = 90  # seconds; the leader renews every tick (once a minute)
+SLOT_TTL = 60 * 60 * 24
+DEFAULT_TIMEOUT = 10 * 60  # seconds a job may hold its lock
+DEFAULT_WORKERS = 4
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+}
+
+
+class CronSchedule:
+    """minute hour day-of-month month day-of-week; day-of-week 0 (or 7) is Sunday."""
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    MONTH_DAYS = {1: 31, 2: 29, 3: 31, 4: 30, 5: 31, 6: 30, 7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31}
+
+    def __init__(self, expression):
+        self.expression = ALIASES.get(expression, expression)
+        fields = self.expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression needs 5 fields: {expression!r}')
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.BOUNDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+        # Only day-of-month alone can rule out every date, e.g. '0 0 30 2 *'
+        if not self.any_day and self.any_weekday and not any(
+            min(self.days) <= self.MONTH_DAYS[month] for month in self.months
+        ):
+            raise ValueError(f'Cron expression never matches: {expression!r}')
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            spec, _, step = part.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(value) for value in spec.split('-', 1))
+            else:
+                start = int(spec)
+                end = high if step else start
+            if not (low <= start <= end <= high):
+                raise ValueError(f'Cron field {field!r} is outside {low}-{high}')
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _date_matches(self, moment):
+        if moment.month not in self.months:
+            return False
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        # Cron rule: when both day fields are restricted, either one may match
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def matches(self, moment):
+        return moment.minute in self.minutes and moment.hour in self.hours and self._date_matches(moment)
+
+    def next_after(self, moment, horizon_days=4 * 366):
+        """
+        The first matching minute after `moment`, skipping whole days and hours
+        that cannot match, so a yearly schedule costs a few hundred steps.
+        A leap-day schedule is found within the default horizon.
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=horizon_days)
+        while candidate < limit:
+            if not self._date_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        return None
+
+
+class Job:
+    def __init__(self, name, schedule, func, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.schedule = CronSchedule(schedule)
+        self.func = func
+        self.timeout = timeout
+
+
+REGISTRY = {}
+
+
+def register(name, schedule, timeout=DEFAULT_TIMEOUT):
+    """Decorator: run the function on `schedule`. Its return value is recorded as the last result."""
+    def decorator(func):
+        REGISTRY[name] = Job(name, schedule, func, timeout)
+        return func
+    return decorator
+
+
+def register_command(name, schedule, *args, command=None, timeout=DEFAULT_TIMEOUT, **options):
+    """Run `manage.py <command or name> *args` on `schedule`; its output becomes the job result."""
+    def run():
+        output = io.StringIO()
+        call_command(command or name, *args, stdout=output, **options)
+        return output.getvalue().strip()
+    register(name, schedule, timeout)(run)
+
+
+def load_jobs():
+    """Import every installed app's jobs module, then apply settings.SCHEDULER_JOBS."""
+    autodiscover_modules('jobs')
+    for name, schedule in getattr(settings, 'SCHEDULER_JOBS', {}).items():
+        if schedule is None:
+            REGISTRY.pop(name, None)
+        elif name in REGISTRY:
+            REGISTRY[name].schedule = CronSchedule(schedule)
+    return REGISTRY
+
+
+# --- Running ----------------------------------------------------------------
+
+def node_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _metrics_key(name):
+    return f'{PREFIX}:metrics:{name}'
+
+
+def _record(name, **changes):
+    state = cache.get(_metrics_key(name)) or {'runs': 0, 'failures': 0, 'skipped': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+    for field in ('runs', 'failures', 'skipped'):
+        state[field] += changes.pop(field, 0)
+    seconds = changes.get('last_seconds')
+    if seconds is not None:
+        state['total_seconds'] = round(state['total_seconds'] + seconds, 4)
+        state['max_seconds'] = max(state['max_seconds'], seconds)
+    state.update(changes)
+    cache.set(_metrics_key(name), state, None)
+
+
+def run_job(job, slot=None):
+    """
+    Run one job under its lock. With a slot (the scheduled minute), the slot
+    is claimed first so no node runs it twice. Returns 'ok', 'failed',
+    'overlap' or 'claimed'.
+    """
+    if slot is not None and not cache.add(f'{PREFIX}:slot:{job.name}:{slot:%Y%m%d%H%M}', 1, SLOT_TTL):
+        return 'claimed'
+    lock_key = f'{PREFIX}:lock:{job.name}'
+    token = f'{node_id()}:{threading.get_ident()}:{time.monotonic()}'
+    if not cache.add(lock_key, token, job.timeout):
+        logger.warning('Scheduler: %s is still running, skipping this run', job.name)
+        _record(job.name, skipped=1, last_skipped_at=timezone.now().isoformat())
+        return 'overlap'
+
+    started_at = timezone.now()
+    started = time.monotonic()
+    try:
+        result = job.func()
+    except Exception as exc:
+        seconds = round(time.monotonic() - started, 4)
+        logger.exception('Scheduler: %s failed after %.2fs', job.name, seconds)
+        _record(job.name, runs=1, failures=1, last_status='failed', last_error=repr(exc),
+                last_started_at=started_at.isoformat(), last_seconds=seconds)
+        return 'failed'
+    else:
+        seconds = round(time.monotonic() - started, 4)
+        logger.info('Scheduler: %s finished in %.2fs: %s', job.name, seconds, result)
+        _record(job.name, runs=1, last_status='ok', last_result=None if result is None else str(result)[:500],
+                last_started_at=started_at.isoformat(), last_success_at=timezone.now().isoformat(), last_seconds=seconds)
+        return 'ok'
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+        close_old_connections()
+
+
+def is_leader(node):
+    if cache.add(LEADER_KEY, node, LEADER_TTL):
+        return True
+    if cache.get(LEADER_KEY) == node:
+        cache.touch(LEADER_KEY, LEADER_TTL)
+        return True
+    return False
+
+
+def due(moment):
+    local = timezone.localtime(moment)
+    return [job for job in REGISTRY.values() if job.schedule.matches(local)]
+
+
+def tick(moment, submit, node):
+    """Dispatch the jobs due at `moment` (a whole minute) if this node leads. Returns the jobs submitted."""
+    if not is_leader(node):
+        return []
+    jobs = due(moment)
+    for job in jobs:
+        submit(job, moment)
+    return jobs
+
+
+def run_forever(workers=DEFAULT_WORKERS, stop=None):
+    """Tick at the top of every minute until `stop` (a threading.Event) is set."""
+    stop = stop or threading.Event()
+    node = node_id()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scheduler') as executor:
+        def submit(job, moment):
+            executor.submit(run_job, job, moment)
+
+        next_minute = timezone.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        while not stop.is_set():
+            if stop.wait(max(0.0, (next_minute - timezone.now()).total_seconds())):
+                break
+            jobs = tick(next_minute, submit, node)
+            if jobs:
+                logger.info('Scheduler: dispatched %s', ', '.join(job.name for job in jobs))
+            next_minute += timedelta(minutes=1)
+            # After a long pause (suspend, clock jump) resume from now instead of replaying every missed minute
+            now = timezone.now()
+            if next_minute < now - timedelta(minutes=1):
+                next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+
+def metrics():
+    """Schedule, next run and run statistics of every registered job, plus the current leader."""
+    now = timezone.localtime()
+    states = cache.get_many([_metrics_key(name) for name in REGISTRY])
+    jobs = {}
+    for name, job in sorted(REGISTRY.items()):
+        next_run = job.schedule.next_after(now)
+        jobs[name] = {
+            'schedule': job.schedule.expression,
+            'timeout_seconds': job.timeout,
+            'next_run_at': next_run.isoformat() if next_run else None,
+            **(states.get(_metrics_key(name)) or {'runs': 0, 'failures': 0, 'skipped': 0}),
+        }
+    return {'leader': cache.get(LEADER_KEY), 'jobs': jobs}
@@ -0,0 +1,233 @@
+"""
+Bulk data seeding for load tests: seed_load_data, generate_dummy_posts,
+populate_comments and auto_vote_posts.
+
+Rows are generated in chunks of batch_size and written with bulk_create,
+one transaction per chunk. Post tags go straight into the Post.tags
+through table, so seeding millions of rows is bound by insert throughput
+instead of per-row round trips.
+
+Content is generated in a forked multiprocessing pool. Workers prepare the
+next chunks while the main process inserts the current one. Each chunk
+draws from its own Random seeded by (seed, kind, chunk index), so a given
+--seed produces the same rows whatever the worker count.
+
+bulk_create skips signals and the vote/counter code paths. Call finish()
+afterwards to recompute the vote counters, tag/community counters and
+trending buckets.
+"""
+import argparse
+import multiprocessing
+import random
+import re
+
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.utils.text import slugify
+
+from . import counters, trending, votes
+from .models import Comment, Post, Profile, Tag, Vote
+
+DEFAULT_BATCH_SIZE = 5000
+SEED_PASSWORD = '!seeded'  # an unusable password hash: seeded users cannot log in
+SIZE_SUFFIXES = {'': 1, 'k': 1_000, 'm': 1_000_000, 'b': 1_000_000_000}
+
+PostTag = Post.tags.through
+
+
+def parse_size(value):
+    """argparse type: '100k' -> 100000, '1.5M' -> 1500000, '20000' -> 20000."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([kmb]?)', str(value).strip().lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f'invalid size {value!r} (examples: 5000, 100k, 1M)')
+    number, suffix = match.groups()
+    return int(float(number) * SIZE_SUFFIXES[suffix])
+
+
+def default_workers():
+    return max(1, (multiprocessing.cpu_count() or 2) - 1)
+
+
+def reporter(write, steps=10):
+    """progress callback for the seed_* functions: writes a line every 1/steps of each total."""
+    reported = {}
+
+    def progress(kind, done, total):
+        step = done * steps // max(total, 1)
+        if step > reported.get(kind, 0) or done == total:
+            reported[kind] = step
+            write(f'  {kind}: {done:,}/{total:,}')
+    return progress
+
+
+# --- Generation (runs in the worker processes) -------------------------------
+
+_state = {}
+
+
+def _init_worker(state):
+    _state.clear()
+    _state.update(state)
+
+
+def _rng(spec):
+    seed, kind, index, _ = spec
+    return random.Random(f'{seed}:{kind}:{index}')
+
+
+def _post_rows(spec):
+    rng = _rng(spec)
+    snippets, author_ids, community_ids = _state['snippets'], _state['author_ids'], _state['community_ids']
+    rows = []
+    for _ in range(spec[3]):
+        language, title, description, code, tag_id = rng.choice(snippets)
+        rows.append((
+            title,
+            f"{description}\n\n```{language}\n{code}\n```",
+            rng.choice(author_ids),
+            rng.choice(community_ids) if community_ids else None,
+            tag_id,
+        ))
+    return rows
+
+
+def _comment_rows(spec):
+    from faker import Faker
+
+    rng = _rng(spec)
+    fake = Faker()
+    fake.seed_instance(rng.getrandbits(32))
+    post_ids, author_ids = _state['post_ids'], _state['author_ids']
+    return [
+        (rng.choice(post_ids), rng.choice(author_ids), fake.sentence(nb_words=rng.randint(5, 20)))
+        for _ in range(spec[3])
+    ]
+
+
+def _vote_rows(spec):
+    rng = _rng(spec)
+    post_ids, user_ids, direction = _state['post_ids'], _state['user_ids'], _state['direction']
+    pairs = {}
+    for _ in range(spec[3]):
+        is_upvote = rng.random() < 0.5 if direction == 'random' else direction == 'up'
+        pairs[(rng.choice(user_ids), rng.choice(post_ids))] = is_upvote
+    return [(user_id, post_id, is_upvote) for (user_id, post_id), is_upvote in pairs.items()]
+
+
+def _generate(func, kind, total, batch_size, seed, workers, state):
+    """Yield func's rows chunk by chunk, in order; generated ahead by `workers` processes."""
+    specs = [(seed, kind, index, min(batch_size, total - start)) for index, start in enumerate(range(0, total, batch_size))]
+    try:
+        context = multiprocessing.get_context('fork') if workers > 1 and len(specs) > 1 else None
+    except ValueError:  # no fork on this platform
+        context = None
+    if context is None:
+        _init_worker(state)
+        yield from map(func, specs)
+        return
+    # Children must not inherit live database sockets
+    connections.close_all()
+    with context.Pool(workers, initializer=_init_worker, initargs=(state,)) as pool:
+        yield from pool.imap(func, specs)
+
+
+# --- Inserting ----------------------------------------------------------------
+
+def language_tags(languages):
+    """{language: Tag} for the code-snippet languages, creating missing tags."""
+    tags = {}
+    for language in languages:
+        name = language.upper() if language in ('php', 'css', 'sql') else language.capitalize()
+        tags[language], _ = Tag.objects.get_or_create(slug=slugify(name), defaults={'name': name})
+    return tags
+
+
+def seed_users(count, seed=0, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Create `count` users (and their profiles) named seed<seed>_<n>. Returns the number created."""
+    prefix = f'seed{seed}_'
+    start = User.objects.filter(username__startswith=prefix).count()
+    created = 0
+    for offset in range(0, count, batch_size):
+        numbers = range(start + offset, start + min(offset + batch_size, count))
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}{number}', email=f'{prefix}{number}@example.com', password=SEED_PASSWORD)
+                for number in numbers
+            ])
+            Profile.objects.bulk_create([Profile(user_id=user.pk) for user in users], ignore_conflicts=True)
+        created += len(users)
+        if progress:
+            progress('users', created, count)
+    return created
+
+
+def seed_posts(count, snippets, author_ids, community_ids, seed=0, batch_size=DEFAULT_BATCH_SIZE,
+               workers=1, progress=None):
+    """
+    snippets: [(language, title, description, code, tag_id), ...] to draw from.
+    Each post gets one snippet and its language tag. Returns the number created.
+    """
+    state = {'snippets': snippets, 'author_ids': author_ids, 'community_ids': community_ids}
+    created = 0
+    for rows in _generate(_post_rows, 'posts', count, batch_size, seed, workers, state):
+        with transaction.atomic():
+            posts = Post.objects.bulk_create([
+                Post(title=title, content=content, author_id=author_id, community_id=community_id)
+                for title, content, author_id, community_id, _ in rows
+            ])
+            PostTag.objects.bulk_create([
+                PostTag(post_id=post.pk, tag_id=row[4]) for post, row in zip(posts, rows)
+            ])
+        created += len(posts)
+        if progress:
+            progress('posts', created, count)
+    return created
+
+
+def seed_comments(count, post_ids, author_ids, seed=0, batch_size=DEFAULT_BATCH_SIZE, workers=1, progress=None):
+    """Random comments (Faker sentences) on random posts. Returns the number created."""
+    state = {'post_ids': post_ids, 'author_ids': author_ids}
+    created = 0
+    for rows in _generate(_comment_rows, 'comments', count, batch_size, seed, workers, state):
+        with transaction.atomic():
+            Comment.objects.bulk_create([
+                Comment(post_id=post_id, author_id=author_id, text=text) for post_id, author_id, text in rows
+            ])
+        created += len(rows)
+        if progress:
+            progress('comments', created, count)
+    return created
+
+
+def seed_votes(count, post_ids, user_ids, direction='random', seed=0, batch_size=DEFAULT_BATCH_SIZE,
+               workers=1, progress=None):
+    """
+    Up to `count` votes on random (user, post) pairs; pairs already voted on
+    are skipped, existing votes are left alone. Returns the number of pairs attempted.
+    """
+    state = {'post_ids': post_ids, 'user_ids': user_ids, 'direction': direction}
+    attempted = requested = 0
+    for rows in _generate(_vote_rows, 'votes', count, batch_size, seed, workers, state):
+        with transaction.atomic():
+            Vote.objects.bulk_create([
+                Vote(user_id=user_id, post_id=post_id, is_upvote=is_upvote, value=1 if is_upvote else -1)
+                for user_id, post_id, is_upvote in rows
+            ], ignore_conflicts=True)
+        attempted += len(rows)
+        requested = min(requested + batch_size, count)
+        if progress:
+            progress('votes', requested, count)
+    return attempted
+
+
+def finish(vote_counters=True, taxonomy=True, activity=True):
+    """Recompute what bulk_create skipped. Returns a summary dict."""
+    summary = {}
+    if vote_counters:
+        summary['posts_recounted'] = votes.reconcile()
+    if taxonomy:
+        summary['tags_recounted'], summary['communities_recounted'] = counters.rebuild()
+    if activity:
+        summary['activity_buckets'] = trending.rebuild_buckets()
+        trending.compute()
+    return summary
@@ -1,8 +1,10 @@
 # serializers.py - CLEANED VERSION
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Community, Tag, Post, Vote, Comment, Profile, Follow, Notification, BotSession, Language,Conversation, ChatMessage, LoggedBug, WeeklyChallenge,ChallengeSubmission, Bookmark
+from .models import Community, Tag, Post, Vote, Comment, Profile, Follow, Notification, BotSession, Language,Conversation, ChatMessage, LoggedBug, WeeklyChallenge,ChallengeSubmission, Bookmark, LeaderboardEntry
+from django.db.models import Count, Q
 from django.utils.text import slugify
+from . import vote_buffer
 
 class BotSessionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -71,34 +73,58 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'conversation', 'sender', 'text', 'created_at']
 
 
+class ChatMessageCompactSerializer(serializers.ModelSerializer):
+    """Chat history item: `sender` is a user id, resolved through the side-loaded `users` map."""
+
+    class Meta:
+        model = ChatMessage
+        fields = ['id', 'sender', 'text', 'created_at']
+
+
 class ConversationSerializer(serializers.ModelSerializer):
     """Serializer for a conversation, including participants and the last message."""
     participants = UserBasicSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Conversation
-        fields = ['id', 'participants', 'created_at', 'updated_at', 'last_message']
+        fields = ['id', 'participants', 'created_at', 'updated_at', 'last_message', 'unread_count']
 
     def get_last_message(self, obj):
-        """Get the last message sent in the conversation."""
-        last_msg = obj.messages.order_by('-created_at').first()
-        if last_msg:
-            return ChatMessageSerializer(last_msg).data
-        return None
+        """
+        Built from the denormalized last_message_* columns (no per-row query).
+        Same shape as ChatMessageSerializer; `text` is a preview of up to 255 chars.
+        """
+        if not obj.last_message_id:
+            return None
+        sender = obj.last_message_sender
+        return {
+            'id': str(obj.last_message_id),
+            'conversation': str(obj.id),
+            'sender': UserBasicSerializer(sender).data if sender else None,
+            'text': obj.last_message_text,
+            'created_at': serializers.DateTimeField().to_representation(obj.last_message_at),
+        }
+
+    def get_unread_count(self, obj):
+        """Read from the user's ConversationReadState (prefetched as `my_read_states` by the list view)."""
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return 0
+        states = getattr(obj, 'my_read_states', None)
+        if states is None:
+            states = obj.read_states.filter(user=request.user)
+        return states[0].unread_count if states else 0
 
 class CommunitySerializer(serializers.ModelSerializer):
     """Serializer cho Community model"""
     owner = UserBasicSerializer(read_only=True)
-    posts_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Community
-        fields = ['id', 'name', 'slug', 'description', 'owner', 'created_at', 'posts_count']
-        read_only_fields = ['id', 'slug', 'created_at']
-    
-    def get_posts_count(self, obj):
-        return obj.post_set.count()
+        fields = ['id', 'name', 'slug', 'description', 'owner', 'created_at', 'posts_count', 'members_count', 'last_activity_at']
+        read_only_fields = ['id', 'slug', 'created_at', 'posts_count', 'members_count', 'last_activity_at']
 
 
 class CommunityBasicSerializer(serializers.ModelSerializer):
@@ -125,15 +151,11 @@ class LanguageBasicSerializer(serializers.ModelSerializer):
 
 class TagSerializer(serializers.ModelSerializer):
     """Serializer cho Tag model"""
-    posts_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Tag
-        fields = ['id', 'name', 'slug', 'color', 'created_at', 'posts_count']
-        read_only_fields = ['id', 'slug', 'created_at']
-    
-    def get_posts_count(self, obj):
-        return obj.posts_count()
+        fields = ['id', 'name', 'slug', 'color', 'created_at', 'posts_count', 'members_count', 'last_activity_at']
+        read_only_fields = ['id', 'slug', 'created_at', 'posts_count', 'members_count', 'last_activity_at']
 
 
 class TagBasicSerializer(serializers.ModelSerializer):
@@ -173,13 +195,13 @@ class PostSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     language = LanguageBasicSerializer(read_only=True) # MODIFIED: Added language field
     
-    calculated_score = serializers.IntegerField(source='score', read_only=True)
+    calculated_score = serializers.SerializerMethodField()
     comment_count = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
     user_vote = serializers.SerializerMethodField()
     
-    is_bot_reviewed = serializers.BooleanField(read_only=True)
-    bot_reviews_count = serializers.IntegerField(read_only=True)
+    is_bot_reviewed = serializers.SerializerMethodField()
+    bot_reviews_count = serializers.SerializerMethodField()
     latest_bot_review_date = serializers.SerializerMethodField()
     bot_review_summary = serializers.SerializerMethodField()
     is_bookmarked = serializers.SerializerMethodField()
@@ -206,25 +228,87 @@ class PostSerializer(serializers.ModelSerializer):
         return None
     
     def get_comment_count(self, post):
-        return post.comment_count
+        return self._page_data(post)['comments']
     
+    def _page_post_ids(self, post):
+        """Id của cả trang khi serialize many=True, để đọc vote buffer một lần cho cả trang."""
+        if isinstance(self.parent, serializers.ListSerializer) and self.parent.instance is not None:
+            return [item.id for item in self.parent.instance]
+        return [post.id]
+
+    def _page_data(self, post):
+        """
+        Số comment, bot review, vote và bookmark của user cho cả trang, đọc một
+        lần với số query cố định thay vì vài query cho mỗi bài (N+1).
+        """
+        page_data = getattr(self, '_page_rows', {})
+        if post.id not in page_data:
+            page_ids = list(dict.fromkeys(self._page_post_ids(post) + [post.id]))
+            page_data = {
+                post_id: {'comments': 0, 'bot_reviews': 0, 'latest_bot_review': None, 'vote': None, 'bookmarked': False}
+                for post_id in page_ids
+            }
+            comment_counts = Comment.objects.filter(post_id__in=page_ids).values('post_id').annotate(
+                total=Count('id'), bots=Count('id', filter=Q(is_bot=True))
+            ).order_by()
+            for row in comment_counts:
+                page_data[row['post_id']].update(comments=row['total'], bot_reviews=row['bots'])
+            reviewed_ids = [post_id for post_id, row in page_data.items() if row['bot_reviews']]
+            if reviewed_ids:
+                bot_reviews = Comment.objects.filter(post_id__in=reviewed_ids, is_bot=True).order_by('post_id', '-created')
+                for review in bot_reviews.only('id', 'post_id', 'created', 'text'):
+                    if page_data[review.post_id]['latest_bot_review'] is None:
+                        page_data[review.post_id]['latest_bot_review'] = review
+            request = self.context.get('request')
+            if request and request.user.is_authenticated:
+                user_votes = Vote.objects.filter(user=request.user, post_id__in=page_ids).values_list('post_id', 'is_upvote')
+                for post_id, is_upvote in user_votes:
+                    page_data[post_id]['vote'] = 'up' if is_upvote else 'down'
+                for post_id in Bookmark.objects.filter(user=request.user, post_id__in=page_ids).values_list('post_id', flat=True):
+                    page_data[post_id]['bookmarked'] = True
+            self._page_rows = page_data
+        return page_data[post.id]
+
+    def get_is_bot_reviewed(self, post):
+        return self._page_data(post)['bot_reviews'] > 0
+
+    def get_bot_reviews_count(self, post):
+        return self._page_data(post)['bot_reviews']
+
+    def get_calculated_score(self, post):
+        """Điểm lưu sẵn + phần vote còn nằm trong buffer write-behind (nếu bật)."""
+        if not vote_buffer.enabled():
+            return post.score
+        if post.id not in getattr(self, '_buffered_deltas', {}):
+            page_ids = self._page_post_ids(post)
+            deltas = vote_buffer.buffered_deltas(page_ids)
+            self._buffered_deltas = {post_id: deltas.get(post_id, (0, 0)) for post_id in page_ids + [post.id]}
+        up_delta, down_delta = self._buffered_deltas.get(post.id, (0, 0))
+        return post.score + up_delta - down_delta
+
     def get_user_vote(self, post):
         """Lấy vote của user và trả về 'up', 'down', hoặc null."""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            vote = post.votes.filter(user=request.user).first()
-            if vote:
-                return 'up' if vote.is_upvote else 'down'
+            if vote_buffer.enabled():
+                if post.id not in getattr(self, '_pending_votes', {}):
+                    page_ids = self._page_post_ids(post)
+                    self._pending_votes = {post_id: None for post_id in page_ids}
+                    self._pending_votes.update(vote_buffer.pending_votes(page_ids, request.user.id))
+                pending = self._pending_votes.get(post.id)
+                if pending is not None:
+                    return pending or None
+            return self._page_data(post)['vote']
         return None
     
     def get_latest_bot_review_date(self, post):
         """Get the date of latest bot review"""
-        latest_review = post.latest_bot_review
+        latest_review = self._page_data(post)['latest_bot_review']
         return latest_review.created.isoformat() if latest_review else None
     
     def get_bot_review_summary(self, post):
         """Get a brief summary of bot review (first 100 chars)"""
-        latest_review = post.latest_bot_review
+        latest_review = self._page_data(post)['latest_bot_review']
         if latest_review:
             return latest_review.text[:100] + "..." if len(latest_review.text) > 100 else latest_review.text
         return None
@@ -232,7 +316,7 @@ class PostSerializer(serializers.ModelSerializer):
     def get_is_bookmarked(self, post):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return post.bookmarked_by.filter(user=request.user).exists()
+            return self._page_data(post)['bookmarked']
         return False
 
 
@@ -338,15 +422,13 @@ class PostCreateUpdateSerializer(serializers.ModelSerializer):
 class ProfileSerializer(serializers.ModelSerializer):
     """Serializer cho Profile model"""
     user = UserBasicSerializer(read_only=True)
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
     avatar_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
         fields = ['id', 'user', 'avatar', 'avatar_url', 'bio', 'followers_count', 'following_count', 'is_following', 'is_weekly_helper']
-        read_only_fields = ['id', 'user']
+        read_only_fields = ['id', 'user', 'followers_count', 'following_count']
 
     def get_avatar_url(self, obj):
         """Better avatar URL handling"""
@@ -362,12 +444,6 @@ class ProfileSerializer(serializers.ModelSerializer):
         except (ValueError, AttributeError, Exception):
             return None
 
-    def get_followers_count(self, obj):
-        return obj.user.follower_set.count()
-    
-    def get_following_count(self, obj):
-        return obj.user.following_set.count()
-
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -420,8 +496,8 @@ class NotificationSerializer(serializers.ModelSerializer):
     sender = UserBasicSerializer(read_only=True)
     
     # ✅ Lấy các ID một cách an toàn
-    post_id = serializers.IntegerField(source='post.id', read_only=True, allow_null=True)
-    submission_id = serializers.UUIDField(source='submission.id', read_only=True, allow_null=True)
+    post_id = serializers.IntegerField(read_only=True, allow_null=True)
+    submission_id = serializers.UUIDField(read_only=True, allow_null=True)
     
     # ✅ Lấy URL đã được tính toán từ model
     action_url = serializers.CharField(source='get_action_url', read_only=True)
@@ -438,6 +514,8 @@ class NotificationSerializer(serializers.ModelSerializer):
             'type', # Giữ lại 'type' cho getNotificationIcon/Text
             'post_id', 
             'submission_id', 
+            'message',
+            'actor_count', # > 1 khi nhiều sự kiện đã được gộp lại
             'is_read', 
             'created_at', 
             'action_url' # Thêm trường URL mới
@@ -446,19 +524,11 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 # Serializers thống kê
 class CommunityStatsSerializer(serializers.ModelSerializer):
-    """Serializer thống kê cho Community"""
-    posts_count = serializers.SerializerMethodField()
-    members_count = serializers.SerializerMethodField()
+    """Serializer thống kê cho Community (bộ đếm lưu sẵn, xem posts/counters.py)"""
     
     class Meta:
         model = Community
-        fields = ['id', 'name', 'slug', 'posts_count', 'members_count']
-    
-    def get_posts_count(self, obj):
-        return obj.post_set.count()
-    
-    def get_members_count(self, obj):
-        return obj.post_set.values('author').distinct().count()
+        fields = ['id', 'name', 'slug', 'posts_count', 'members_count', 'last_activity_at']
 
 
 class UserStatsSerializer(serializers.ModelSerializer):
@@ -527,6 +597,11 @@ class PasswordChangeSerializer(serializers.Serializer):
 
 class LoggedBugSerializer(serializers.ModelSerializer):
     """Serializer for logging a new bug."""
+    # Code bodies are stored once per content hash (CodeSnippet)
+    original_code = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    fixed_code = serializers.CharField(required=False, allow_null=True, allow_blank=True, trim_whitespace=False)
+    fingerprint = serializers.CharField(source='signature.fingerprint', read_only=True, default=None)
+
     class Meta:
         model = LoggedBug
         fields = [
@@ -536,12 +611,22 @@ class LoggedBugSerializer(serializers.ModelSerializer):
             'error_category',
             'original_code',
             'fixed_code', # ✅ THÊM TRƯỜNG MỚI
+            'fingerprint',
             'fix_step_count',
             'user',
             'logged_at'
         ]
         # User sẽ được lấy từ request, không cần client gửi lên
-        read_only_fields = ['user', 'logged_at', 'id', 'language']
+        read_only_fields = ['user', 'logged_at', 'id', 'language', 'error_category']
+
+
+class BugReportSerializer(serializers.Serializer):
+    """One item of a bulk bug upload. Validation only, no database access."""
+    language = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    error_message = serializers.CharField(max_length=255)
+    original_code = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    fixed_code = serializers.CharField(required=False, allow_null=True, allow_blank=True, trim_whitespace=False)
+    fix_step_count = serializers.IntegerField(min_value=1, max_value=32767, required=False, allow_null=True)
 
 
 class BugStatsSerializer(serializers.Serializer):
@@ -551,6 +636,7 @@ class BugStatsSerializer(serializers.Serializer):
     """
     category = serializers.CharField()
     message = serializers.CharField()
+    fingerprint = serializers.CharField()
     count = serializers.IntegerField()
     language = serializers.CharField()
 
@@ -595,5 +681,23 @@ class ChallengeSubmissionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'challenge', 'challenge_details', 'user', 
             'submitted_code', 'language', 'submitted_at', 
-            'status', 'feedback'
-        ]
\ No newline at end of file
+            'status', 'feedback', 'runtime_ms'
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # runtime_ms là tiêu chí phụ của leaderboard: chỉ reviewer (staff) được ghi
+        request = self.context.get('request')
+        if not (request and request.user.is_staff):
+            fields['runtime_ms'].read_only = True
+        return fields
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """Serializer for a materialized leaderboard row."""
+    user = UserBasicSerializer(read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'user', 'submission', 'approved_count', 'runtime_ms', 'achieved_at']
+        read_only_fields = fields
\ No newline at end of file
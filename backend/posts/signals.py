@@ -1,10 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models import DEFERRED
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Comment, Profile, User
+from . import counters, instrumentation, trending
+from .models import Comment, Post, Profile, User
 import logging
 logger = logging.getLogger(__name__)
 @receiver(post_save, sender=Comment)
@@ -23,3 +26,105 @@ def invalidate_post_cache_on_bot_comment(sender, instance, created, **kwargs):
         
         # Log bot review activity
         logger.info(f'New bot review added for post {instance.post.id}')
+
+
+# --- Bộ đếm Tag / Community (posts/counters.py) ---
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Post.tags thay đổi (add/remove/clear/set) từ phía Post hoặc phía Tag.
+    pk_set của post_add/post_remove chỉ chứa những liên kết thật sự thay đổi.
+    """
+    if action == 'pre_clear':
+        instance._cleared_pairs = list(
+            sender.objects.filter(**{'tag_id' if reverse else 'post_id': instance.pk}).values_list('post_id', 'tag_id')
+        )
+        return
+    if action == 'post_clear':
+        pairs = getattr(instance, '_cleared_pairs', [])
+        apply = counters.tags_removed
+    elif action in ('post_add', 'post_remove') and pk_set:
+        pairs = [(pk, instance.pk) for pk in pk_set] if reverse else [(instance.pk, pk) for pk in pk_set]
+        apply = counters.tags_added if action == 'post_add' else counters.tags_removed
+    else:
+        return
+
+    tags_by_post = {}
+    for post_id, tag_id in pairs:
+        tags_by_post.setdefault(post_id, set()).add(tag_id)
+    posts = {instance.pk: instance} if not reverse else Post.objects.only('id', 'author_id', 'created_at').in_bulk(list(tags_by_post))
+    for post_id, tag_ids in tags_by_post.items():
+        if post_id in posts:
+            apply(posts[post_id], tag_ids)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_community(sender, instance, **kwargs):
+    instance._previous_community_id = None
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'community' not in update_fields and 'community_id' not in update_fields:
+        instance._previous_community_id = instance.community_id
+        return
+    if not instance.pk or kwargs.get('raw'):
+        return
+    loaded = getattr(instance, '_loaded_community_id', DEFERRED)  # Post.from_db
+    if loaded is not DEFERRED:
+        instance._previous_community_id = loaded
+    else:
+        # Instance không load từ DB (hoặc community bị defer): phải đọc lại
+        instance._previous_community_id = Post.objects.filter(pk=instance.pk).values_list('community_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def update_community_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_community_id', None)
+    if created or previous != instance.community_id:
+        counters.community_left(instance, previous)
+        counters.community_joined(instance, instance.community_id)
+    instance._loaded_community_id = instance.community_id
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post_tags(sender, instance, **kwargs):
+    instance._deleted_tag_ids = list(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_post_counters(sender, instance, **kwargs):
+    counters.tags_removed(instance, getattr(instance, '_deleted_tag_ids', []))
+    counters.community_left(instance, instance.community_id)
+
+
+# --- Hoạt động cho trending (posts/trending.py) ---
+
+@receiver(post_save, sender=Post)
+def record_post_community_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.community_id:
+        trending.record(trending.COMMUNITY, [instance.community_id], 'posts')
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def record_post_tag_activity(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        trending.record(trending.TAG, [instance.pk], 'posts', amount=len(pk_set))
+    else:
+        trending.record(trending.TAG, pk_set, 'posts')
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_activity(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not instance.is_bot:
+        trending.post_activity(instance.post_id, 'comments')
+
+
+# --- Instrumentation (posts/instrumentation.py) ---
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Mọi connection DB đều đo thời gian query cho các request được lấy mẫu."""
+    instrumentation.install(connection)
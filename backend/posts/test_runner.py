@@ -0,0 +1,18 @@
+"""
+Test runner (settings.TEST_RUNNER) that enforces the views' query budgets:
+any request in a test that runs more queries than its view declares
+(posts/query_budget.py) raises QueryBudgetExceeded and fails the test.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._strict_budgets = override_settings(QUERY_BUDGET_STRICT=True)
+        self._strict_budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._strict_budgets.disable()
+        super().teardown_test_environment(**kwargs)
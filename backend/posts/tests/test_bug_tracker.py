@@ -0,0 +1,66 @@
+"""
+Bug tracker rollups (posts/bug_tracker.py): the stats cache stays warm,
+and reconcile() repairs rollups and signature counters from LoggedBug.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import TestCase
+
+from posts import bug_tracker, jobs
+from posts.models import BugDailyRollup, BugSignature, LoggedBug
+
+
+class StatsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('bug_user')
+        bug_tracker.log_bugs(self.user, [
+            {'language': 'Python', 'error_message': "KeyError: 'a'", 'original_code': 'd["a"]'},
+        ])
+
+    def test_warmed_stats_are_served_without_queries(self):
+        jobs.warm_bug_stats()
+        for period in bug_tracker.PERIODS:
+            with self.assertNumQueries(0):
+                self.assertEqual(bug_tracker.get_stats(period)['top_bugs'][0]['count'], 1)
+
+    def test_reconcile_rewarms_instead_of_deleting(self):
+        jobs.warm_bug_stats()
+        bug_tracker.reconcile()
+        with self.assertNumQueries(0):
+            bug_tracker.get_stats('weekly')
+
+
+class ReconcileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reconcile_user')
+        bug_tracker.log_bugs(self.user, [
+            {'language': 'Python', 'error_message': f"KeyError: '{key}'", 'original_code': f'd[{index}]'}
+            for index, key in enumerate(['a', 'a', 'b'])
+        ] + [{'language': 'Python', 'error_message': 'ZeroDivisionError: division by zero', 'original_code': '1/0'}])
+
+    def counts(self):
+        return dict(BugSignature.objects.values_list('error_category', 'occurrence_count'))
+
+    def test_full_run_repairs_drifted_counters(self):
+        BugSignature.objects.update(occurrence_count=99)
+        BugDailyRollup.objects.update(count=99)
+        bug_tracker.reconcile(days=None)
+        self.assertEqual(sorted(self.counts().values()), [1, 3])
+        self.assertEqual(BugDailyRollup.objects.aggregate(total=Sum('count'))['total'], 4)
+
+    def test_full_run_zeroes_signatures_without_bugs(self):
+        zero_division = BugSignature.objects.get(error_category='ZeroDivisionError')
+        LoggedBug.objects.filter(signature=zero_division).delete()
+        bug_tracker.reconcile(days=None)
+        zero_division.refresh_from_db()
+        self.assertEqual(zero_division.occurrence_count, 0)
+        self.assertEqual(zero_division.last_seen, zero_division.first_seen)
+        self.assertFalse(BugDailyRollup.objects.filter(signature=zero_division).exists())
+
+    def test_recent_run_leaves_signature_counters(self):
+        BugSignature.objects.update(occurrence_count=99)
+        bug_tracker.reconcile(days=2)
+        self.assertEqual(set(self.counts().values()), {99})
@@ -0,0 +1,118 @@
+"""
+Chat state (posts/chat_state.py): direct conversations, keyset history
+windows, and the consumer (posts/consumers.py) over an in-memory channel
+layer, which refreshes presence at most once per PRESENCE_REFRESH_INTERVAL.
+"""
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db.models.query import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts import chat_load, chat_state
+from posts.models import ChatMessage, Conversation, ConversationReadState
+from posts.routing import websocket_urlpatterns
+
+
+class DirectConversationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('dm_alice')
+        self.bob = User.objects.create_user('dm_bob')
+
+    def test_created_once_whatever_the_order(self):
+        conversation, created = chat_state.get_or_create_direct(self.alice, self.bob)
+        self.assertTrue(created)
+        self.assertEqual(chat_state.get_or_create_direct(self.bob, self.alice), (conversation, False))
+        self.assertEqual(set(conversation.participants.values_list('id', flat=True)), {self.alice.id, self.bob.id})
+        self.assertEqual(ConversationReadState.objects.filter(conversation=conversation).count(), 2)
+
+    def test_losing_a_race_returns_the_winner(self):
+        winner, _ = chat_state.get_or_create_direct(self.alice, self.bob)
+        # The loser's lookup ran before the winner committed: it finds nothing and hits the unique dm_key
+        with mock.patch.object(QuerySet, 'first', return_value=None):
+            conversation, created = chat_state.get_or_create_direct(self.bob, self.alice)
+        self.assertEqual((conversation, created), (winner, False))
+        self.assertEqual(Conversation.objects.count(), 1)
+
+
+class MessageWindowTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('window_alice')
+        self.bob = User.objects.create_user('window_bob')
+        self.conversation, _ = chat_state.get_or_create_direct(self.alice, self.bob)
+        self.messages = [chat_state.post_message(self.conversation.id, self.alice, f'm{index}') for index in range(7)]
+        # Three messages share a timestamp: the id breaks the tie
+        ChatMessage.objects.filter(id__in=[message.id for message in self.messages[2:5]]).update(
+            created_at=self.messages[2].created_at
+        )
+        self.ordered = list(ChatMessage.objects.filter(conversation=self.conversation).order_by('created_at', 'id'))
+        self.assertEqual(len({message.created_at for message in self.ordered[2:5]}), 1)
+
+    def window(self, **kwargs):
+        messages, has_before, has_after = chat_state.message_window(self.conversation.id, limit=3, **kwargs)
+        return [message.id for message in messages], has_before, has_after
+
+    def ids(self, start, stop):
+        return [message.id for message in self.ordered[start:stop]]
+
+    def test_latest(self):
+        self.assertEqual(self.window(), (self.ids(4, 7), True, False))
+
+    def test_scrolling_back_crosses_equal_timestamps(self):
+        self.assertEqual(self.window(before=self.ordered[4].id), (self.ids(1, 4), True, True))
+        self.assertEqual(self.window(before=self.ordered[3].id), (self.ids(0, 3), False, True))
+        self.assertEqual(self.window(before=self.ordered[0].id), ([], False, True))
+
+    def test_catching_up_crosses_equal_timestamps(self):
+        self.assertEqual(self.window(after=self.ordered[2].id), (self.ids(3, 6), True, True))
+        self.assertEqual(self.window(after=self.ordered[3].id), (self.ids(4, 7), True, False))
+        self.assertEqual(self.window(after=self.ordered[6].id), ([], True, False))
+
+    def test_foreign_or_malformed_pivot(self):
+        other, _ = chat_state.get_or_create_direct(self.alice, User.objects.create_user('window_carol'))
+        foreign = chat_state.post_message(other.id, self.alice, 'elsewhere')
+        self.assertIsNone(chat_state.message_window(self.conversation.id, before=foreign.id))
+        self.assertIsNone(chat_state.message_window(self.conversation.id, after='not-a-uuid'))
+
+
+@override_settings(CHANNEL_LAYERS=chat_load.IN_MEMORY_LAYER)
+class ChatConsumerPresenceTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.member = chat_load.create_fixture(2, 1)[0]
+
+    async def talk(self, frames):
+        socket = WebsocketCommunicator(
+            AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+            f'/ws/chat/{self.member.conversation_id}/',
+            headers=[(b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.member.session_key}'.encode())],
+        )
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        for frame in frames:
+            await socket.send_json_to(frame)
+        # The echo of the last message: every frame before it has been handled
+        while True:
+            event = await socket.receive_json_from(timeout=5)
+            if event.get('text') == frames[-1].get('message'):
+                break
+        await socket.disconnect()
+
+    def test_messages_do_not_refresh_presence(self):
+        frames = [{'type': 'heartbeat'}, {'message': 'one'}, {'type': 'typing'}, {'message': 'two'}]
+        with mock.patch.object(chat_state, 'heartbeat') as heartbeat:
+            async_to_sync(self.talk)(frames)
+        heartbeat.assert_not_called()
+
+    def test_presence_is_refreshed_once_the_interval_passed(self):
+        with mock.patch.object(chat_state, 'heartbeat') as heartbeat, \
+                mock.patch.object(chat_state, 'PRESENCE_REFRESH_INTERVAL', 0):
+            async_to_sync(self.talk)([{'message': 'one'}, {'message': 'two'}])
+        self.assertEqual(heartbeat.call_count, 2)
+        heartbeat.assert_called_with(self.member.user.id)
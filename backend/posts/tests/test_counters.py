@@ -0,0 +1,64 @@
+"""
+Tag and Community counters (posts/counters.py), kept by the Post signals:
+members are distinct authors, and a drifted counter clamps at zero until
+rebuild() restores it.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from posts import counters
+from posts.models import Community, Post, Tag
+
+
+class TaxonomyCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('counter_alice')
+        self.bob = User.objects.create_user('counter_bob')
+        self.tag = Tag.objects.create(name='counter-tag')
+        self.community = Community.objects.create(name='Counter community', owner=self.alice)
+
+    def post(self, author, community=None):
+        post = Post.objects.create(title='Counted', content='x', author=author, community=community)
+        post.tags.add(self.tag)
+        return post
+
+    def assertCounts(self, obj, posts_count, members_count):
+        obj.refresh_from_db()
+        self.assertEqual((obj.posts_count, obj.members_count), (posts_count, members_count))
+
+    def test_members_are_distinct_authors(self):
+        first = self.post(self.alice, self.community)
+        self.post(self.alice, self.community)
+        self.post(self.bob, self.community)
+        self.assertCounts(self.tag, 3, 2)
+        self.assertCounts(self.community, 3, 2)
+        self.assertIsNotNone(self.tag.last_activity_at)
+
+        first.tags.remove(self.tag)
+        first.delete()
+        self.assertCounts(self.tag, 2, 2)
+        self.assertCounts(self.community, 2, 2)
+
+    def test_last_post_of_an_author_removes_the_member(self):
+        post = self.post(self.bob, self.community)
+        self.post(self.alice, self.community)
+        post.tags.clear()
+        self.assertCounts(self.tag, 1, 1)
+        post.community = None
+        post.save()
+        self.assertCounts(self.community, 1, 1)
+
+    def test_drifted_counter_clamps_at_zero(self):
+        post = self.post(self.alice, self.community)
+        Tag.objects.filter(id=self.tag.id).update(posts_count=0, members_count=0)
+        post.tags.remove(self.tag)
+        self.assertCounts(self.tag, 0, 0)
+
+    def test_rebuild_restores_true_values(self):
+        self.post(self.alice, self.community)
+        self.post(self.bob, self.community)
+        Tag.objects.update(posts_count=0, members_count=9)
+        Community.objects.update(posts_count=5, members_count=0)
+        counters.rebuild()
+        self.assertCounts(self.tag, 2, 2)
+        self.assertCounts(self.community, 2, 2)
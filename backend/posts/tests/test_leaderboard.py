@@ -0,0 +1,88 @@
+"""
+Materialized leaderboards (posts/leaderboard.py): incremental verdicts shift
+the ranks in between and always agree with a full rebuild.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from posts import leaderboard
+from posts.models import ChallengeSubmission, LeaderboardEntry, WeeklyChallenge
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'board_user_{index}') for index in range(4)]
+        self.challenges = [
+            WeeklyChallenge.objects.create(topic='Arrays', title=f'Challenge {index}', description='x', test_cases=[],
+                                           solution_code='pass')
+            for index in range(2)
+        ]
+        self.started = timezone.now()
+
+    def review(self, user, status, runtime_ms=None, challenge=None, minutes=0):
+        challenge = challenge or self.challenges[0]
+        submission = ChallengeSubmission.objects.create(
+            challenge=challenge, user=user, submitted_code='pass', language='python', status=status, runtime_ms=runtime_ms,
+        )
+        ChallengeSubmission.objects.filter(id=submission.id).update(submitted_at=self.started + timedelta(minutes=minutes))
+        leaderboard.record_verdict(challenge, user)
+        return submission
+
+    def board(self, challenge=None):
+        return list(leaderboard._board(challenge).order_by('rank').values_list('user__username', 'rank'))
+
+    def assertMatchesRebuild(self):
+        boards = [self.board(challenge) for challenge in [None, *self.challenges]]
+        leaderboard.rebuild_all()
+        self.assertEqual([self.board(challenge) for challenge in [None, *self.challenges]], boards)
+        for board in boards:
+            self.assertEqual([rank for _, rank in board], list(range(1, len(board) + 1)))
+
+    def test_faster_approval_moves_up_and_shifts_the_rest(self):
+        alice, bob, carol, _ = self.users
+        self.review(alice, 'approved', 300, minutes=1)
+        self.review(bob, 'approved', 200, minutes=2)
+        self.review(carol, 'rejected', minutes=3)
+        self.assertEqual(self.board(self.challenges[0]), [('board_user_1', 1), ('board_user_0', 2), ('board_user_2', 3)])
+
+        self.review(carol, 'approved', 100, minutes=4)
+        self.assertEqual(self.board(self.challenges[0]), [('board_user_2', 1), ('board_user_1', 2), ('board_user_0', 3)])
+        self.assertMatchesRebuild()
+
+    def test_ties_break_on_time_then_user(self):
+        alice, bob, carol, _ = self.users
+        self.review(bob, 'approved', 100, minutes=2)
+        self.review(alice, 'approved', 100, minutes=2)
+        self.review(carol, 'approved', 100, minutes=1)
+        self.assertEqual(self.board(self.challenges[0]), [('board_user_2', 1), ('board_user_0', 2), ('board_user_1', 3)])
+        self.assertMatchesRebuild()
+
+    def test_global_board_counts_approved_challenges(self):
+        alice, bob, carol, dave = self.users
+        for challenge in self.challenges:
+            self.review(alice, 'approved', 500, challenge=challenge)
+        self.review(bob, 'approved', 100, challenge=self.challenges[1])
+        self.review(carol, 'rejected')
+        self.review(dave, 'approved', 50)
+        self.assertEqual(leaderboard.entry_for(alice).rank, 1)
+        self.assertEqual(leaderboard.entry_for(alice).approved_count, 2)
+        self.assertEqual(leaderboard.entry_for(carol).rank, 4)
+        self.assertMatchesRebuild()
+
+    def test_removed_entry_closes_the_gap(self):
+        for index, user in enumerate(self.users):
+            self.review(user, 'approved', 100 * (index + 1))
+        ChallengeSubmission.objects.filter(user=self.users[1]).delete()
+        leaderboard.record_verdict(self.challenges[0], self.users[1])
+        self.assertEqual(self.board(self.challenges[0]), [('board_user_0', 1), ('board_user_2', 2), ('board_user_3', 3)])
+        self.assertFalse(LeaderboardEntry.objects.filter(user=self.users[1]).exists())
+        self.assertMatchesRebuild()
+
+    def test_top_entries_pages_by_rank(self):
+        for index, user in enumerate(self.users):
+            self.review(user, 'approved', 100 * (index + 1))
+        page = leaderboard.top_entries(self.challenges[0], page=2, page_size=3)
+        self.assertEqual([(entry.user.username, entry.rank) for entry in page], [('board_user_3', 4)])
@@ -0,0 +1,68 @@
+"""
+Notification delivery (posts/notifications.py): coalescing counts distinct
+actors, and only unread rows of the same group absorb new events.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts import notifications
+from posts.models import Notification, Post
+
+
+@override_settings(NOTIFICATIONS_ASYNC=False)
+class DeliverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('notify_author')
+        self.alice, self.bob, self.carol = [User.objects.create_user(name) for name in ('alice', 'bob', 'carol')]
+        self.post = Post.objects.create(title='Coalesced', content='x', author=self.author)
+
+    def upvote(self, sender, post=None):
+        notifications.deliver([self.author.id], sender.id, 'vote', subject='Coalesced', post_id=(post or self.post).id)
+
+    def test_repeated_events_fold_into_one_row(self):
+        self.upvote(self.alice)
+        self.upvote(self.bob)
+        self.upvote(self.carol)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.sender, self.carol)
+        self.assertEqual(notification.message, "carol and 2 others upvoted your post 'Coalesced'")
+        self.assertEqual(notifications.unread_count(self.author.id), 1)
+
+    def test_returning_actor_is_counted_once(self):
+        self.upvote(self.alice)
+        self.upvote(self.bob)
+        self.upvote(self.alice)
+        self.upvote(self.alice)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(sorted(notification.actor_ids), sorted([self.alice.id, self.bob.id]))
+        self.assertEqual(notification.message, "alice and 1 others upvoted your post 'Coalesced'")
+
+    def test_same_actor_alone_stays_single(self):
+        self.upvote(self.alice)
+        self.upvote(self.alice)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 1)
+        self.assertEqual(notification.message, "alice upvoted your post 'Coalesced'")
+
+    def test_read_rows_and_other_groups_do_not_absorb(self):
+        self.upvote(self.alice)
+        Notification.objects.update(is_read=True)
+        self.upvote(self.bob)
+        other = Post.objects.create(title='Other', content='x', author=self.author)
+        self.upvote(self.carol, post=other)
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(set(Notification.objects.values_list('actor_count', flat=True)), {1})
+
+    def test_uncoalesced_types_insert_a_row_each(self):
+        for sender in (self.alice, self.alice):
+            notifications.deliver([self.author.id], sender.id, 'mention', message='mentioned you')
+        self.assertEqual(Notification.objects.filter(notification_type='mention').count(), 2)
+
+    def test_sender_is_not_notified(self):
+        notifications.deliver([self.author.id, self.alice.id], self.alice.id, 'comment', subject='Coalesced',
+                              post_id=self.post.id)
+        self.assertEqual(list(Notification.objects.values_list('recipient_id', flat=True)), [self.author.id])
@@ -0,0 +1,101 @@
+"""
+Every view that declares a query budget (posts/query_budget.py), requested
+on a cold cache with a realistic page of data. Under posts.test_runner a
+request over its budget raises QueryBudgetExceeded; the assertions below
+check the same numbers through the response headers, so the tests also
+hold under another runner.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from posts import bug_tracker, chat_state, notifications, votes
+from posts.models import Comment, Community, Post, Profile, Tag
+from posts.query_budget import TRANSACTION_CONTROL
+
+ROWS = 12  # more than one row per kind, so an N+1 shows up as a budget overrun
+
+
+@override_settings(QUERY_BUDGET_HEADERS=True, NOTIFICATIONS_ASYNC=False)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget_user', password='budget-pass')
+        others = [User.objects.create_user(f'budget_other_{index}') for index in range(ROWS)]
+        Profile.objects.bulk_create([Profile(user=user) for user in [cls.user, *others]])
+        community = Community.objects.create(name='Budget community', owner=cls.user)
+        tags = [Tag.objects.create(name=f'budget-tag-{index}') for index in range(3)]
+
+        cls.posts = []
+        for index in range(ROWS):
+            author = cls.user if index % 2 else others[index]
+            post = Post.objects.create(title=f'Python post {index}', content='print(1)', author=author, community=community)
+            post.tags.set(tags[:index % 3 + 1])
+            Comment.objects.create(post=post, author=others[index], text='Nice')
+            votes.cast(others[index].id, post.id, True)
+            cls.posts.append(post)
+
+        for index, other in enumerate(others):
+            conversation, _ = chat_state.get_or_create_direct(cls.user, other)
+            chat_state.post_message(conversation.id, other, f'Hello {index}')
+            notifications.deliver([cls.user.id], other.id, 'comment', message='commented on your post',
+                                  post_id=cls.posts[index].id)
+        bug_tracker.log_bugs(cls.user, [
+            {'language': 'Python', 'error_message': f"KeyError: 'key_{index % 3}'", 'original_code': f'd[{index}]'}
+            for index in range(ROWS)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, response, status=200):
+        self.assertEqual(response.status_code, status)
+        self.assertTrue(response.has_header('X-Query-Budget'), 'the view declares no query budget')
+        self.assertLessEqual(int(response['X-DB-Query-Count']), int(response['X-Query-Budget']))
+
+    def test_posts_list(self):
+        self.assertWithinBudget(self.client.get('/api/posts/'))
+
+    def test_posts_list_anonymous(self):
+        self.client.logout()
+        self.assertWithinBudget(self.client.get('/api/posts/'))
+
+    def test_post_retrieve(self):
+        self.assertWithinBudget(self.client.get(f'/api/posts/{self.posts[0].id}/'))
+
+    def test_vote(self):
+        # created (notifies the author), updated, removed; with the work deferred to on_commit counted too
+        path = f'/api/posts/{self.posts[0].id}/vote/'
+        for vote_type in ('up', 'down', 'down'):
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(path, {'vote_type': vote_type}, content_type='application/json')
+            self.assertWithinBudget(response)
+            statements = [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith(TRANSACTION_CONTROL)]
+            self.assertLessEqual(len(statements), int(response['X-Query-Budget']), '\n'.join(statements))
+
+    def test_profile(self):
+        self.assertWithinBudget(self.client.get(f'/api/users/{self.user.username}/profile/'))
+
+    def test_conversations_list(self):
+        self.assertWithinBudget(self.client.get('/api/conversations/'))
+
+    def test_notifications_list(self):
+        self.assertWithinBudget(self.client.get('/api/notifications/'))
+
+    def test_notifications_count_and_recent(self):
+        self.assertWithinBudget(self.client.get('/api/notifications/count/'))
+
+    def test_search(self):
+        self.assertWithinBudget(self.client.get('/api/search/?q=python'))
+
+    def test_bug_stats(self):
+        for period in bug_tracker.PERIODS:
+            cache.clear()
+            self.assertWithinBudget(self.client.get(f'/api/bugs/stats/?period={period}'))
+
+    def test_bug_stats_anonymous(self):
+        self.client.logout()
+        self.assertWithinBudget(self.client.get('/api/bugs/stats/?period=weekly'))
@@ -0,0 +1,83 @@
+"""
+Incremental recommendation updates (posts/recommendations.py): update()
+after new and edited posts must agree with the lists a full build() writes.
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from posts import recommendations
+from posts.models import ContentVector, Post, SimilarPost
+
+TOPICS = [
+    ('Django queryset filter', 'queryset filter prefetch_related select_related django orm'),
+    ('Django orm prefetch', 'django orm queryset prefetch_related annotate'),
+    ('Django select related', 'select_related queryset django filter annotate'),
+    ('React hooks state', 'useState useEffect react hooks component render'),
+    ('React component render', 'react component render props useState'),
+    ('React effect cleanup', 'useEffect cleanup react hooks component'),
+]
+
+
+class RecommendationUpdateTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('rec_author')
+        self.posts = [
+            Post.objects.create(title=title, content=content, author=self.author) for title, content in TOPICS
+        ]
+        recommendations.build()
+
+    def lists(self):
+        result = {}
+        for post_id, similar_id in SimilarPost.objects.order_by('post_id', 'rank').values_list('post_id', 'similar_id'):
+            result.setdefault(post_id, []).append(similar_id)
+        return result
+
+    def test_new_post_is_merged_into_existing_lists(self):
+        post = Post.objects.create(title='Django queryset annotate', content='django queryset annotate filter orm',
+                                   author=self.author)
+        self.assertEqual(recommendations.update(), 1)
+        lists = self.lists()
+        self.assertTrue(lists[post.id])
+        self.assertTrue(all(similar_id != post.id for similar_id in lists[post.id]))
+        self.assertIn(post.id, lists[self.posts[0].id])
+
+    def test_nothing_new(self):
+        self.assertEqual(recommendations.update(), 0)
+
+    def test_edited_post_replaces_its_old_entries(self):
+        edited = self.posts[3]
+        self.assertIn(edited.id, self.lists()[self.posts[4].id])
+        edited.title = 'Django orm annotate'
+        edited.content = 'django orm queryset annotate select_related filter'
+        edited.save()
+        recommendations.post_edited(edited.id)
+
+        self.assertEqual(recommendations.update(), 1)
+        lists = self.lists()
+        for post_id, similar_ids in lists.items():
+            self.assertEqual(len(similar_ids), len(set(similar_ids)), f'duplicate neighbor in the list of {post_id}')
+        self.assertNotIn(edited.id, lists.get(self.posts[4].id, []))
+        self.assertIn(edited.id, lists[self.posts[0].id])
+        self.assertEqual(recommendations.update(), 0)
+
+    def test_lightly_edited_post_keeps_one_entry_with_its_new_score(self):
+        edited = self.posts[1]
+        old_score = SimilarPost.objects.get(post_id=self.posts[0].id, similar_id=edited.id).score
+        edited.content += ' annotate'
+        edited.save()
+        recommendations.post_edited(edited.id)
+
+        self.assertEqual(recommendations.update(), 1)
+        rows = SimilarPost.objects.filter(post_id=self.posts[0].id, similar_id=edited.id)
+        self.assertEqual(rows.count(), 1)
+        self.assertNotAlmostEqual(rows.get().score, old_score, places=5)
+
+    def test_failed_update_writes_nothing(self):
+        Post.objects.create(title='React hooks', content='react hooks useState', author=self.author)
+        with mock.patch.object(recommendations, '_write_lists', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                recommendations.update()
+        self.assertEqual(ContentVector.objects.count(), len(self.posts))
+        self.assertEqual(recommendations.update(), 1)
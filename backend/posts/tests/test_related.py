@@ -0,0 +1,58 @@
+"""
+Related-posts index (posts/related.py): IDF-weighted tag similarity, and
+incremental refreshes that run in the cascade job, not in the request.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts import related
+from posts.models import Post, RelatedPost, Tag
+
+
+class RelatedPostTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('related_author')
+        self.common, self.rare = Tag.objects.create(name='python'), Tag.objects.create(name='asyncio')
+        self.posts = []
+        for index in range(6):
+            post = Post.objects.create(title=f'Post {index}', content='x', author=self.author)
+            post.tags.add(self.common)
+            self.posts.append(post)
+        self.posts[1].tags.add(self.rare)
+        related.rebuild()
+
+    def related_ids(self, post):
+        return list(RelatedPost.objects.filter(post=post).order_by('rank').values_list('related_id', flat=True))
+
+    def run_cascade(self):
+        # Each run applies the entries queued before the previous one
+        return related.refresh_cascade() + related.refresh_cascade()
+
+    def test_rare_shared_tag_ranks_first(self):
+        post = Post.objects.create(title='Async', content='x', author=self.author)
+        post.tags.add(self.common, self.rare)
+        self.assertEqual(related.neighbors(post.id)[0][0], self.posts[1].id)
+
+    def test_post_changed_defers_every_refresh_to_the_job(self):
+        post = Post.objects.create(title='Async', content='x', author=self.author)
+        post.tags.add(self.common, self.rare)
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(0):
+            related.post_changed(post.id)
+        self.assertEqual(self.related_ids(post), [])
+
+        self.assertGreater(self.run_cascade(), 1)
+        self.assertEqual(self.related_ids(post)[0], self.posts[1].id)
+        # Its neighbors' lists were refreshed too, so it shows up there
+        self.assertIn(post.id, self.related_ids(self.posts[1]))
+
+    def test_removed_post_leaves_the_lists(self):
+        removed = self.posts[1]
+        self.assertIn(removed.id, self.related_ids(self.posts[0]))
+        with self.captureOnCommitCallbacks(execute=True):
+            related.post_removed(removed.id)
+            removed.delete()
+        self.run_cascade()
+        self.assertNotIn(removed.id, self.related_ids(self.posts[0]))
+        self.assertEqual(len(self.related_ids(self.posts[0])), 4)
@@ -0,0 +1,94 @@
+"""
+Vote engine (posts/votes.py): toggling and switching move the stored
+counters by the right deltas, and trending picks votes up from the Vote
+table.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from posts import trending, votes
+from posts.models import ActivityBucket, Community, Post, Tag, Vote
+
+
+class CastTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('vote_author')
+        self.voter = User.objects.create_user('vote_voter')
+        self.post = Post.objects.create(title='Vote me', content='x', author=self.author)
+
+    def cast(self, is_upvote, toggle=True, user=None):
+        return votes.cast((user or self.voter).id, self.post.id, is_upvote, toggle)
+
+    def assertCounters(self, upvotes, downvotes):
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.upvote_count, self.post.downvote_count), (upvotes, downvotes))
+        self.assertEqual(votes.drifted([self.post.id]), [])
+
+    def test_create_toggle_and_switch(self):
+        steps = [
+            (True, 'created', 1, 0),
+            (True, 'removed', 0, 0),
+            (False, 'created', 0, 1),
+            (True, 'updated', 1, 0),
+            (False, 'updated', 0, 1),
+            (False, 'removed', 0, 0),
+        ]
+        for is_upvote, action, upvotes, downvotes in steps:
+            result = self.cast(is_upvote)
+            self.assertEqual(result, {'action': action, 'upvotes': upvotes, 'downvotes': downvotes,
+                                      'score': upvotes - downvotes})
+            self.assertCounters(upvotes, downvotes)
+
+    def test_same_vote_without_toggle_is_unchanged(self):
+        self.cast(True)
+        self.assertEqual(self.cast(True, toggle=False)['action'], 'unchanged')
+        self.assertCounters(1, 0)
+        self.assertEqual(Vote.objects.get().value, 1)
+
+    def test_switch_updates_value(self):
+        self.cast(True)
+        self.cast(False)
+        vote = Vote.objects.get()
+        self.assertEqual((vote.is_upvote, vote.value), (False, -1))
+
+    def test_several_voters(self):
+        other = User.objects.create_user('vote_other')
+        self.cast(True)
+        self.cast(False, user=other)
+        self.assertEqual(self.cast(True, user=other)['score'], 2)
+        self.assertCounters(2, 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.cast(True)
+        Post.objects.filter(id=self.post.id).update(upvote_count=7, downvote_count=3)
+        self.assertEqual(votes.drifted([self.post.id]), [self.post.id])
+        votes.reconcile([self.post.id])
+        self.assertCounters(1, 0)
+
+
+class TrendingVoteTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('trend_author')
+        self.voters = [User.objects.create_user(f'trend_voter_{index}') for index in range(3)]
+        self.community = Community.objects.create(name='Trend community', owner=author)
+        self.tag = Tag.objects.create(name='trend-tag')
+        self.post = Post.objects.create(title='Trending', content='x', author=author, community=self.community)
+        self.post.tags.add(self.tag)
+
+    def bucket_votes(self, subject, subject_id):
+        return sum(ActivityBucket.objects.filter(subject=subject, subject_id=subject_id).values_list('votes', flat=True))
+
+    def test_compute_counts_votes_from_the_vote_table(self):
+        for voter in self.voters:
+            votes.cast(voter.id, self.post.id, True)
+        votes.cast(self.voters[0].id, self.post.id, True)  # toggled off before the recount
+        self.assertEqual(self.bucket_votes(trending.TAG, self.tag.id), 0)
+
+        trending.compute()
+        self.assertEqual(self.bucket_votes(trending.TAG, self.tag.id), 2)
+        self.assertEqual(self.bucket_votes(trending.COMMUNITY, self.community.id), 2)
+        self.assertEqual([tag for tag, _ in trending.trending(trending.TAG)], [self.tag])
+
+        votes.cast(self.voters[0].id, self.post.id, False)
+        trending.compute()
+        self.assertEqual(self.bucket_votes(trending.TAG, self.tag.id), 3)
@@ -0,0 +1,195 @@
+"""
+Trending tags and communities over a sliding window.
+
+Activity is counted into hourly ActivityBucket rows per tag and per
+community:
+- a post published in it, as it happens
+- a comment on one of its posts (bot reviews excluded), as it happens
+- a vote on one of its posts, by compute()
+Increments run after the surrounding transaction commits, so a rolled
+back post or comment never counts. Votes are too frequent to pay for
+that on every click: compute() recounts the votes of the hours since its
+previous run from the Vote table (indexed on created_at) instead. A vote
+removed after its hour was recounted stays counted.
+
+compute() then loads the buckets of the last WINDOW_HOURS hours in one query
+and scores them in one vectorized numpy pass. Each bucket's weighted
+activity is decayed by its age (half-life HALF_LIFE_HOURS) and summed per
+subject. The TOP_N per subject are stored in TrendingScore, which is all
+the /tags/trending/ and /communities/trending/ endpoints read; they never
+compute, the `compute_trending` scheduler job does. Buckets that have left
+the window are pruned by the same call.
+
+rebuild_buckets() recomputes the window from the posts, comments and votes
+tables, for the first deploy or after bulk imports that bypass the hooks.
+"""
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ActivityBucket, Comment, Community, Post, Tag, TrendingScore, Vote
+
+TAG, COMMUNITY = ActivityBucket.TAG, ActivityBucket.COMMUNITY
+SUBJECT_MODELS = {TAG: Tag, COMMUNITY: Community}
+SUBJECT_CODES = {TAG: 0, COMMUNITY: 1}
+
+WINDOW_HOURS = 24 * 7
+HALF_LIFE_HOURS = 24
+WEIGHTS = {'posts': 3.0, 'comments': 2.0, 'votes': 1.0}
+TOP_N = 50
+DEFAULT_LIMIT = 10
+
+PostTag = Post.tags.through
+
+
+def _hour(at=None):
+    return (at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+# --- Recording --------------------------------------------------------------
+
+def _add(subject, subject_ids, field, amount, hour):
+    subject_ids = {subject_id for subject_id in subject_ids if subject_id is not None}
+    if not subject_ids or not amount:
+        return
+    # Insert the missing buckets, then one relative UPDATE for all of them: no lost increments under concurrency
+    ActivityBucket.objects.bulk_create([
+        ActivityBucket(subject=subject, subject_id=subject_id, hour=hour) for subject_id in subject_ids
+    ], ignore_conflicts=True)
+    ActivityBucket.objects.filter(subject=subject, subject_id__in=subject_ids, hour=hour).update(
+        **{field: F(field) + amount}
+    )
+
+
+def record(subject, subject_ids, field, amount=1):
+    """Count `amount` of `field` ('posts', 'comments') for each subject, after commit."""
+    hour = _hour()
+    subject_ids = list(subject_ids)
+    transaction.on_commit(lambda: _add(subject, subject_ids, field, amount, hour))
+
+
+def post_activity(post_id, field, amount=1):
+    """Count activity on a post towards its tags and its community, after commit."""
+    hour = _hour()
+
+    def run():
+        community_id = Post.objects.filter(id=post_id).values_list('community_id', flat=True).first()
+        tag_ids = PostTag.objects.filter(post_id=post_id).values_list('tag_id', flat=True)
+        _add(TAG, tag_ids, field, amount, hour)
+        _add(COMMUNITY, [community_id], field, amount, hour)
+
+    transaction.on_commit(run)
+
+
+# --- Scoring ----------------------------------------------------------------
+
+def recount_votes(since):
+    """Set the votes of every bucket from the hour `since` on to the Vote table's counts."""
+    counts = _count(['votes'], since)
+    with transaction.atomic():
+        ActivityBucket.objects.filter(hour__gte=since).exclude(votes=0).update(votes=0)
+        ActivityBucket.objects.bulk_create([
+            ActivityBucket(subject=subject, subject_id=subject_id, hour=hour, votes=fields['votes'])
+            for (subject, subject_id, hour), fields in counts.items()
+        ], batch_size=1000, update_conflicts=True, unique_fields=['subject', 'subject_id', 'hour'], update_fields=['votes'])
+
+
+def compute(now=None):
+    """Prune old buckets, recount recent votes and store fresh TrendingScore rows. Returns {subject: number ranked}."""
+    now_hour = _hour(now)
+    cutoff = now_hour - timedelta(hours=WINDOW_HOURS - 1)
+    ActivityBucket.objects.filter(hour__lt=cutoff).delete()
+    # From the hour before the previous run: a vote created just before it may have committed just after
+    previous = TrendingScore.objects.aggregate(at=Max('computed_at'))['at']
+    recount_votes(max(cutoff, _hour(previous) - timedelta(hours=1)) if previous else cutoff)
+
+    rows = list(ActivityBucket.objects.filter(hour__gte=cutoff).values_list(
+        'subject', 'subject_id', 'hour', 'posts', 'comments', 'votes'
+    ))
+    ranked = {TAG: [], COMMUNITY: []}
+    if rows:
+        subjects, subject_ids, hours, posts, comments, votes = zip(*rows)
+        keys = (np.array([SUBJECT_CODES[subject] for subject in subjects], dtype=np.int64) << 32) | np.array(subject_ids, dtype=np.int64)
+        age_hours = (now_hour.timestamp() - np.array([hour.timestamp() for hour in hours])) / 3600
+        activity = (
+            WEIGHTS['posts'] * np.array(posts, dtype=np.float64)
+            + WEIGHTS['comments'] * np.array(comments, dtype=np.float64)
+            + WEIGHTS['votes'] * np.array(votes, dtype=np.float64)
+        )
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        scores = np.bincount(inverse, weights=activity * np.exp2(-age_hours / HALF_LIFE_HOURS))
+
+        for subject, code in SUBJECT_CODES.items():
+            positions = np.flatnonzero((unique_keys >> 32) == code)
+            positions = positions[scores[positions] > 0]
+            best = positions[np.argsort(-scores[positions], kind='stable')][:TOP_N]
+            ranked[subject] = [(int(unique_keys[position] & 0xFFFFFFFF), float(scores[position])) for position in best]
+
+    computed_at = timezone.now()
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create([
+            TrendingScore(subject=subject, subject_id=subject_id, score=score, rank=rank, computed_at=computed_at)
+            for subject, entries in ranked.items()
+            for rank, (subject_id, score) in enumerate(entries)
+        ])
+    return {subject: len(entries) for subject, entries in ranked.items()}
+
+
+# --- Reading ----------------------------------------------------------------
+
+def trending(subject, limit=DEFAULT_LIMIT):
+    """[(Tag or Community, score), ...] hottest first, from the stored scores."""
+    rows = list(TrendingScore.objects.filter(subject=subject).order_by('rank').values_list('subject_id', 'score')[:limit])
+    objects = SUBJECT_MODELS[subject].objects.in_bulk([subject_id for subject_id, _ in rows])
+    return [(objects[subject_id], score) for subject_id, score in rows if subject_id in objects]
+
+
+# --- Rebuilding -------------------------------------------------------------
+
+# field -> (model, timestamp field, {subject: lookup to the subject id})
+SOURCES = {
+    'posts': (Post, 'created_at', {TAG: 'tags', COMMUNITY: 'community'}),
+    'comments': (Comment, 'created', {TAG: 'post__tags', COMMUNITY: 'post__community'}),
+    'votes': (Vote, 'created_at', {TAG: 'post__tags', COMMUNITY: 'post__community'}),
+}
+
+
+def _count(fields, since):
+    """{(subject, subject_id, hour): Counter of `fields`} from the raw tables, for the hours from `since` on."""
+    counts = {}
+    for field in fields:
+        model, timestamp, lookups = SOURCES[field]
+        queryset = model.objects.filter(**{f'{timestamp}__gte': since})
+        if model is Comment:
+            queryset = queryset.filter(is_bot=False)
+        for subject, lookup in lookups.items():
+            grouped = (
+                queryset.filter(**{f'{lookup}__isnull': False})
+                .annotate(bucket=TruncHour(timestamp))
+                .values_list(lookup, 'bucket')
+                .annotate(n=Count('id'))
+                .order_by()
+            )
+            for subject_id, hour, n in grouped.iterator():
+                counts.setdefault((subject, subject_id, hour), Counter())[field] += n
+    return counts
+
+
+def rebuild_buckets(now=None):
+    """Recompute every bucket in the window from the raw tables. Returns the number of buckets written."""
+    cutoff = _hour(now) - timedelta(hours=WINDOW_HOURS - 1)
+    counts = _count(SOURCES, cutoff)
+    with transaction.atomic():
+        ActivityBucket.objects.filter(hour__gte=cutoff).delete()
+        ActivityBucket.objects.bulk_create([
+            ActivityBucket(subject=subject, subject_id=subject_id, hour=hour, **fields)
+            for (subject, subject_id, hour), fields in counts.items()
+        ], batch_size=1000)
+    return len(counts)
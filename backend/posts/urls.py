@@ -44,8 +44,12 @@ urlpatterns = [
     path('ai/generate-challenge/', AIChallengeGeneratorView.as_view(), name='ai_generate_challenge'),
 
     path('bugs/log/', api_views.log_bug_view, name='log_bug'),
+    path('bugs/log/batch/', api_views.log_bugs_batch_view, name='log_bugs_batch'),
     path('bugs/stats/', api_views.bug_stats_view, name='bug_stats'),
     path('bugs/reviews/', api_views.bug_reviews_view, name='bug_reviews'),
+    path('votes/metrics/', api_views.vote_buffer_metrics_view, name='vote_buffer_metrics'),
+    path('scheduler/metrics/', api_views.scheduler_metrics_view, name='scheduler_metrics'),
+    path('metrics/', api_views.prometheus_metrics_view, name='prometheus_metrics'),
 
     path('chat/ai/', chat_with_ai_view, name='chat-with-ai'),
 
@@ -0,0 +1,337 @@
+"""
+Write-behind vote buffer for hot posts (settings.VOTES_WRITE_BEHIND).
+
+In write-behind mode a vote does not touch the database. The user's new
+vote state and the post's counter deltas go into the cache (Redis, shared
+by all workers). `python manage.py flush_votes --loop` later applies them
+in batches: one transaction and one post-row lock per post per batch,
+instead of one per click.
+
+Buffered writes are grouped into generations. Every flush opens a new
+generation and applies the ones closed at least one interval earlier, so
+a writer that read the generation number just before the switch can
+never land in a generation that has already been flushed. Within a
+generation, entries are an append-only journal addressed by an atomic
+sequence number, and the last entry per (post, user) wins.
+
+Reads merge the buffer in:
+- current_vote() prefers the pending state, so users see their own vote
+  instantly
+- buffered_deltas() returns the not-yet-flushed counter deltas, which are
+  added to the stored counters
+
+Buffer size and flush timings are reported by metrics().
+
+The buffer must live in a cache every worker shares: enabled() refuses a
+per-process cache (LocMemCache, DummyCache) with ImproperlyConfigured.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Post, Vote
+
+PREFIX = 'votes:buffer'
+GENERATION_KEY = f'{PREFIX}:generation'
+FLUSHED_KEY = f'{PREFIX}:flushed'
+LOCK_KEY = f'{PREFIX}:flush_lock'
+METRICS_KEY = f'{PREFIX}:metrics'
+PENDING_TTL = 60 * 60
+GENERATION_TTL = 60 * 60 * 24
+LOCK_TTL = 60
+CAST_LOCK_TTL = 5  # seconds; a crashed writer's lock frees itself
+CAST_LOCK_POLL = 0.01
+READ_CHUNK_SIZE = 1000
+NON_SHARED_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+UP, DOWN, NONE = 'up', 'down', ''
+
+
+def enabled():
+    if not getattr(settings, 'VOTES_WRITE_BEHIND', False):
+        return False
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in NON_SHARED_CACHES:
+        raise ImproperlyConfigured(
+            f'VOTES_WRITE_BEHIND needs a cache shared by every worker, not {backend}: '
+            'each process would buffer and flush its own votes'
+        )
+    return True
+
+
+def flush_interval():
+    return getattr(settings, 'VOTES_FLUSH_INTERVAL', 2)
+
+
+def _pending_key(post_id, user_id):
+    return f'{PREFIX}:pending:{post_id}:{user_id}'
+
+
+def _cast_lock_key(post_id, user_id):
+    return f'{PREFIX}:cast_lock:{post_id}:{user_id}'
+
+
+def _seq_key(generation):
+    return f'{PREFIX}:{generation}:seq'
+
+
+def _entry_key(generation, seq):
+    return f'{PREFIX}:{generation}:entry:{seq}'
+
+
+def _delta_key(generation, post_id, direction):
+    return f'{PREFIX}:{generation}:delta:{post_id}:{direction}'
+
+
+def _incr(key, amount=1):
+    cache.add(key, 0, GENERATION_TTL)
+    return cache.incr(key, amount)
+
+
+def _generation():
+    cache.add(GENERATION_KEY, 1, None)
+    return cache.get(GENERATION_KEY)
+
+
+def _unflushed_generations():
+    return range((cache.get(FLUSHED_KEY) or 0) + 1, _generation() + 1)
+
+
+# --- Reads ------------------------------------------------------------------
+
+def current_vote(post_id, user_id):
+    """'up', 'down' or '' for the user's vote, pending state first."""
+    pending = cache.get(_pending_key(post_id, user_id))
+    if pending is not None:
+        return pending
+    is_upvote = Vote.objects.filter(post_id=post_id, user_id=user_id).values_list('is_upvote', flat=True).first()
+    if is_upvote is None:
+        return NONE
+    return UP if is_upvote else DOWN
+
+
+def pending_votes(post_ids, user_id):
+    """{post_id: 'up' / 'down' / ''} for the posts where the user has a buffered vote."""
+    keys = {_pending_key(post_id, user_id): post_id for post_id in post_ids}
+    return {keys[key]: state for key, state in cache.get_many(keys).items()}
+
+
+def buffered_deltas(post_ids):
+    """{post_id: (up delta, down delta)} not yet applied to the stored counters."""
+    keys = {}
+    for generation in _unflushed_generations():
+        for post_id in post_ids:
+            keys[_delta_key(generation, post_id, UP)] = (post_id, 0)
+            keys[_delta_key(generation, post_id, DOWN)] = (post_id, 1)
+    deltas = defaultdict(lambda: [0, 0])
+    for key, value in cache.get_many(keys).items():
+        post_id, index = keys[key]
+        deltas[post_id][index] += value
+    return {post_id: tuple(value) for post_id, value in deltas.items()}
+
+
+# --- Writes -----------------------------------------------------------------
+
+@contextmanager
+def _cast_lock(post_id, user_id):
+    """
+    Serialize one user's casts on one post, so the read of the old state and
+    the write of the new one cannot interleave with a concurrent click.
+    """
+    key = _cast_lock_key(post_id, user_id)
+    deadline = time.monotonic() + CAST_LOCK_TTL
+    while not cache.add(key, 1, CAST_LOCK_TTL):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'Vote by user {user_id} on post {post_id} is locked')
+        time.sleep(CAST_LOCK_POLL)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def cast(user_id, post_id, is_upvote, toggle=True):
+    """Same contract as votes.cast, but only the cache is written."""
+    with _cast_lock(post_id, user_id):
+        old = current_vote(post_id, user_id)
+        requested = UP if is_upvote else DOWN
+        if old == requested:
+            new, action = (NONE, 'removed') if toggle else (old, 'unchanged')
+        else:
+            new, action = requested, ('updated' if old else 'created')
+
+        if new != old:
+            generation = _generation()
+            cache.set(_pending_key(post_id, user_id), new, PENDING_TTL)
+            seq = _incr(_seq_key(generation))
+            cache.set(_entry_key(generation, seq), (post_id, user_id, new), GENERATION_TTL)
+            for direction in (UP, DOWN):
+                delta = (new == direction) - (old == direction)
+                if delta:
+                    _incr(_delta_key(generation, post_id, direction), delta)
+
+    upvotes, downvotes = Post.objects.filter(id=post_id).values_list('upvote_count', 'downvote_count').get()
+    up_delta, down_delta = buffered_deltas([post_id]).get(post_id, (0, 0))
+    upvotes, downvotes = upvotes + up_delta, downvotes + down_delta
+    return {'action': action, 'upvotes': upvotes, 'downvotes': downvotes, 'score': upvotes - downvotes}
+
+
+# --- Flushing ---------------------------------------------------------------
+
+def _insert_votes(post_id, rows):
+    """
+    Insert [(user_id, is_upvote)] and return the rows actually inserted. A
+    vote that votes.cast inserted concurrently wins, and its row is skipped.
+    """
+    def build(user_id, is_upvote):
+        return Vote(user_id=user_id, post_id=post_id, is_upvote=is_upvote, value=1 if is_upvote else -1)
+
+    try:
+        with transaction.atomic():
+            Vote.objects.bulk_create([build(*row) for row in rows])
+        return rows
+    except IntegrityError:
+        pass
+    inserted = []
+    for row in rows:
+        try:
+            with transaction.atomic():
+                Vote.objects.bulk_create([build(*row)])
+            inserted.append(row)
+        except IntegrityError:
+            continue
+    return inserted
+
+
+def _apply(post_id, states):
+    """
+    Write one post's batch of final vote states; returns the number of votes
+    changed. The counter deltas come from the rows each statement actually
+    changed, so a concurrent votes.cast on the same post is not counted twice.
+    """
+    with transaction.atomic():
+        if not Post.objects.select_for_update().filter(id=post_id).exists():
+            return 0
+        existing = dict(
+            Vote.objects.filter(post_id=post_id, user_id__in=states).values_list('user_id', 'is_upvote')
+        )
+        to_create, to_up, to_down, to_delete = [], [], [], []
+        for user_id, state in states.items():
+            before = existing.get(user_id)
+            if state == NONE:
+                if before is not None:
+                    to_delete.append(user_id)
+            elif before is None:
+                to_create.append((user_id, state == UP))
+            elif before != (state == UP):
+                (to_up if state == UP else to_down).append(user_id)
+
+        live_users = set(User.objects.filter(id__in=[user_id for user_id, _ in to_create]).values_list('id', flat=True))
+        to_create = [(user_id, is_upvote) for user_id, is_upvote in to_create if user_id in live_users]
+        inserted = _insert_votes(post_id, to_create) if to_create else []
+
+        votes = Vote.objects.filter(post_id=post_id)
+        switched_up = votes.filter(user_id__in=to_up, is_upvote=False).update(is_upvote=True, value=1)
+        switched_down = votes.filter(user_id__in=to_down, is_upvote=True).update(is_upvote=False, value=-1)
+        removed_up, _ = votes.filter(user_id__in=to_delete, is_upvote=True).delete()
+        removed_down, _ = votes.filter(user_id__in=to_delete, is_upvote=False).delete()
+
+        created_up = sum(1 for _, is_upvote in inserted if is_upvote)
+        up_delta = created_up + switched_up - switched_down - removed_up
+        down_delta = (len(inserted) - created_up) + switched_down - switched_up - removed_down
+        if up_delta or down_delta:
+            Post.objects.filter(id=post_id).update(
+                upvote_count=F('upvote_count') + up_delta,
+                downvote_count=F('downvote_count') + down_delta,
+            )
+    return len(inserted) + switched_up + switched_down + removed_up + removed_down
+
+
+def _flush_generation(generation):
+    seq = cache.get(_seq_key(generation)) or 0
+    latest = {}
+    entry_keys = [_entry_key(generation, index) for index in range(1, seq + 1)]
+    for start in range(0, len(entry_keys), READ_CHUNK_SIZE):
+        chunk = entry_keys[start:start + READ_CHUNK_SIZE]
+        found = cache.get_many(chunk)
+        for key in chunk:  # journal order, so the last state per pair wins
+            if key in found:
+                post_id, user_id, state = found[key]
+                latest[(post_id, user_id)] = state
+
+    by_post = defaultdict(dict)
+    for (post_id, user_id), state in latest.items():
+        by_post[post_id][user_id] = state
+    changed = sum(_apply(post_id, states) for post_id, states in by_post.items())
+
+    cache.delete_many(entry_keys + [_seq_key(generation)] + [
+        _delta_key(generation, post_id, direction) for post_id in by_post for direction in (UP, DOWN)
+    ])
+    return seq, len(by_post), changed
+
+
+def flush(drain=False):
+    """
+    Apply buffered generations to the database. Normally the generation
+    closed by this call is left for the next one (see the module docstring);
+    drain=True applies it too, for shutting write-behind off. Returns a
+    summary dict, or None if another flusher holds the lock.
+    """
+    if not cache.add(LOCK_KEY, 1, LOCK_TTL):
+        return None
+    started = time.monotonic()
+    entries = posts = changed = 0
+    try:
+        closing = _generation()
+        cache.incr(GENERATION_KEY)
+        last = closing if drain else closing - 1
+        for generation in range((cache.get(FLUSHED_KEY) or 0) + 1, last + 1):
+            flushed_entries, flushed_posts, flushed_changed = _flush_generation(generation)
+            entries += flushed_entries
+            posts += flushed_posts
+            changed += flushed_changed
+            cache.set(FLUSHED_KEY, generation, None)
+    finally:
+        cache.delete(LOCK_KEY)
+
+    summary = {
+        'entries': entries,
+        'posts': posts,
+        'votes_changed': changed,
+        'seconds': round(time.monotonic() - started, 4),
+    }
+    metrics_state = cache.get(METRICS_KEY) or {'flushes': 0}
+    metrics_state.update({
+        'flushes': metrics_state['flushes'] + 1,
+        'last_flush_at': timezone.now().isoformat(),
+        'last_flush': summary,
+    })
+    cache.set(METRICS_KEY, metrics_state, None)
+    return summary
+
+
+def metrics():
+    """Buffer size and flush timings, for monitoring."""
+    generations = list(_unflushed_generations())
+    sizes = cache.get_many([_seq_key(generation) for generation in generations])
+    state = cache.get(METRICS_KEY) or {'flushes': 0}
+    return {
+        'enabled': enabled(),
+        'flush_interval_seconds': flush_interval(),
+        'buffered_entries': sum(sizes.values()),
+        'unflushed_generations': len(generations),
+        'flushes': state['flushes'],
+        'last_flush_at': state.get('last_flush_at'),
+        'last_flush': state.get('last_flush'),
+    }
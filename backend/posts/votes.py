@@ -0,0 +1,96 @@
+"""
+Vote engine.
+
+A post's score is stored on the row as upvote_count / downvote_count and
+moved by deltas in the same transaction as the Vote change, so reading a
+score never counts votes.
+
+cast() writes the vote with one upsert on the (user, post) unique index:
+INSERT a new vote, or switch an opposite one in place. It returns nothing
+when the same vote already exists, and only then does a second statement
+DELETE it (toggle off). The upsert cannot lose a race with a concurrent
+click: the database either inserts or locks the existing row, so a
+double-click behaves like two clicks in sequence. The counter delta and
+the new counts are one UPDATE ... RETURNING on the post row.
+
+Votes do not record trending activity: trending.compute() recounts them
+from the Vote table, so a vote costs two or three statements.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Post, Vote
+
+UPSERT_SQL = """
+    INSERT INTO {vote} (user_id, post_id, is_upvote, value, created_at) VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (user_id, post_id) DO UPDATE SET is_upvote = excluded.is_upvote, value = excluded.value
+    WHERE {vote}.is_upvote <> excluded.is_upvote
+    RETURNING created_at = %s
+"""
+COUNTERS_SQL = """
+    UPDATE {post} SET upvote_count = upvote_count + %s, downvote_count = downvote_count + %s
+    WHERE id = %s RETURNING upvote_count, downvote_count
+"""
+
+
+def _counter(is_upvote):
+    return 'upvote_count' if is_upvote else 'downvote_count'
+
+
+def _write_vote(cursor, user_id, post_id, is_upvote, toggle):
+    """Apply the vote; returns (action, {counter field: delta})."""
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    cursor.execute(UPSERT_SQL.format(vote=connection.ops.quote_name(Vote._meta.db_table)), [
+        user_id, post_id, is_upvote, 1 if is_upvote else -1, created_at, created_at,
+    ])
+    row = cursor.fetchone()
+    if row is not None:
+        if row[0]:  # created_at is ours: the row is new
+            return 'created', {_counter(is_upvote): 1}
+        return 'updated', {_counter(is_upvote): 1, _counter(not is_upvote): -1}
+
+    # The same vote exists, and the upsert holds its row lock
+    if toggle and Vote.objects.filter(user_id=user_id, post_id=post_id, is_upvote=is_upvote).delete()[0]:
+        return 'removed', {_counter(is_upvote): -1}
+    return 'unchanged', {}
+
+
+def cast(user_id, post_id, is_upvote, toggle=True):
+    """
+    Record a vote and return {'action', 'upvotes', 'downvotes', 'score'}.
+    action is 'created', 'updated', 'removed' (same vote again with
+    toggle=True) or 'unchanged' (same vote again with toggle=False).
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        action, deltas = _write_vote(cursor, user_id, post_id, is_upvote, toggle)
+        if deltas:
+            cursor.execute(COUNTERS_SQL.format(post=connection.ops.quote_name(Post._meta.db_table)), [
+                deltas.get('upvote_count', 0), deltas.get('downvote_count', 0), post_id,
+            ])
+            upvotes, downvotes = cursor.fetchone()
+        else:
+            upvotes, downvotes = Post.objects.filter(id=post_id).values_list('upvote_count', 'downvote_count').get()
+    return {'action': action, 'upvotes': upvotes, 'downvotes': downvotes, 'score': upvotes - downvotes}
+
+
+def reconcile(post_ids=None):
+    """Recompute stored counters from the Vote table. Returns the number of posts updated."""
+    def count_of(is_upvote):
+        return Coalesce(Subquery(
+            Vote.objects.filter(post_id=OuterRef('id'), is_upvote=is_upvote)
+            .values('post_id').annotate(n=Count('id')).values('n')
+        ), Value(0))
+
+    posts = Post.objects.all() if post_ids is None else Post.objects.filter(id__in=post_ids)
+    return posts.update(upvote_count=count_of(True), downvote_count=count_of(False))
+
+
+def drifted(post_ids=None):
+    """Posts whose stored counters disagree with the Vote table."""
+    posts = Post.objects.all() if post_ids is None else Post.objects.filter(id__in=post_ids)
+    return list(posts.annotate(
+        actual_up=Count('votes', filter=Q(votes__is_upvote=True)),
+        actual_down=Count('votes', filter=Q(votes__is_upvote=False)),
+    ).exclude(upvote_count=F('actual_up'), downvote_count=F('actual_down')).values_list('id', flat=True))
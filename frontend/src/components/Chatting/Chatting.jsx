@@ -6,6 +6,8 @@ import styles from './Chatting.module.css';
 import { Send, Search, MessageSquare, PlusCircle, X, Bot, Trash2, ArrowLeft } from 'lucide-react'; 
 
 const AI_USERNAME = process.env.REACT_APP_AI_ASSISTANT_USERNAME;
+// Server presence expires after 90s without a frame (chat_state.PRESENCE_TTL)
+const HEARTBEAT_INTERVAL_MS = 30000;
 
 const stripHtml = (html) => {
   if (!html) return '';
@@ -93,10 +95,16 @@ const Chatting = () => {
     const [isModalOpen, setIsModalOpen] = useState(false);
     const [chatCandidates, setChatCandidates] = useState([]);
     const [modalLoading, setModalLoading] = useState(false);
+    const [hasMoreBefore, setHasMoreBefore] = useState(false);
+    const [loadingOlder, setLoadingOlder] = useState(false);
     
     const ws = useRef(null);
     const messagesEndRef = useRef(null);
+    const messageListRef = useRef(null);
+    // scrollHeight before older messages were prepended, to keep the view in place
+    const prependedFromHeightRef = useRef(null);
     const reconnectTimeoutRef = useRef(null);
+    const heartbeatRef = useRef(null);
 
     const [isConfirmModalOpen, setIsConfirmModalOpen] = useState(false);
 
@@ -183,7 +191,7 @@ const Chatting = () => {
         const fetchConversations = async () => {
             try {
                 setLoading(true);
-                const convos = await apiService.getConversations();
+                const convos = await apiService.getAllConversations();
                 setConversations(convos);
                 
                 const redirectedConvId = location.state?.conversationId;
@@ -204,6 +212,13 @@ const Chatting = () => {
         fetchConversations();
     }, [location.state]);
 
+    const stopHeartbeat = () => {
+        if (heartbeatRef.current) {
+            clearInterval(heartbeatRef.current);
+            heartbeatRef.current = null;
+        }
+    };
+
     const connectWebSocket = (conversationId) => {
         if (reconnectTimeoutRef.current) {
             clearTimeout(reconnectTimeoutRef.current);
@@ -219,11 +234,18 @@ const Chatting = () => {
             console.log("WebSocket connected for conversation:", conversationId);
             setWsConnected(true);
             setError(null);
+            stopHeartbeat();
+            heartbeatRef.current = setInterval(() => {
+                if (socket.readyState === WebSocket.OPEN) {
+                    socket.send(JSON.stringify({ type: 'heartbeat' }));
+                }
+            }, HEARTBEAT_INTERVAL_MS);
         };
         
         socket.onclose = (event) => {
             console.log("WebSocket disconnected:", event.code, event.reason);
             setWsConnected(false);
+            stopHeartbeat();
             if (event.code !== 1000 && activeConversation?.id === conversationId) {
                 console.log("Attempting to reconnect in 3 seconds...");
                 reconnectTimeoutRef.current = setTimeout(() => {
@@ -242,7 +264,12 @@ const Chatting = () => {
             try {
                 const data = JSON.parse(e.data);
                 console.log("Received WebSocket message:", data);
-                
+
+                // Presence / typing / read receipt events are not chat messages
+                if (data.type && data.type !== 'chat_message') {
+                    return;
+                }
+
                 // Ensure the message has all required fields and normalize the structure
                 const normalizedMessage = {
                     id: data.id || `temp_${Date.now()}`,
@@ -281,8 +308,9 @@ const Chatting = () => {
             const fetchMessagesAndConnect = async () => {
                 try {
                     console.log("Fetching messages for conversation:", activeConversation.id);
-                    const msgs = await apiService.getChatMessages(activeConversation.id);
-                    setMessages(msgs);
+                    const history = await apiService.getChatMessages(activeConversation.id);
+                    setMessages(history.messages.map(msg => ({ ...msg, sender: history.users[msg.sender] })));
+                    setHasMoreBefore(history.has_more_before);
                     connectWebSocket(activeConversation.id);
                 } catch (err) {
                     console.error("Failed to fetch messages:", err);
@@ -302,14 +330,51 @@ const Chatting = () => {
             if (reconnectTimeoutRef.current) {
                 clearTimeout(reconnectTimeoutRef.current);
             }
+            stopHeartbeat();
             setWsConnected(false);
         };
     }, [activeConversation]);
     
     useEffect(() => {
+        const list = messageListRef.current;
+        if (prependedFromHeightRef.current !== null && list) {
+            // Older messages were added on top: stay where the user was reading
+            list.scrollTop += list.scrollHeight - prependedFromHeightRef.current;
+            prependedFromHeightRef.current = null;
+            return;
+        }
         messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
     }, [messages]);
 
+    // Scroll-back: fetch the page before the oldest loaded message
+    const loadOlderMessages = async () => {
+        const oldest = messages.find(msg => msg.id && !String(msg.id).startsWith('temp_'));
+        if (!activeConversation || !oldest || loadingOlder || !hasMoreBefore) return;
+
+        const conversationId = activeConversation.id;
+        setLoadingOlder(true);
+        try {
+            const page = await apiService.getChatMessages(conversationId, { before: oldest.id });
+            if (activeConversation?.id !== conversationId) return;
+            prependedFromHeightRef.current = messageListRef.current?.scrollHeight ?? null;
+            setMessages(prev => [
+                ...page.messages.map(msg => ({ ...msg, sender: page.users[msg.sender] })),
+                ...prev,
+            ]);
+            setHasMoreBefore(page.has_more_before);
+        } catch (err) {
+            console.error("Failed to load older messages:", err);
+        } finally {
+            setLoadingOlder(false);
+        }
+    };
+
+    const handleMessageListScroll = (e) => {
+        if (e.currentTarget.scrollTop < 80) {
+            loadOlderMessages();
+        }
+    };
+
     const handleNewChatClick = async () => {
         setIsModalOpen(true);
         setModalLoading(true);
@@ -581,7 +646,10 @@ const Chatting = () => {
                                 </button>
                             </div>
                         </div>
-                        <div className={styles.messageList}>
+                        <div className={styles.messageList} ref={messageListRef} onScroll={handleMessageListScroll}>
+                            {loadingOlder && (
+                                <div className={styles.loadingOlder}>Loading older messages...</div>
+                            )}
                             {messages.map((msg, index) => {
                                 const senderUsername = msg.sender ? msg.sender.username : msg.sender_username;
                                 const isSentByMe = senderUsername === user.username;
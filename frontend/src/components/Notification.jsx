@@ -11,7 +11,7 @@ const NotificationManager = () => {
   const dropdownRef = useRef(null);
   const navigate = useNavigate(); 
 
-  const updateInterval = 30000;
+  const reconnectDelay = 30000;
 
   const fetchNotificationsData = async (shouldShowLoading = false) => {
     if (shouldShowLoading) setIsLoading(true);
@@ -94,13 +94,44 @@ const NotificationManager = () => {
   };
   
 
+  // Real-time count and new notifications over ws/notifications/ instead of polling
   useEffect(() => {
-    apiService.getNotificationCountAndRecent().then(data => setUnreadCount(data.count)).catch(err => console.error(err));
-        const interval = setInterval(() => {
+    let socket = null;
+    let reconnectTimeout = null;
+    let closedByUs = false;
+
+    const connect = () => {
+      socket = new WebSocket('ws://localhost:8000/ws/notifications/');
+
+      socket.onmessage = (e) => {
+        try {
+          const data = JSON.parse(e.data);
+          if (typeof data.count === 'number') {
+            setUnreadCount(data.count);
+          }
+          if (data.type === 'notification' && data.notification) {
+            setNotifications(prev => [data.notification, ...prev.filter(n => n.id !== data.notification.id)].slice(0, 10));
+          }
+        } catch (err) {
+          console.error('Error parsing notification event:', err);
+        }
+      };
+
+      socket.onclose = () => {
+        if (closedByUs) return;
+        // Catch up over REST, then reconnect
         apiService.getNotificationCountAndRecent().then(data => setUnreadCount(data.count)).catch(err => console.error(err));
-    }, updateInterval);
+        reconnectTimeout = setTimeout(connect, reconnectDelay);
+      };
+    };
+
+    connect();
 
-    return () => clearInterval(interval);
+    return () => {
+      closedByUs = true;
+      clearTimeout(reconnectTimeout);
+      if (socket) socket.close(1000);
+    };
   }, []);
 
   useEffect(() => {
@@ -164,6 +195,7 @@ const NotificationManager = () => {
                       <div className={styles.flexGrow1}>
                         <p className={`${styles.mb0} ${styles.small}`}>
                           <strong>{notification.sender?.username || 'Someone'}</strong>{' '}
+                          {notification.actor_count > 1 && `and ${notification.actor_count - 1} others `}
                           {getNotificationText(notification.type)}
                         </p>
                         <small className={styles.textMuted}>
@@ -512,8 +512,23 @@ class APIService {
   }
 
   // --- Chat ---
-  async getConversations() {
-    return this.request('/api/conversations/');
+  // Cursor-paginated: { next, previous, results }
+  async getConversations({ cursor = null, pageSize = 100 } = {}) {
+    const params = new URLSearchParams({ page_size: pageSize });
+    if (cursor) params.set('cursor', cursor);
+    return this.request(`/api/conversations/?${params}`);
+  }
+
+  // Every conversation: follows the `next` cursor until the last page
+  async getAllConversations({ pageSize = 100 } = {}) {
+    const conversations = [];
+    let cursor = null;
+    do {
+      const page = await this.getConversations({ cursor, pageSize });
+      conversations.push(...(page.results || []));
+      cursor = page.next ? new URL(page.next, window.location.origin).searchParams.get('cursor') : null;
+    } while (cursor);
+    return conversations;
   }
 
   async getOrCreateConversation(userId) {
@@ -523,8 +538,13 @@ class APIService {
     });
   }
 
-  async getChatMessages(conversationId) {
-    return this.request(`/api/conversations/${conversationId}/messages/`);
+  // Latest messages by default; pass { before: messageId } to scroll back.
+  // Returns { messages, users, has_more_before, has_more_after }; msg.sender is a key of users.
+  async getChatMessages(conversationId, { before = null, after = null, limit = 50 } = {}) {
+    const params = new URLSearchParams({ limit });
+    if (before) params.set('before', before);
+    if (after) params.set('after', after);
+    return this.request(`/api/conversations/${conversationId}/messages/?${params}`);
   }
 
   async sendChatMessage(conversationId, messageData) {
@@ -648,6 +668,16 @@ class APIService {
     async getMyBookmarks(page = 1) {
       return this.request(`/api/posts/my_bookmarks/?page=${page}`);
     }
+
+    // Bài viết từ những người đang follow; truyền `next` của trang trước làm cursor
+    async getFollowingFeed({ cursor, pageSize } = {}) {
+      const params = new URLSearchParams();
+      if (cursor) params.set('cursor', cursor);
+      if (pageSize) params.set('page_size', pageSize);
+      const query = params.toString();
+      const data = await this.request(query ? `/api/posts/following/?${query}` : '/api/posts/following/');
+      return { ...data, results: (data?.results || []).map(post => this.normalizePostData(post)) };
+    }
   // --- Utility Accessor ---
   get utils() {
     return {